@@ -0,0 +1,188 @@
+import argparse
+import logging
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Only argparse and logging are imported up front, so --help and argument errors return right away;
+# the translator itself (pandas, the services) is imported by the command that needs it.
+
+def build_parser() -> argparse.ArgumentParser:
+    """
+    The `translator` command line. Options are stored under the name of the environment
+    variable they override, so they can be passed to load_config as-is.
+    """
+    parser = argparse.ArgumentParser(
+        prog='translator',
+        description='Translate usage reports into chargeable and domains tables. '
+                    'Options override the environment variables, which override the .env file.'
+    )
+    parser.add_argument('--log-level', default='INFO', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'])
+    subparsers = parser.add_subparsers(dest='command', required=True, metavar='COMMAND')
+
+    run_parser = subparsers.add_parser('run', help='translate one usage report')
+    run_parser.add_argument(
+        'USAGE_REPORT_FILEPATH', nargs='?', metavar='usage_report', help='usage report to translate (USAGE_REPORT_FILEPATH)'
+    )
+    _add_common_arguments(run_parser)
+    run_parser.add_argument(
+        '--output-workers', dest='OUTPUT_WORKERS', metavar='N', help='threads writing outputs (OUTPUT_WORKERS)'
+    )
+    run_parser.add_argument(
+        '--database-url', dest='DATABASE_URL', metavar='URL', help='also load the rows into this database (DATABASE_URL)'
+    )
+    run_parser.add_argument(
+        '--delta-snapshot', dest='DELTA_SNAPSHOT_PATH', metavar='PATH',
+        help='write only the rows changed since the snapshot in this folder (DELTA_SNAPSHOT_PATH)'
+    )
+    run_parser.add_argument(
+        '--force', dest='FORCE_RUN', action='store_const', const='true',
+        help='re-run even if inputs and outputs are unchanged (FORCE_RUN)'
+    )
+    run_parser.add_argument(
+        '--no-metrics', dest='METRICS_ENABLED', action='store_const', const='false',
+        help='do not write metrics.json (METRICS_ENABLED)'
+    )
+
+    batch_parser = subparsers.add_parser(
+        'batch', help='translate every usage report in a directory or matching a glob pattern'
+    )
+    batch_parser.add_argument('usage_reports', help='directory or glob pattern of usage reports')
+    _add_common_arguments(batch_parser)
+    batch_parser.add_argument(
+        '--max-workers', dest='BATCH_MAX_WORKERS', metavar='N', help='worker processes (BATCH_MAX_WORKERS)'
+    )
+
+    watch_parser = subparsers.add_parser(
+        'watch', help='keep running and translate every usage report that arrives in a folder'
+    )
+    watch_parser.add_argument('WATCH_PATH', nargs='?', metavar='watch_path', help='folder to watch (WATCH_PATH)')
+    _add_common_arguments(watch_parser)
+    watch_parser.add_argument(
+        '--done', dest='WATCH_DONE_PATH', metavar='PATH', help='folder translated reports are moved to (WATCH_DONE_PATH)'
+    )
+    watch_parser.add_argument(
+        '--failed', dest='WATCH_FAILED_PATH', metavar='PATH', help='folder failed reports are moved to (WATCH_FAILED_PATH)'
+    )
+    watch_parser.add_argument(
+        '--workers', dest='WATCH_MAX_WORKERS', metavar='N', help='reports translated at a time (WATCH_MAX_WORKERS)'
+    )
+    watch_parser.add_argument(
+        '--poll-seconds', dest='WATCH_POLL_SECONDS', metavar='SECONDS',
+        help='seconds between two scans of the folder (WATCH_POLL_SECONDS)'
+    )
+    watch_parser.add_argument(
+        '--output-workers', dest='OUTPUT_WORKERS', metavar='N', help='threads writing outputs per report (OUTPUT_WORKERS)'
+    )
+    watch_parser.add_argument(
+        '--delta-snapshot', dest='DELTA_SNAPSHOT_PATH', metavar='PATH',
+        help='write only the rows changed since the snapshot in this folder (DELTA_SNAPSHOT_PATH)'
+    )
+    watch_parser.add_argument(
+        '--database-url', dest='DATABASE_URL', metavar='URL', help='also load the rows into this database (DATABASE_URL)'
+    )
+    watch_parser.add_argument(
+        '--no-metrics', dest='METRICS_ENABLED', action='store_const', const='false',
+        help='do not write metrics.json (METRICS_ENABLED)'
+    )
+    return parser
+
+def _add_common_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        '--metrics', dest='METRICS_ENABLED', action='store_const', const='true',
+        help='write per-stage metrics to metrics.json (METRICS_ENABLED)'
+    )
+    parser.add_argument(
+        '-o', '--output', dest='OUTPUT_FILES_PATH', metavar='PATH', help='output folder (OUTPUT_FILES_PATH)'
+    )
+    parser.add_argument(
+        '-m', '--mapping', dest='PARTNUMBER_TO_PRODUCT_MAP_FILEPATH', metavar='PATH',
+        help='PartNumber to product JSON map (PARTNUMBER_TO_PRODUCT_MAP_FILEPATH)'
+    )
+    parser.add_argument(
+        '--partner-ids-to-skip', dest='PARTNER_IDS_TO_SKIP', metavar='IDS',
+        help='comma-separated PartnerIDs (PARTNER_IDS_TO_SKIP)'
+    )
+    parser.add_argument(
+        '--headers', dest='HEADERS', metavar='COLUMNS', help='comma-separated columns to read (HEADERS)'
+    )
+    parser.add_argument(
+        '--chunksize', dest='CHUNKSIZE', metavar='ROWS', help='stream the report in chunks of this many rows (CHUNKSIZE)'
+    )
+    parser.add_argument(
+        '--rules', dest='USAGE_REDUCTION_RULES_FILEPATH', metavar='PATH',
+        help='versioned usage reduction rules file (USAGE_REDUCTION_RULES_FILEPATH)'
+    )
+    parser.add_argument(
+        '--rounding', dest='USAGE_ROUNDING', metavar='MODE', help='truncate, floor, ceil or round_half_up (USAGE_ROUNDING)'
+    )
+    parser.add_argument(
+        '--output-format', dest='OUTPUT_FORMAT', metavar='FORMAT', help='sql, copy_text or copy_csv (OUTPUT_FORMAT)'
+    )
+    parser.add_argument(
+        '--compression', dest='OUTPUT_COMPRESSION', metavar='METHOD', help='none, gzip, xz or bz2 (OUTPUT_COMPRESSION)'
+    )
+    parser.add_argument(
+        '--compression-level', dest='OUTPUT_COMPRESSION_LEVEL', metavar='LEVEL',
+        help='compression level (OUTPUT_COMPRESSION_LEVEL)'
+    )
+    parser.add_argument(
+        '--consolidate', dest='CONSOLIDATE_CHARGEABLE', action='store_const', const='true',
+        help='one chargeable row per PartnerID, product, plan ID and plan (CONSOLIDATE_CHARGEABLE)'
+    )
+    parser.add_argument(
+        '--consolidation-rounding', dest='CONSOLIDATION_ROUNDING_POINT', metavar='POINT',
+        help='round usage per row or after the sum: row or sum (CONSOLIDATION_ROUNDING_POINT)'
+    )
+    parser.add_argument(
+        '--validate', dest='VALIDATE_INPUT', action='store_const', const='true',
+        help='check the report against the built-in validation rules (VALIDATE_INPUT)'
+    )
+    parser.add_argument(
+        '--validation-rules', dest='VALIDATION_RULES_FILEPATH', metavar='PATH',
+        help='validation rules JSON file; implies --validate (VALIDATION_RULES_FILEPATH)'
+    )
+    parser.add_argument(
+        '--error-log-max-rows', dest='ERROR_LOG_MAX_ROWS', metavar='ROWS',
+        help='rows written in full to each error log; the rest are sampled and counted (ERROR_LOG_MAX_ROWS)'
+    )
+    parser.add_argument(
+        '--error-log-sample-rows', dest='ERROR_LOG_SAMPLE_ROWS', metavar='ROWS',
+        help='rows kept in the sample of each capped error log (ERROR_LOG_SAMPLE_ROWS)'
+    )
+    parser.add_argument(
+        '--statement-rows', dest='SQL_STATEMENT_ROWS', metavar='ROWS', help='rows per INSERT statement (SQL_STATEMENT_ROWS)'
+    )
+    parser.add_argument(
+        '--transaction-statements', dest='SQL_TRANSACTION_STATEMENTS', metavar='N',
+        help='INSERT statements per BEGIN/COMMIT batch (SQL_TRANSACTION_STATEMENTS)'
+    )
+    parser.add_argument(
+        '--shards', dest='SQL_SHARDS', metavar='N', help='INSERT files per table (SQL_SHARDS)'
+    )
+    parser.add_argument(
+        '--shard-key', dest='SQL_SHARD_KEY', metavar='COLUMN',
+        help='PartnerID or partnerPurchasedPlanID (SQL_SHARD_KEY)'
+    )
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the command in `argv` (default: sys.argv) and return the process exit code."""
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=args.log_level)
+    overrides = {name: value for name, value in vars(args).items() if name.isupper()}
+    try:
+        from app.config.config import load_config
+        config = load_config(overrides)
+        if args.command == 'run':
+            from app.main import main as run_main
+            run_main(config)
+        elif args.command == 'batch':
+            from app.main import batch_main
+            batch_main(args.usage_reports, config)
+        else:
+            from app.main import watch_main
+            watch_main(config)
+    except Exception as e:
+        logger.error("An error occurred during execution: %s", e)
+        return 1
+    return 0
@@ -1,9 +1,89 @@
+import numpy as np
 import pandas as pd
 import logging
-from typing import List, Tuple
+from typing import Callable, Dict, List, NamedTuple, Tuple
 
 logger = logging.getLogger(__name__)
 
+class RejectionReason(NamedTuple):
+    """
+    A reason to reject a row from the chargeable set.
+    `predicate(df, partner_ids_to_skip)` returns a boolean mask of the rows it rejects.
+    Rejected rows are returned as an error frame when `logged` is set, and only counted otherwise.
+    """
+    name: str
+    predicate: Callable[[pd.DataFrame, List[int]], pd.Series]
+    logged: bool = True
+    message: str = "Found %d rejected rows"
+
+# Checked in order: a row gets the first reason that rejects it
+CHARGEABLE_REJECTION_REASONS: List[RejectionReason] = [
+    RejectionReason(
+        'no_partnumber',
+        lambda df, partner_ids_to_skip: df['PartNumber'].isna(),
+        message="Found %d rows without PartNumber"
+    ),
+    RejectionReason(
+        'itemcount_nonpositive',
+        lambda df, partner_ids_to_skip: (df['itemCount'] <= 0).fillna(False),
+        message="Found %d rows with non-positive itemCount"
+    ),
+    RejectionReason(
+        'partner_id_skipped',
+        lambda df, partner_ids_to_skip: df['PartnerID'].isin(partner_ids_to_skip),
+        logged=False,
+        message="Filtered out %d rows with PartnerID in skip list"
+    ),
+    # Dropped without an error log, as the itemCount > 0 filter always did; in the pipeline the schema
+    # already rejects these rows, as itemCount is required
+    RejectionReason(
+        'itemcount_missing',
+        lambda df, partner_ids_to_skip: df['itemCount'].isna(),
+        logged=False,
+        message="Filtered out %d rows without itemCount"
+    ),
+]
+
+def classify_chargeable_rows(
+    df: pd.DataFrame,
+    partner_ids_to_skip: List[int],
+    rejection_reasons: List[RejectionReason] = CHARGEABLE_REJECTION_REASONS
+) -> np.ndarray:
+    """
+    Business rule: Compute a rejection reason code per row.
+    0 means chargeable; `i` means rejected by `rejection_reasons[i - 1]`, the first reason matching the row.
+    Only boolean masks are built; the frame itself is not copied.
+    """
+    codes = np.zeros(len(df), dtype=np.int8)
+    for code, reason in enumerate(rejection_reasons, start=1):
+        rejected = np.asarray(reason.predicate(df, partner_ids_to_skip), dtype=bool)
+        codes[(codes == 0) & rejected] = code
+    return codes
+
+def split_chargeable_df(
+    df: pd.DataFrame,
+    partner_ids_to_skip: List[int],
+    rejection_reasons: List[RejectionReason] = CHARGEABLE_REJECTION_REASONS
+) -> Tuple[pd.DataFrame, Dict[str, pd.DataFrame]]:
+    """
+    Business rule: Classify every row once, then split the frame once into the chargeable rows
+    and one error frame per logged rejection reason.
+    Returns:
+        Tuple of (chargeable_df, {reason name: error_df})
+    """
+    codes = classify_chargeable_rows(df, partner_ids_to_skip, rejection_reasons)
+    error_dfs: Dict[str, pd.DataFrame] = {}
+    for code, reason in enumerate(rejection_reasons, start=1):
+        rejected = codes == code
+        count = int(rejected.sum())
+        if count:
+            log = logger.warning if reason.logged else logger.info
+            log(reason.message, count)
+        if reason.logged:
+            error_dfs[reason.name] = df.take(np.flatnonzero(rejected))
+    # take() returns independent frames, so later stages can add columns without copying again
+    return df.take(np.flatnonzero(codes == 0)), error_dfs
+
 def filter_chargeable_df(
     df: pd.DataFrame,
     partner_ids_to_skip: List[int]
@@ -13,6 +93,7 @@ def filter_chargeable_df(
     - Remove rows without PartNumber (log error)
     - Remove rows with itemCount <= 0 (log error)
     - Remove rows with PartnerID in skip list
+    - Remove rows without itemCount
     Returns:
         Tuple of (filtered_df, no_partnumber_error_df, itemcount_nonpositive_error_df)
     """
@@ -22,25 +103,5 @@ def filter_chargeable_df(
         logger.error("Missing required columns for chargeable: %s", missing)
         raise ValueError(f"Missing required columns for chargeable: {missing}")
 
-    chargeable_df = df.copy()
-
-    # Log and filter rows without PartNumber
-    no_partnumber_error_df = chargeable_df[chargeable_df['PartNumber'].isna()].copy()
-    if not no_partnumber_error_df.empty:
-        logger.warning("Found %d rows without PartNumber", len(no_partnumber_error_df))
-    chargeable_df = chargeable_df[chargeable_df['PartNumber'].notna()]
-
-    # Log and filter rows with non-positive itemCount (<= 0)
-    itemcount_nonpositive_error_df = chargeable_df[chargeable_df['itemCount'] <= 0].copy()
-    if not itemcount_nonpositive_error_df.empty:
-        logger.warning("Found %d rows with non-positive itemCount", len(itemcount_nonpositive_error_df))
-    chargeable_df = chargeable_df[chargeable_df['itemCount'] > 0]
-
-    # Filter out rows with PartnerID in skip list
-    before = len(chargeable_df)
-    chargeable_df = chargeable_df[~chargeable_df['PartnerID'].isin(partner_ids_to_skip)]
-    after = len(chargeable_df)
-    if before != after:
-        logger.info("Filtered out %d rows with PartnerID in skip list", before - after)
-
-    return chargeable_df, no_partnumber_error_df, itemcount_nonpositive_error_df
+    chargeable_df, error_dfs = split_chargeable_df(df, partner_ids_to_skip)
+    return chargeable_df, error_dfs['no_partnumber'], error_dfs['itemcount_nonpositive']
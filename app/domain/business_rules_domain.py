@@ -1,7 +1,9 @@
 import pandas as pd
 import logging
-from typing import Any
-from app.utils.strings import normalize_alphanumeric_string
+from typing import Any, Tuple
+from app.utils.strings import normalize_alphanumeric_string, normalize_alphanumeric_column
+
+PARTNER_PURCHASED_PLAN_ID_LENGTH = 32
 
 logger = logging.getLogger(__name__)
 
@@ -10,7 +12,7 @@ def map_partner_purchased_plan_id(input_str: str) -> str:
     Business rule: Normalize and validate accountGuid as partnerPurchasedPlanID.
     """
     try:
-        return normalize_alphanumeric_string(input_str, expected_length=32)
+        return normalize_alphanumeric_string(input_str, expected_length=PARTNER_PURCHASED_PLAN_ID_LENGTH)
     except ValueError as e:
         logger.error("Invalid partnerPurchasedPlanID: %s", e)
         raise
@@ -29,4 +31,24 @@ def add_partner_purchased_plan_id_column(df: pd.DataFrame) -> pd.DataFrame:
         return df
     except Exception as e:
         logger.error("Failed to add 'partnerPurchasedPlanID' column: %s", e)
-        raise
\ No newline at end of file
+        raise
+
+def split_partner_purchased_plan_id_column(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Business rule: Add 'partnerPurchasedPlanID' column by normalizing the whole 'accountGuid' column at once.
+    Rows whose normalized accountGuid is not 32 characters long are split out instead of aborting the run.
+    Returns:
+        Tuple of (valid_df, invalid_account_guid_error_df)
+    """
+    if 'accountGuid' not in df.columns:
+        logger.error("Column 'accountGuid' not found in DataFrame")
+        raise ValueError("Column 'accountGuid' not found in DataFrame")
+    df['partnerPurchasedPlanID'] = normalize_alphanumeric_column(df['accountGuid'])
+    invalid = df['partnerPurchasedPlanID'].str.len() != PARTNER_PURCHASED_PLAN_ID_LENGTH
+    if not invalid.any():
+        logger.info("Added 'partnerPurchasedPlanID' column using 'accountGuid'")
+        return df, df.iloc[0:0].copy()
+    invalid_account_guid_error_df = df[invalid].copy()
+    logger.warning("Found %d rows with invalid accountGuid", len(invalid_account_guid_error_df))
+    logger.info("Added 'partnerPurchasedPlanID' column using 'accountGuid'")
+    return df[~invalid].copy(), invalid_account_guid_error_df
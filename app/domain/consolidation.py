@@ -0,0 +1,72 @@
+import logging
+import pandas as pd
+from typing import List, Optional
+from app.domain.usage_reduction import UsageReductionRules
+
+logger = logging.getLogger(__name__)
+
+CONSOLIDATION_KEYS: List[str] = ['PartnerID', 'product', 'partnerPurchasedPlanID', 'plan']
+# 'row': usage is rounded on each row, then summed; 'sum': usage is summed unrounded, then rounded
+ROUNDING_POINTS = ('row', 'sum')
+
+class ChargeableConsolidator:
+    """
+    Consolidates chargeable rows sharing PartnerID, product, partnerPurchasedPlanID and plan
+    into one row, summing itemCount and usage.
+
+    Frames, e.g. chunks, are folded in with `update`; only the sums per key and PartNumber
+    are kept, so the itemCount sums are exact whatever the chunking. `consolidated` then
+    reduces each PartNumber's itemCount sum and adds them up per key. Rows come out in the
+    order their key first appeared.
+    """
+
+    def __init__(self, rules: UsageReductionRules, rounding_point: str = 'row'):
+        if rounding_point not in ROUNDING_POINTS:
+            logger.error("Invalid consolidation rounding point: %s", rounding_point)
+            raise ValueError(f"Consolidation rounding point must be one of {ROUNDING_POINTS}. Found: {rounding_point}")
+        self.rules = rules
+        self.rounding_point = rounding_point
+        self.rows_in = 0
+        self._sums: Optional[pd.DataFrame] = None
+
+    def update(self, chargeable_df: pd.DataFrame) -> "ChargeableConsolidator":
+        """Add the sums of one frame of chargeable rows, after usage reduction."""
+        missing = [col for col in CONSOLIDATION_KEYS + ['PartNumber', 'itemCount', 'usage'] if col not in chargeable_df.columns]
+        if missing:
+            logger.error("Missing required columns for consolidation: %s", missing)
+            raise ValueError(f"Missing required columns for consolidation: {missing}")
+        if chargeable_df.empty:
+            return self
+        self.rows_in += len(chargeable_df)
+        columns = CONSOLIDATION_KEYS + ['PartNumber', 'itemCount', 'usage']
+        partial = chargeable_df[columns] if self._sums is None else pd.concat([self._sums, chargeable_df[columns]])
+        self._sums = _sum_by(partial, CONSOLIDATION_KEYS + ['PartNumber'], ['itemCount', 'usage'])
+        return self
+
+    def consolidated(self) -> pd.DataFrame:
+        """One row per key with the summed itemCount and usage (an integer, following the rules' rounding)."""
+        if self._sums is None:
+            return pd.DataFrame({column: pd.Series(dtype=object) for column in CONSOLIDATION_KEYS}).assign(
+                itemCount=pd.Series(dtype='int64'), usage=pd.Series(dtype='int64')
+            )
+        sums = self._sums
+        if self.rounding_point == 'sum':
+            sums = sums.assign(usage=self.rules.reduce(sums['itemCount'], sums['PartNumber']))
+        consolidated_df = _sum_by(sums, CONSOLIDATION_KEYS, ['itemCount', 'usage'])
+        if self.rounding_point == 'sum':
+            consolidated_df['usage'] = self.rules.round(consolidated_df['usage'])
+        consolidated_df['usage'] = consolidated_df['usage'].astype('int64')
+        logger.info("Consolidated chargeable rows: %d -> %d rows", self.rows_in, len(consolidated_df))
+        return consolidated_df
+
+def consolidate_chargeable_df(
+    chargeable_df: pd.DataFrame,
+    rules: UsageReductionRules,
+    rounding_point: str = 'row'
+) -> pd.DataFrame:
+    """Consolidate the chargeable rows of one frame; see ChargeableConsolidator."""
+    return ChargeableConsolidator(rules, rounding_point).update(chargeable_df).consolidated()
+
+def _sum_by(df: pd.DataFrame, keys: List[str], measures: List[str]) -> pd.DataFrame:
+    # Missing key values form their own group, as they would be separate rows otherwise
+    return df.groupby(keys, observed=True, sort=False, dropna=False)[measures].sum().reset_index()
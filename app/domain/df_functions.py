@@ -1,50 +1,212 @@
+import os
 import pandas as pd
 import logging
-from typing import List, Dict, Callable, Any, Optional
+from typing import List, Dict, Callable, Any, Optional, Iterator
+from app.domain.product_mapping import compile_product_mapping
+from app.domain.usage_reduction import compile_usage_reduction_rules
 
 logger = logging.getLogger(__name__)
 
-def load_and_prepare_dataframe(filepath: str, headers: List[str]) -> pd.DataFrame:
-    """Load and filter the main DataFrame based on provided headers."""
+INPUT_FORMATS = ('csv', 'parquet', 'ipc')
+
+_INPUT_FORMAT_EXTENSIONS = {
+    '.csv': 'csv',
+    '.parquet': 'parquet',
+    '.pq': 'parquet',
+    '.feather': 'ipc',
+    '.arrow': 'ipc',
+    '.ipc': 'ipc',
+}
+
+_INPUT_FORMAT_MAGIC_BYTES = {
+    b'PAR1': 'parquet',
+    b'ARROW1': 'ipc',
+}
+
+_INPUT_COMPRESSION_EXTENSIONS = {
+    '.gz': 'gzip',
+    '.xz': 'xz',
+    '.bz2': 'bz2',
+}
+
+_INPUT_COMPRESSION_MAGIC_BYTES = {
+    b'\x1f\x8b': 'gzip',
+    b'\xfd7zXZ\x00': 'xz',
+    b'BZh': 'bz2',
+}
+
+def detect_input_compression(filepath: str) -> Optional[str]:
+    """
+    Detect a compressed usage report: 'gzip', 'xz' or 'bz2', or None for an uncompressed file.
+    Uses the file extension, then the file's magic bytes.
+    """
+    extension = os.path.splitext(filepath)[1].lower()
+    if extension in _INPUT_COMPRESSION_EXTENSIONS:
+        return _INPUT_COMPRESSION_EXTENSIONS[extension]
+    head = _read_head(filepath)
+    for magic, compression in _INPUT_COMPRESSION_MAGIC_BYTES.items():
+        if head.startswith(magic):
+            return compression
+    return None
+
+def detect_input_format(filepath: str) -> str:
+    """
+    Detect the usage report format: 'csv', 'parquet' or 'ipc' (Feather v2 / Arrow IPC).
+    Uses the file extension, then the file's magic bytes; anything else is read as CSV.
+    Compressed reports are CSV: Parquet and Arrow IPC compress their own data.
+    """
+    root, extension = os.path.splitext(filepath.lower())
+    if extension in _INPUT_COMPRESSION_EXTENSIONS:
+        extension = os.path.splitext(root)[1]
+        if _INPUT_FORMAT_EXTENSIONS.get(extension, 'csv') != 'csv':
+            logger.error("Compressed %s usage reports are not supported: %s", extension, filepath)
+            raise ValueError(f"Compressed {extension} usage reports are not supported: {filepath}")
+        return 'csv'
+    if extension in _INPUT_FORMAT_EXTENSIONS:
+        return _INPUT_FORMAT_EXTENSIONS[extension]
+    return sniff_input_format(filepath) or 'csv'
+
+def sniff_input_format(filepath: str) -> Optional[str]:
+    """The format named by the file's magic bytes: 'parquet', 'ipc', or None for anything else."""
+    head = _read_head(filepath)
+    for magic, input_format in _INPUT_FORMAT_MAGIC_BYTES.items():
+        if head.startswith(magic):
+            return input_format
+    return None
+
+def _read_head(filepath: str) -> bytes:
+    try:
+        with open(filepath, 'rb') as f:
+            return f.read(6)
+    except OSError:
+        return b''
+
+def _csv_compression(filepath: str) -> str:
+    """The compression argument for pd.read_csv; 'infer' keeps pandas' own detection for other codecs."""
+    return detect_input_compression(filepath) or 'infer'
+
+def load_and_prepare_dataframe(
+    filepath: str,
+    headers: List[str],
+    dtype: Optional[Dict[str, Any]] = None,
+    encoding: Optional[str] = None,
+    encoding_errors: str = 'strict'
+) -> pd.DataFrame:
+    """
+    Load and filter the main DataFrame based on provided headers.
+    Only the header columns are parsed: the projection is pushed down into the reader.
+    `dtype`, `encoding` (default UTF-8) and `encoding_errors` are passed to the CSV reader;
+    columnar formats keep their stored types and are always UTF-8.
+    """
     try:
-        df = pd.read_csv(filepath)
-        logger.info("Loaded DataFrame from %s with %d rows", filepath, len(df))
-        missing = [col for col in headers if col not in df.columns]
-        if missing:
-            logger.error("Missing required columns in CSV: %s", missing)
-            raise ValueError(f"Missing required columns in CSV: {missing}")
+        input_format = detect_input_format(filepath)
+        if input_format == 'csv':
+            df = pd.read_csv(
+                filepath, usecols=lambda col: col in headers, dtype=dtype, compression=_csv_compression(filepath),
+                encoding=encoding, encoding_errors=encoding_errors
+            )
+        else:
+            dataset = _open_columnar_dataset(filepath, input_format, headers)
+            df = dataset.to_table(columns=headers).to_pandas()
+        logger.info("Loaded DataFrame from %s (%s) with %d rows", filepath, input_format, len(df))
+        _validate_input_columns(df, headers)
         df = df[headers].copy()
         return df
     except Exception as e:
         logger.error("Failed to load or prepare DataFrame: %s", e)
         raise
 
-def apply_product_mapping(df: pd.DataFrame, partnumber_to_product_map: Dict[str, str]) -> pd.DataFrame:
-    """Map 'PartNumber' to 'product' using the provided mapping."""
+def iter_dataframe_chunks(
+    filepath: str,
+    headers: List[str],
+    chunksize: int,
+    dtype: Optional[Dict[str, Any]] = None,
+    encoding: Optional[str] = None,
+    encoding_errors: str = 'strict'
+) -> Iterator[pd.DataFrame]:
+    """
+    Load the main DataFrame in chunks of up to `chunksize` rows, each filtered to the provided headers.
+    Only the header columns are parsed: the projection is pushed down into the reader.
+    `dtype`, `encoding` (default UTF-8) and `encoding_errors` are passed to the CSV reader;
+    columnar formats keep their stored types and are always UTF-8.
+    """
+    if chunksize <= 0:
+        logger.error("Invalid chunksize: %d", chunksize)
+        raise ValueError(f"chunksize must be a positive integer. Found: {chunksize}")
+    try:
+        for index, chunk in enumerate(_read_chunks(filepath, headers, chunksize, dtype, encoding, encoding_errors)):
+            logger.info("Loaded chunk %d from %s with %d rows", index, filepath, len(chunk))
+            _validate_input_columns(chunk, headers)
+            yield chunk[headers].copy()
+    except Exception as e:
+        logger.error("Failed to load or prepare DataFrame chunk: %s", e)
+        raise
+
+def _read_chunks(
+    filepath: str,
+    headers: List[str],
+    chunksize: int,
+    dtype: Optional[Dict[str, Any]],
+    encoding: Optional[str],
+    encoding_errors: str
+) -> Iterator[pd.DataFrame]:
+    input_format = detect_input_format(filepath)
+    if input_format == 'csv':
+        with pd.read_csv(
+            filepath, chunksize=chunksize, usecols=lambda col: col in headers, dtype=dtype,
+            compression=_csv_compression(filepath), encoding=encoding, encoding_errors=encoding_errors
+        ) as reader:
+            yield from reader
+        return
+    dataset = _open_columnar_dataset(filepath, input_format, headers)
+    for batch in dataset.to_batches(columns=headers, batch_size=chunksize):
+        yield batch.to_pandas()
+
+def _open_columnar_dataset(filepath: str, input_format: str, headers: List[str]) -> Any:
+    """Open a Parquet or Arrow IPC file with pyarrow and check it has all the header columns."""
+    try:
+        import pyarrow.dataset as ds
+    except ImportError:
+        raise RuntimeError(f"Reading {input_format} usage reports requires pyarrow to be installed")
+    dataset = ds.dataset(filepath, format=input_format)
+    missing = [col for col in headers if col not in dataset.schema.names]
+    if missing:
+        logger.error("Missing required columns in usage report: %s", missing)
+        raise ValueError(f"Missing required columns in usage report: {missing}")
+    return dataset
+
+def _validate_input_columns(df: pd.DataFrame, headers: List[str]) -> None:
+    missing = [col for col in headers if col not in df.columns]
+    if missing:
+        logger.error("Missing required columns in CSV: %s", missing)
+        raise ValueError(f"Missing required columns in CSV: {missing}")
+
+def apply_product_mapping(df: pd.DataFrame, partnumber_to_product_map: Any) -> pd.DataFrame:
+    """
+    Map 'PartNumber' to 'product' using the provided mapping.
+    Accepts a {PartNumber or pattern: product} dictionary or a compiled ProductMapping.
+    """
+    mapping = compile_product_mapping(partnumber_to_product_map)
     if 'PartNumber' not in df.columns:
         logger.error("Column 'PartNumber' not found in DataFrame")
         raise ValueError("Column 'PartNumber' not found in DataFrame")
-    df['product'] = df['PartNumber'].map(partnumber_to_product_map)
+    df['product'] = mapping.products(df['PartNumber'])
     before = len(df)
     df = df[df['product'].notna()]
     logger.info("Filtered products: %d -> %d rows", before, len(df))
     return df
 
-def apply_usage_reduction(df: pd.DataFrame, itemcount_to_usage_reduction_rules: Dict[str, Any]) -> pd.DataFrame:
-    """Map 'itemCount' to 'usage' using reduction rules."""
-    if not isinstance(itemcount_to_usage_reduction_rules, dict):
-        logger.error("ITEMCOUNT_TO_USAGE_REDUCTION_RULES is not a dictionary")
-        raise ValueError("ITEMCOUNT_TO_USAGE_REDUCTION_RULES is not a dictionary")
+def apply_usage_reduction(df: pd.DataFrame, itemcount_to_usage_reduction_rules: Any) -> pd.DataFrame:
+    """
+    Map 'itemCount' to 'usage' using reduction rules.
+    Accepts a {PartNumber: divisor} dictionary or compiled UsageReductionRules;
+    usage is rounded to integers following the rules' rounding policy.
+    """
+    rules = compile_usage_reduction_rules(itemcount_to_usage_reduction_rules)
     if 'itemCount' not in df.columns or 'PartNumber' not in df.columns:
         logger.error("Required columns 'itemCount' or 'PartNumber' not found in DataFrame")
         raise ValueError("Required columns 'itemCount' or 'PartNumber' not found in DataFrame")
-    def map_itemcount_to_usage(row: pd.Series) -> Any:
-        result = row['itemCount']
-        key = row['PartNumber']
-        if key in itemcount_to_usage_reduction_rules:
-            result = result / itemcount_to_usage_reduction_rules[key]
-        return result
-    df['usage'] = df.apply(map_itemcount_to_usage, axis=1)
+    df['usage'] = rules.round(rules.reduce(df['itemCount'], df['PartNumber']))
     logger.info("Applied usage reduction to DataFrame")
     return df
 
@@ -0,0 +1,110 @@
+import fnmatch
+import json
+import logging
+import re
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional, Pattern, Tuple
+
+logger = logging.getLogger(__name__)
+
+_WILDCARD_CHARACTERS = ('*', '?', '[')
+
+class ProductMapping:
+    """
+    Compiled PartNumber-to-product typemap.
+
+    Keys are exact PartNumbers or patterns:
+    - `SSX*` matches every PartNumber starting with `SSX` (prefix rule);
+    - keys with other wildcards (`?`, `[...]`, or `*` before the end) are glob patterns, e.g. `EA??0001GB*`.
+
+    Exact keys take priority over patterns, the longest matching prefix over shorter
+    ones, and prefixes over glob patterns, which are tried in file order. Prefix rules
+    are kept in a table of prefixes by length, so a PartNumber is resolved with one
+    lookup per distinct prefix length. Each distinct PartNumber is resolved once and
+    the result cached, then broadcast to every row carrying it.
+    """
+
+    def __init__(self, rules: Dict[str, Any]):
+        if not isinstance(rules, dict):
+            logger.error("PARTNUMBER_TO_PRODUCT_MAP_FILEPATH is not a dictionary")
+            raise ValueError("PARTNUMBER_TO_PRODUCT_MAP_FILEPATH is not a dictionary")
+        invalid = {key: value for key, value in rules.items() if not isinstance(value, str)}
+        if invalid:
+            logger.error("Invalid products in the typemap: %s", invalid)
+            raise ValueError(f"Products in the typemap must be strings. Found: {invalid}")
+        self.rules = dict(rules)
+        self._exact: Dict[str, str] = {}
+        self._globs: List[Tuple[Pattern[str], str]] = []
+        prefixes: Dict[int, Dict[str, str]] = {}
+        for key, product in self.rules.items():
+            if not _has_wildcard(key):
+                self._exact[key] = product
+            elif key.endswith('*') and not _has_wildcard(key[:-1]):
+                prefixes.setdefault(len(key) - 1, {})[key[:-1]] = product
+            else:
+                self._globs.append((re.compile(fnmatch.translate(key)), product))
+        # prefix length -> {prefix: product}, longest first
+        self._prefixes = {length: prefixes[length] for length in sorted(prefixes, reverse=True)}
+        self._resolved: Dict[str, Optional[str]] = {}
+
+    @classmethod
+    def from_file(cls, filepath: str) -> "ProductMapping":
+        """Load the typemap from a JSON file of {"PartNumber or pattern": "product"}."""
+        try:
+            with open(filepath, 'r') as f:
+                rules = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            logger.error("Failed to load mapping: %s", e)
+            raise RuntimeError(f"Failed to load mapping: {e}")
+        return cls(rules)
+
+    @property
+    def has_patterns(self) -> bool:
+        return bool(self._prefixes or self._globs)
+
+    def resolve(self, part_number: Any) -> Optional[str]:
+        """The product of one PartNumber, or None if no key matches it."""
+        if not isinstance(part_number, str):
+            return None
+        product = self._exact.get(part_number)
+        if product is not None or not self.has_patterns:
+            return product
+        if part_number in self._resolved:
+            return self._resolved[part_number]
+        product = self._match_pattern(part_number)
+        self._resolved[part_number] = product
+        return product
+
+    def products(self, part_numbers: pd.Series) -> pd.Series:
+        """Resolve each distinct PartNumber once and broadcast the products to the rows; NaN where unmapped."""
+        if not self.has_patterns:
+            return part_numbers.map(self._exact)
+        if isinstance(part_numbers.dtype, pd.CategoricalDtype):
+            # Categorical.map resolves the categories, not the rows
+            lookup = {category: self.resolve(category) for category in part_numbers.cat.categories}
+            return part_numbers.map({category: product for category, product in lookup.items() if product is not None})
+        codes, uniques = pd.factorize(part_numbers)
+        # The extra trailing NaN is picked up by the -1 code of missing PartNumbers
+        resolved = np.array([self.resolve(part_number) for part_number in uniques] + [None], dtype=object)
+        resolved[pd.isna(resolved)] = np.nan
+        return pd.Series(resolved[codes], index=part_numbers.index, name=part_numbers.name, dtype=object)
+
+    def _match_pattern(self, part_number: str) -> Optional[str]:
+        for length, prefixes in self._prefixes.items():
+            product = prefixes.get(part_number[:length])
+            if product is not None:
+                return product
+        for pattern, product in self._globs:
+            if pattern.match(part_number):
+                return product
+        return None
+
+def compile_product_mapping(mapping: Any) -> ProductMapping:
+    """Return a compiled typemap, compiling a plain {PartNumber or pattern: product} dictionary if needed."""
+    if isinstance(mapping, ProductMapping):
+        return mapping
+    return ProductMapping(mapping)
+
+def _has_wildcard(key: str) -> bool:
+    return any(character in key for character in _WILDCARD_CHARACTERS)
@@ -0,0 +1,84 @@
+import logging
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Declared dtypes of the usage report columns. Columns not listed are kept as read (object).
+USAGE_REPORT_SCHEMA: Dict[str, str] = {
+    'PartnerID': 'Int64',
+    'itemCount': 'Int64',
+    'PartNumber': 'category',
+    'plan': 'category',
+}
+
+# Columns that must have a value in every row; a missing value is a schema violation.
+USAGE_REPORT_REQUIRED_COLUMNS: List[str] = ['PartnerID', 'itemCount']
+
+SCHEMA_VIOLATION_COLUMN = 'schema_violation'
+
+# Past 2**53 floats no longer hold every integer exactly; values read as float from there on are not trusted
+_FLOAT_EXACT_INT_MAX = 2 ** 53
+
+def usage_report_read_dtypes(headers: List[str]) -> Dict[str, Any]:
+    """
+    Business rule: dtypes to read the usage report CSV with.
+    Integer columns are left to the C parser, which reads them as int64, or float64 when a value
+    is missing, and only falls back to text when a value is not a number; apply_usage_report_schema
+    then casts them and reports the invalid values, instead of the read failing.
+    """
+    return {column: 'category' for column in headers if USAGE_REPORT_SCHEMA.get(column) == 'category'}
+
+def apply_usage_report_schema(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Business rule: Cast the usage report to its declared schema.
+    - Integer columns become nullable Int64; values that are not integers are violations.
+    - Required columns without a value are violations.
+    - PartNumber and plan become categoricals.
+    Violating rows stay in typed_df, with their invalid integers missing: the columns are only
+    required for chargeable rows, so they still count for outputs not using them, e.g. domains.
+    The columns of `df` are cast in place, without copying the frame.
+    Returns:
+        Tuple of (typed_df, schema_violation_error_df); violating rows keep their raw values in the
+        error frame and get a 'schema_violation' column naming the offending columns.
+    """
+    violations = pd.Series('', index=df.index, dtype=object)
+    integers: Dict[str, pd.Series] = {}
+    for column, declared in USAGE_REPORT_SCHEMA.items():
+        if column not in df.columns or declared != 'Int64':
+            continue
+        values = _to_integer(df[column])
+        invalid = values.isna() & df[column].notna()
+        if column in USAGE_REPORT_REQUIRED_COLUMNS:
+            invalid |= df[column].isna()
+        violations = violations.mask(invalid, violations + column + ';')
+        integers[column] = values
+
+    violating = (violations != '').to_numpy()
+    schema_violation_error_df = df[violating].copy()
+    for column, values in integers.items():
+        if pd.api.types.is_float_dtype(df[column].dtype):
+            # Integers read as float (the column has a missing value) are logged as in the report, e.g. 10, not 10.0
+            parsed = values[violating].astype(object)
+            schema_violation_error_df[column] = parsed.where(parsed.notna(), schema_violation_error_df[column])
+    schema_violation_error_df[SCHEMA_VIOLATION_COLUMN] = violations[violating].str.rstrip(';')
+    if violating.any():
+        logger.warning("Found %d rows violating the usage report schema", int(violating.sum()))
+
+    for column, values in integers.items():
+        if values.dtype != 'Int64':
+            df[column] = values.astype('Int64')
+    for column, declared in USAGE_REPORT_SCHEMA.items():
+        if column in df.columns and declared == 'category' and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
+    return df, schema_violation_error_df
+
+def _to_integer(values: pd.Series) -> pd.Series:
+    """Parse a column as integers; values that are not whole numbers, or not exact as floats, become missing."""
+    if pd.api.types.is_integer_dtype(values.dtype):
+        return values
+    numeric = values if pd.api.types.is_float_dtype(values.dtype) else pd.to_numeric(values, errors='coerce')
+    if pd.api.types.is_integer_dtype(numeric.dtype):
+        return numeric
+    return numeric.where(np.isfinite(numeric) & (np.floor(numeric) == numeric) & (numeric.abs() < _FLOAT_EXACT_INT_MAX))
@@ -0,0 +1,83 @@
+import json
+import logging
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+ROUNDING_POLICIES = ('truncate', 'floor', 'ceil', 'round_half_up')
+
+_ROUNDING_FUNCTIONS = {
+    'truncate': np.trunc,
+    'floor': np.floor,
+    'ceil': np.ceil,
+    'round_half_up': lambda values: np.floor(values + 0.5),
+}
+
+class UsageReductionRules:
+    """
+    Compiled itemCount-to-usage reduction rules.
+
+    The rules are compiled into a PartNumber index and a divisor lookup array, so
+    the divisor of every row is found and applied with columnar operations.
+    PartNumbers without a rule keep their itemCount (divisor 1).
+    """
+
+    def __init__(self, rules: Dict[str, Any], rounding: str = 'truncate', version: Optional[str] = None):
+        if not isinstance(rules, dict):
+            logger.error("ITEMCOUNT_TO_USAGE_REDUCTION_RULES is not a dictionary")
+            raise ValueError("ITEMCOUNT_TO_USAGE_REDUCTION_RULES is not a dictionary")
+        if rounding not in ROUNDING_POLICIES:
+            logger.error("Invalid rounding policy: %s", rounding)
+            raise ValueError(f"Rounding policy must be one of {ROUNDING_POLICIES}. Found: {rounding}")
+        invalid = {key: value for key, value in rules.items() if not _is_positive_number(value)}
+        if invalid:
+            logger.error("Invalid usage reduction divisors: %s", invalid)
+            raise ValueError(f"Usage reduction divisors must be positive numbers. Found: {invalid}")
+        self.rules = dict(rules)
+        self.rounding = rounding
+        self.version = version
+        self._index = pd.Index(list(self.rules.keys()), dtype=object)
+        # The extra trailing 1.0 is picked up by the -1 returned for PartNumbers without a rule
+        self._divisors = np.append(np.array(list(self.rules.values()), dtype='float64'), 1.0)
+
+    @classmethod
+    def from_file(cls, filepath: str, default_rounding: str = 'truncate') -> "UsageReductionRules":
+        """
+        Load rules from a versioned JSON file:
+        {"version": "...", "rounding": "truncate", "rules": {"PartNumber": divisor}}
+        """
+        try:
+            with open(filepath, 'r') as f:
+                content = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            logger.error("Failed to load usage reduction rules: %s", e)
+            raise RuntimeError(f"Failed to load usage reduction rules: {e}")
+        if not isinstance(content, dict) or 'version' not in content or 'rules' not in content:
+            logger.error("Usage reduction rules file must contain 'version' and 'rules'")
+            raise ValueError("Usage reduction rules file must contain 'version' and 'rules'")
+        rules = cls(content['rules'], rounding=content.get('rounding', default_rounding), version=str(content['version']))
+        logger.info("Loaded %d usage reduction rules (version %s) from %s", len(rules.rules), rules.version, filepath)
+        return rules
+
+    def divisors(self, part_numbers: pd.Series) -> np.ndarray:
+        """Look up the divisor of every PartNumber in one vectorized step."""
+        return self._divisors[self._index.get_indexer(part_numbers)]
+
+    def reduce(self, item_counts: pd.Series, part_numbers: pd.Series) -> pd.Series:
+        """Divide itemCount by its PartNumber's divisor, without rounding."""
+        return item_counts / self.divisors(part_numbers)
+
+    def round(self, usage: pd.Series) -> pd.Series:
+        """Round usage to integers following the rounding policy."""
+        return _ROUNDING_FUNCTIONS[self.rounding](usage).astype('int64')
+
+def compile_usage_reduction_rules(rules: Any, rounding: str = 'truncate') -> UsageReductionRules:
+    """Return compiled rules, compiling a plain {PartNumber: divisor} dictionary if needed."""
+    if isinstance(rules, UsageReductionRules):
+        return rules
+    return UsageReductionRules(rules, rounding=rounding)
+
+def _is_positive_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0
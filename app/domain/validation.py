@@ -0,0 +1,369 @@
+import codecs
+import json
+import logging
+import os
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional, Tuple
+from app.domain.df_functions import INPUT_FORMATS, detect_input_compression, detect_input_format, sniff_input_format
+
+logger = logging.getLogger(__name__)
+
+# Row rules a column can have: not_null (true), min and max (numbers), max_length (characters) and
+# allowed_characters (the supported characters, with ranges such as "A-Za-z0-9")
+COLUMN_RULES = ('not_null', 'min', 'max', 'max_length', 'allowed_characters')
+
+# Text values read with undecodable bytes hold REPLACEMENT_CHARACTER
+ENCODING_RULE = 'encoding'
+REPLACEMENT_CHARACTER = '\ufffd'
+
+# Whether each byte is an ASCII character str.isspace counts as whitespace
+_BLANK_BYTES = np.array([chr(code).isspace() and code < 128 for code in range(256)])
+
+VALIDATION_VIOLATION_COLUMN = 'validation_violation'
+
+VALIDATION_SUMMARY_FILENAME = 'validation_summary.csv'
+
+_INT_MIN, _INT_MAX = -2 ** 31, 2 ** 31 - 1
+
+# Used when validation is enabled without a rules file. Bounds are those of the database INT columns.
+DEFAULT_VALIDATION_RULES: Dict[str, Any] = {
+    'file': {
+        'types': list(INPUT_FORMATS),
+        'max_bytes': 10 * 1024 ** 3,
+        'encoding': 'utf-8',
+    },
+    'columns': {
+        'PartnerID': {'not_null': True, 'min': 0, 'max': _INT_MAX},
+        'accountGuid': {'not_null': True, 'max_length': 36},
+        'domains': {'max_length': 253, 'allowed_characters': 'A-Za-z0-9.-'},
+        'plan': {'max_length': 255, 'allowed_characters': ' -~'},
+        'PartNumber': {'max_length': 64, 'allowed_characters': 'A-Za-z0-9_-'},
+        'itemCount': {'not_null': True, 'min': _INT_MIN, 'max': _INT_MAX},
+    },
+}
+
+class ValidationRules:
+    """
+    Compiled usage report validation rules:
+    {"file": {"types": [...], "max_bytes": N, "encoding": "utf-8"},
+     "columns": {"<column>": {"not_null": true, "min": 0, "max": 100, "max_length": 36, "allowed_characters": "0-9"}}}
+
+    File rules reject the whole report. Column rules are evaluated once per distinct value of
+    each column, with numpy string operations, and broadcast to its rows.
+    Columns without rules, or rules for columns that are not loaded, are skipped.
+    """
+
+    def __init__(self, rules: Dict[str, Any]):
+        if not isinstance(rules, dict) or not isinstance(rules.get('columns', {}), dict):
+            logger.error("Validation rules must be a dictionary with a 'columns' dictionary")
+            raise ValueError("Validation rules must be a dictionary with a 'columns' dictionary")
+        file_rules = rules.get('file', {})
+        self.rules = rules
+        self.file_types: List[str] = list(file_rules.get('types', INPUT_FORMATS))
+        self.max_file_bytes: Optional[int] = file_rules.get('max_bytes')
+        self.encoding: Optional[str] = file_rules.get('encoding')
+        unknown_types = [file_type for file_type in self.file_types if file_type not in INPUT_FORMATS]
+        if unknown_types:
+            logger.error("Invalid validation file types: %s", unknown_types)
+            raise ValueError(f"Validation file types must be among {INPUT_FORMATS}. Found: {unknown_types}")
+        if self.max_file_bytes is not None and (not isinstance(self.max_file_bytes, int) or self.max_file_bytes <= 0):
+            logger.error("Invalid validation max_bytes: %s", self.max_file_bytes)
+            raise ValueError(f"Validation max_bytes must be a positive integer. Found: {self.max_file_bytes}")
+        if self.encoding is not None:
+            try:
+                codecs.lookup(self.encoding)
+            except LookupError:
+                logger.error("Invalid validation encoding: %s", self.encoding)
+                raise ValueError(f"Unknown validation encoding: {self.encoding}")
+        self.columns: Dict[str, Dict[str, Any]] = {
+            column: _compile_column_rules(column, column_rules) for column, column_rules in rules.get('columns', {}).items()
+        }
+
+    @classmethod
+    def from_file(cls, filepath: str) -> "ValidationRules":
+        """Load rules from a JSON file in the format above."""
+        try:
+            with open(filepath, 'r') as f:
+                content = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            logger.error("Failed to load validation rules: %s", e)
+            raise RuntimeError(f"Failed to load validation rules: {e}")
+        rules = cls(content)
+        logger.info("Loaded validation rules for %d columns from %s", len(rules.columns), filepath)
+        return rules
+
+def check_usage_report_file(filepath: str, rules: ValidationRules) -> None:
+    """
+    Business rule: reject a usage report whose type is not allowed, whose content does not match
+    its extension, or that is larger than the size limit.
+    """
+    input_format = detect_input_format(filepath)
+    if input_format not in rules.file_types:
+        logger.error("Usage report type %s is not allowed: %s", input_format, filepath)
+        raise ValueError(f"Usage report type must be one of {rules.file_types}. Found: {input_format} ({filepath})")
+    # Compressed reports are CSV; their magic bytes are the codec's
+    sniffed_format = 'csv'
+    if detect_input_compression(filepath) is None:
+        sniffed_format = sniff_input_format(filepath) or 'csv'
+    if sniffed_format != input_format:
+        logger.error("Usage report %s holds %s data but is read as %s", filepath, sniffed_format, input_format)
+        raise ValueError(f"Usage report {filepath} holds {sniffed_format} data but is read as {input_format}")
+    size = os.path.getsize(filepath)
+    if rules.max_file_bytes is not None and size > rules.max_file_bytes:
+        logger.error("Usage report %s is %d bytes, over the %d bytes limit", filepath, size, rules.max_file_bytes)
+        raise ValueError(f"Usage report {filepath} is {size} bytes, over the {rules.max_file_bytes} bytes limit")
+
+def apply_validation_rules(df: pd.DataFrame, rules: ValidationRules) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Business rule: check every row of the usage report against the column rules and, if the rules
+    set an encoding, flag text values holding undecodable bytes (read as REPLACEMENT_CHARACTER).
+    Returns:
+        Tuple of (valid_df, validation_error_df, summary_df); violating rows get a 'validation_violation'
+        column naming each `column:rule` they break, and summary_df counts the violations per rule and column.
+    """
+    checks: List[Tuple[str, str, np.ndarray]] = []
+    check_encoding = rules.encoding is not None
+    # Shared, never written to, by the checks without violations
+    no_rows = np.zeros(len(df), dtype=bool)
+    for column in df.columns:
+        column_rules = rules.columns.get(column, {})
+        if not column_rules and not check_encoding:
+            continue
+        values = df[column]
+        if _is_number_column(values) and set(column_rules) <= {'not_null', 'min', 'max'}:
+            violations = _number_violations(column_rules, values, check_encoding, no_rows)
+        else:
+            violations = _screen_text_column(column_rules, values, check_encoding, no_rows)
+        if violations is None:
+            # Something was found: the rows breaking each rule come from the codes of every row
+            codes, uniques = _distinct(values)
+            violations = [
+                (rule, _broadcast(unique_mask, codes) | (codes == -1) if rule == 'not_null' else _broadcast(unique_mask, codes))
+                for rule, unique_mask in _column_violations(column_rules, uniques, check_encoding)
+            ]
+        checks += [(rule, column, mask) for rule, mask in violations]
+
+    violating = np.zeros(len(df), dtype=bool)
+    for _, _, mask in checks:
+        violating |= mask
+    summary_df = pd.DataFrame({
+        'rule': [rule for rule, _, _ in checks],
+        'column': [column for _, column, _ in checks],
+        'violations': np.array([0 if mask is no_rows else int(mask.sum()) for _, _, mask in checks], dtype='int64'),
+    })
+
+    violating_rows = np.flatnonzero(violating)
+    validation_error_df = df.iloc[violating_rows].copy()
+    violations = pd.Series('', index=validation_error_df.index, dtype=object)
+    for rule, column, mask in checks:
+        broken = mask[violating_rows]
+        if broken.any():
+            violations = violations.mask(broken, violations + f'{column}:{rule};')
+    validation_error_df[VALIDATION_VIOLATION_COLUMN] = violations.str.rstrip(';')
+    if len(violating_rows):
+        logger.warning("Found %d rows violating the validation rules", len(violating_rows))
+        df = df[~violating].copy()
+    return df, validation_error_df, summary_df
+
+def _compile_column_rules(column: str, column_rules: Any) -> Dict[str, Any]:
+    if not isinstance(column_rules, dict):
+        logger.error("Validation rules of %s are not a dictionary", column)
+        raise ValueError(f"Validation rules of {column} must be a dictionary")
+    unknown = [rule for rule in column_rules if rule not in COLUMN_RULES]
+    if unknown:
+        logger.error("Unknown validation rules for %s: %s", column, unknown)
+        raise ValueError(f"Validation rules must be among {COLUMN_RULES}. Found for {column}: {unknown}")
+    compiled = dict(column_rules)
+    for rule in ('min', 'max'):
+        if rule in compiled and (isinstance(compiled[rule], bool) or not isinstance(compiled[rule], (int, float))):
+            logger.error("Invalid %s bound for %s: %s", rule, column, compiled[rule])
+            raise ValueError(f"Validation {rule} of {column} must be a number. Found: {compiled[rule]}")
+    max_length = compiled.get('max_length')
+    if max_length is not None and (not isinstance(max_length, int) or max_length <= 0):
+        logger.error("Invalid max_length for %s: %s", column, max_length)
+        raise ValueError(f"Validation max_length of {column} must be a positive integer. Found: {max_length}")
+    if 'allowed_characters' in compiled:
+        allowed = compiled['allowed_characters']
+        if not isinstance(allowed, str) or not allowed:
+            logger.error("Invalid allowed_characters for %s: %s", column, allowed)
+            raise ValueError(f"Validation allowed_characters of {column} must be a non-empty string. Found: {allowed}")
+        compiled['allowed_characters'] = _expand_ranges(allowed)
+    return compiled
+
+def _expand_ranges(characters: str) -> str:
+    """Expand ranges such as "a-z" into their characters; a '-' first or last is itself."""
+    expanded: List[str] = []
+    index = 0
+    while index < len(characters):
+        if index + 2 < len(characters) and characters[index + 1] == '-':
+            first, last = ord(characters[index]), ord(characters[index + 2])
+            if first > last:
+                logger.error("Invalid character range: %s", characters[index:index + 3])
+                raise ValueError(f"Invalid validation character range: {characters[index:index + 3]}")
+            expanded.extend(chr(code) for code in range(first, last + 1))
+            index += 3
+        else:
+            expanded.append(characters[index])
+            index += 1
+    return ''.join(dict.fromkeys(expanded))
+
+def _number_violations(
+    column_rules: Dict[str, Any],
+    values: pd.Series,
+    check_encoding: bool,
+    no_rows: np.ndarray
+) -> List[Tuple[str, np.ndarray]]:
+    """The mask of each rule over the rows of a numeric column, compared as a whole; numbers hold no undecodable text."""
+    if isinstance(values.dtype, np.dtype) and values.dtype.kind in 'iu':
+        numbers = values.to_numpy()
+        missing = no_rows
+    else:
+        numbers = values.to_numpy(dtype='float64', na_value=np.nan)
+        missing = np.isnan(numbers)
+    violations: List[Tuple[str, np.ndarray]] = []
+    if column_rules.get('not_null'):
+        violations.append(('not_null', missing))
+    with np.errstate(invalid='ignore'):
+        if 'min' in column_rules:
+            violations.append(('min', numbers < column_rules['min']))
+        if 'max' in column_rules:
+            violations.append(('max', numbers > column_rules['max']))
+    if check_encoding:
+        violations.append((ENCODING_RULE, no_rows))
+    return violations
+
+def _screen_text_column(
+    column_rules: Dict[str, Any],
+    values: pd.Series,
+    check_encoding: bool,
+    no_rows: np.ndarray
+) -> Optional[List[Tuple[str, np.ndarray]]]:
+    """
+    Check the text rules of a column of ASCII strings on all its rows at once: the rows are joined by
+    newlines into one byte array, whose newlines give each row's length. Returns a mask without
+    violations per rule, or None when a rule may be broken or the column holds anything else (missing
+    values, numbers, non-ASCII or multi-line text), left to the exact check over the distinct values.
+    """
+    if values.dtype != object or len(values) == 0 or 'min' in column_rules or 'max' in column_rules:
+        return None
+    rows = values.tolist()
+    try:
+        joined = '\n'.join(rows)
+    except TypeError:
+        return None
+    if not joined.isascii():
+        return None
+    encoded = joined.encode('ascii')
+    data = np.frombuffer(encoded, dtype=np.uint8)
+    ends = np.append(np.flatnonzero(data == ord('\n')), len(data))
+    if len(ends) != len(rows):
+        return None
+    lengths = np.diff(ends, prepend=-1) - 1
+    rules: List[str] = []
+    if column_rules.get('not_null'):
+        # A blank row is empty or starts with whitespace; rows starting with whitespace are left to the exact check
+        if not lengths.all() or _BLANK_BYTES[data[ends - lengths]].any():
+            return None
+        rules.append('not_null')
+    if 'max_length' in column_rules:
+        if lengths.max() > column_rules['max_length']:
+            return None
+        rules.append('max_length')
+    if 'allowed_characters' in column_rules:
+        if _has_unsupported_characters(encoded, len(rows), column_rules['allowed_characters']):
+            return None
+        rules.append('allowed_characters')
+    if check_encoding:
+        # ASCII text holds no REPLACEMENT_CHARACTER
+        rules.append(ENCODING_RULE)
+    return [(rule, no_rows) for rule in rules]
+
+def _column_violations(
+    column_rules: Dict[str, Any],
+    uniques: np.ndarray,
+    check_encoding: bool
+) -> List[Tuple[str, np.ndarray]]:
+    """
+    The mask of each rule of one column over its distinct values; not_null's mask only covers blank
+    values, as missing values have no distinct value.
+    Text rules first scan all the distinct values at once, and only check them one by one, with
+    numpy string operations, when the scan finds something.
+    """
+    violations: List[Tuple[str, np.ndarray]] = []
+    values = _text_values(uniques)
+    none = np.zeros(len(values), dtype=bool)
+    if column_rules.get('not_null'):
+        blank = none
+        if '' in values or any(map(str.isspace, values)):
+            text = _as_strings(values)
+            blank = np.strings.isspace(text) | (np.strings.str_len(text) == 0)
+        violations.append(('not_null', blank))
+    if 'min' in column_rules or 'max' in column_rules:
+        # Values that are not numbers are left to the schema
+        numbers = pd.to_numeric(pd.Series(uniques, dtype=object), errors='coerce').to_numpy(dtype='float64')
+        with np.errstate(invalid='ignore'):
+            if 'min' in column_rules:
+                violations.append(('min', numbers < column_rules['min']))
+            if 'max' in column_rules:
+                violations.append(('max', numbers > column_rules['max']))
+    if 'max_length' in column_rules:
+        too_long = none
+        if values and max(map(len, values)) > column_rules['max_length']:
+            too_long = np.strings.str_len(_as_strings(values)) > column_rules['max_length']
+        violations.append(('max_length', too_long))
+    if 'allowed_characters' not in column_rules and not check_encoding:
+        return violations
+    joined = '\n'.join(values)
+    if 'allowed_characters' in column_rules:
+        allowed = column_rules['allowed_characters']
+        unsupported = none
+        if _has_unsupported_characters(joined.encode('utf-8'), len(values), allowed):
+            unsupported = np.strings.strip(_as_strings(values), allowed) != ''
+        violations.append(('allowed_characters', unsupported))
+    if check_encoding:
+        undecodable = none
+        if REPLACEMENT_CHARACTER in joined:
+            undecodable = np.strings.find(_as_strings(values), REPLACEMENT_CHARACTER) >= 0
+        violations.append((ENCODING_RULE, undecodable))
+    return violations
+
+def _text_values(uniques: np.ndarray) -> List[str]:
+    """The distinct values as a list of strings; whole numbers read as float (a column with missing values) keep their integer text."""
+    if pd.api.types.infer_dtype(uniques, skipna=False) == 'string':
+        return uniques.tolist()
+    if uniques.dtype.kind == 'f' and np.isfinite(uniques).all() and (np.floor(uniques) == uniques).all():
+        return [str(value) for value in uniques.astype('int64').tolist()]
+    return [str(value) for value in uniques.tolist()]
+
+def _as_strings(values: List[str]) -> np.ndarray:
+    return np.array(values, dtype=np.dtypes.StringDType())
+
+def _has_unsupported_characters(joined: bytes, count: int, allowed: str) -> bool:
+    """Whether any of the `count` values in `joined` (UTF-8), separated by newlines, has a character outside `allowed`."""
+    if not allowed.isascii():
+        return True
+    # Deleting the supported bytes leaves only the separators when every character is supported
+    remaining = joined.translate(None, allowed.encode('ascii'))
+    return len(remaining) != (0 if '\n' in allowed else max(count - 1, 0))
+
+def _distinct(values: pd.Series) -> Tuple[np.ndarray, np.ndarray]:
+    """Codes of each row into the distinct values of the column; missing values get -1."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(), values.cat.categories.to_numpy()
+    codes, uniques = pd.factorize(values)
+    return codes, np.asarray(uniques)
+
+def _is_number_column(values: pd.Series) -> bool:
+    return pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_bool_dtype(values.dtype)
+
+def _broadcast(unique_mask: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    if not unique_mask.any():
+        return np.zeros(len(codes), dtype=bool)
+    # The trailing False is picked up by the -1 code of missing values
+    return np.append(unique_mask, False)[codes]
+
+def merge_validation_summaries(summary_df: pd.DataFrame, other_summary_df: pd.DataFrame) -> pd.DataFrame:
+    """Add up two validation summaries, e.g. of consecutive chunks, per rule and column."""
+    merged = pd.concat([summary_df, other_summary_df], ignore_index=True)
+    return merged.groupby(['rule', 'column'], sort=False, as_index=False)['violations'].sum()
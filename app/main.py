@@ -1,39 +1,200 @@
+import functools
 import logging
+import signal
+import threading
+from typing import TYPE_CHECKING, Optional
+
+from app.config.config import Config, get_config
+
+if TYPE_CHECKING:
+    from app.domain.product_mapping import ProductMapping
+    from app.domain.usage_reduction import UsageReductionRules
+    from app.domain.validation import ValidationRules
+    from app.services.db_loader import DatabaseLoader
+    from app.services.processor import FileProcessor
+    from app.services.sql_generator import SQLLayout
 
-from app.services.processor import FileProcessor
-from app.config.config import (
-    OUTPUT_FILES_PATH,
-    PARTNUMBER_TO_PRODUCT_MAP_FILEPATH,
-    USAGE_REPORT_FILEPATH,
-    PARTNER_IDS_TO_SKIP,
-    ITEMCOUNT_TO_USAGE_REDUCTION_RULES,
-    HEADERS
-)
-
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-file_processor = FileProcessor(
-    output_files_path=OUTPUT_FILES_PATH,
-    partnumber_to_product_map_filepath=PARTNUMBER_TO_PRODUCT_MAP_FILEPATH
-)
+# pandas and the services are imported by the functions below, so importing this module stays cheap
 
-def main() -> None:
+def create_file_processor(
+    config: Config,
+    output_files_path: Optional[str] = None,
+    partnumber_to_product_map: Optional["ProductMapping"] = None,
+    database_loader: Optional["DatabaseLoader"] = None,
+    validation_rules: Optional["ValidationRules"] = None
+) -> "FileProcessor":
+    """
+    Build the FileProcessor for `config`. The product map is loaded unless `partnumber_to_product_map` is given,
+    and the configured validation rules unless `validation_rules` is given.
+    `output_files_path` defaults to the configured one; without `database_loader`, one is created from the config.
+    """
+    from app.services.compression import OutputCompression
+    from app.services.db_loader import create_database_loader
+    from app.services.metrics import RunMetrics
+    from app.services.processor import FileProcessor
+
+    if database_loader is None:
+        database_loader = create_database_loader(config.database_url, config.database_pool_size, config.database_batch_size)
+    return FileProcessor(
+        output_files_path=output_files_path or config.output_files_path,
+        partnumber_to_product_map_filepath=config.partnumber_to_product_map_filepath,
+        partnumber_to_product_map=partnumber_to_product_map,
+        output_format=config.output_format,
+        database_loader=database_loader,
+        metrics=RunMetrics(
+            enabled=config.metrics_enabled,
+            trace_memory=config.metrics_trace_memory,
+            prometheus_filepath=config.metrics_prometheus_filepath
+        ),
+        domains_dedup_memory_budget_bytes=config.domains_dedup_memory_budget_mb * 1024 * 1024,
+        domains_dedup_spill_path=config.domains_dedup_spill_path,
+        output_workers=config.output_workers,
+        output_compression=OutputCompression(config.output_compression, config.output_compression_level),
+        sql_layout=sql_layout(config),
+        delta_snapshot_path=config.delta_snapshot_path,
+        consolidate_chargeable=config.consolidate_chargeable,
+        consolidation_rounding_point=config.consolidation_rounding_point,
+        validation_rules=validation_rules if validation_rules is not None else load_validation_rules(config),
+        error_log_max_rows=config.error_log_max_rows,
+        error_log_sample_rows=config.error_log_sample_rows
+    )
+
+def sql_layout(config: Config) -> "SQLLayout":
+    """The INSERT statement layout configured by SQL_STATEMENT_ROWS, SQL_TRANSACTION_STATEMENTS and SQL_SHARDS."""
+    from app.services.sql_generator import SQLLayout
+
+    return SQLLayout(config.sql_statement_rows, config.sql_transaction_statements, config.sql_shards, config.sql_shard_key)
+
+def load_usage_reduction_rules(config: Optional[Config] = None) -> "UsageReductionRules":
+    """Load reduction rules from the versioned rules file if configured, otherwise from the env var."""
+    from app.domain.usage_reduction import UsageReductionRules
+
+    config = config or get_config()
+    if config.usage_reduction_rules_filepath:
+        return UsageReductionRules.from_file(config.usage_reduction_rules_filepath, default_rounding=config.usage_rounding)
+    return UsageReductionRules(config.itemcount_to_usage_reduction_rules, rounding=config.usage_rounding)
+
+def load_validation_rules(config: Config) -> Optional["ValidationRules"]:
+    """The validation rules file if configured, the built-in rules if VALIDATE_INPUT is set, otherwise None."""
+    from app.domain.validation import DEFAULT_VALIDATION_RULES, ValidationRules
+
+    if config.validation_rules_filepath:
+        return ValidationRules.from_file(config.validation_rules_filepath)
+    if config.validate_input:
+        return ValidationRules(DEFAULT_VALIDATION_RULES)
+    return None
+
+def main(config: Optional[Config] = None) -> None:
     """
     Entry point for the CSV parser and translator.
     """
+    config = config or get_config()
+    if not config.usage_report_filepath:
+        logger.error("No usage report to translate")
+        raise ValueError("Environment variable 'USAGE_REPORT_FILEPATH' is required but not set.")
     logger.info('Initializing the Translator')
+    file_processor = create_file_processor(config)
     try:
         file_processor.process(
-            usage_report_filepath=USAGE_REPORT_FILEPATH,
-            partner_ids_to_skip=PARTNER_IDS_TO_SKIP,
-            itemcount_to_usage_reduction_rules=ITEMCOUNT_TO_USAGE_REDUCTION_RULES,
-            headers=HEADERS
+            usage_report_filepath=config.usage_report_filepath,
+            partner_ids_to_skip=config.partner_ids_to_skip,
+            itemcount_to_usage_reduction_rules=load_usage_reduction_rules(config),
+            headers=config.headers,
+            chunksize=config.chunksize,
+            force=config.force_run
         )
         logger.info('Translation completed successfully.')
     except Exception as e:
         logger.error("Failed to complete translation: %s", e)
         raise
+    finally:
+        if file_processor.database_loader is not None:
+            file_processor.database_loader.close()
+
+def batch_main(usage_reports: str, config: Optional[Config] = None) -> None:
+    """
+    Entry point for translating every usage report in a directory or matching a glob pattern.
+    """
+    from app.services.batch import BatchProcessor, find_usage_reports
+
+    config = config or get_config()
+    if config.delta_snapshot_path:
+        logger.error("Delta mode is not supported in batch mode")
+        raise ValueError("Delta mode (DELTA_SNAPSHOT_PATH) is not supported in batch mode.")
+    logger.info('Initializing the Translator in batch mode for %s', usage_reports)
+    try:
+        batch_processor = BatchProcessor(
+            output_files_path=config.output_files_path,
+            partnumber_to_product_map_filepath=config.partnumber_to_product_map_filepath,
+            max_workers=config.batch_max_workers,
+            # Each report gets a processor built from the same config as a single run
+            create_file_processor=functools.partial(
+                create_file_processor, config, validation_rules=load_validation_rules(config)
+            )
+        )
+        summary_df = batch_processor.process(
+            usage_report_filepaths=find_usage_reports(usage_reports),
+            partner_ids_to_skip=config.partner_ids_to_skip,
+            itemcount_to_usage_reduction_rules=load_usage_reduction_rules(config),
+            headers=config.headers,
+            chunksize=config.chunksize
+        )
+        failed = summary_df[summary_df['status'] == 'failed']
+        if not failed.empty:
+            raise RuntimeError(f"{len(failed)} of {len(summary_df)} usage reports failed: {list(failed['usage_report'])}")
+        logger.info('Batch translation completed successfully.')
+    except Exception as e:
+        logger.error("Failed to complete batch translation: %s", e)
+        raise
+
+def watch_main(config: Optional[Config] = None, stop_event: Optional[threading.Event] = None) -> None:
+    """
+    Entry point for the long-running mode translating every usage report that arrives in the watched folder.
+    Runs until `stop_event` is set, SIGTERM is received or it is interrupted.
+    """
+    from app.services.db_loader import create_database_loader
+    from app.services.watcher import FolderWatcher
+
+    config = config or get_config()
+    if not config.watch_path:
+        logger.error("No folder to watch")
+        raise ValueError("Environment variable 'WATCH_PATH' is required but not set.")
+    if config.delta_snapshot_path and config.watch_max_workers > 1:
+        logger.error("Delta mode with %d watch workers", config.watch_max_workers)
+        raise ValueError("Delta mode (DELTA_SNAPSHOT_PATH) translates one report at a time; set WATCH_MAX_WORKERS=1.")
+    stop_event = stop_event or threading.Event()
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+    # One pool of database connections and one copy of the validation rules shared by every report
+    database_loader = create_database_loader(config.database_url, config.database_pool_size, config.database_batch_size)
+    validation_rules = load_validation_rules(config)
+    try:
+        watcher = FolderWatcher(
+            watch_path=config.watch_path,
+            output_files_path=config.output_files_path,
+            partnumber_to_product_map_filepath=config.partnumber_to_product_map_filepath,
+            partner_ids_to_skip=config.partner_ids_to_skip,
+            itemcount_to_usage_reduction_rules=load_usage_reduction_rules(config),
+            headers=config.headers,
+            chunksize=config.chunksize,
+            done_path=config.watch_done_path,
+            failed_path=config.watch_failed_path,
+            max_workers=config.watch_max_workers,
+            poll_interval=config.watch_poll_seconds,
+            create_file_processor=lambda output_files_path, partnumber_to_product_map: create_file_processor(
+                config, output_files_path, partnumber_to_product_map, database_loader, validation_rules
+            )
+        )
+        watcher.run(stop_event)
+    except Exception as e:
+        logger.error("Failed to watch %s: %s", config.watch_path, e)
+        raise
+    finally:
+        if database_loader is not None:
+            database_loader.close()
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     main()
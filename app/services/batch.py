@@ -0,0 +1,177 @@
+import functools
+import glob
+import logging
+import os
+import time
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Union
+from app.domain.product_mapping import ProductMapping, compile_product_mapping
+from app.domain.usage_reduction import UsageReductionRules
+from app.services.processor import FileProcessor
+from app.services.totals import TotalsAggregator
+
+logger = logging.getLogger(__name__)
+
+USAGE_REPORT_EXTENSIONS = ('.csv', '.csv.gz', '.csv.xz', '.csv.bz2', '.parquet', '.pq', '.feather', '.arrow', '.ipc')
+_COMPRESSED_EXTENSIONS = ('.gz', '.xz', '.bz2')
+
+# (output_files_path, partnumber_to_product_map or None to load it) -> FileProcessor
+FileProcessorFactory = Callable[[str, Optional[ProductMapping]], FileProcessor]
+
+# Per-worker state, set once by _init_worker so each report does not reload it
+_worker_state: Dict[str, Any] = {}
+
+def _init_worker(
+    create_file_processor: FileProcessorFactory,
+    partnumber_to_product_map: ProductMapping,
+    itemcount_to_usage_reduction_rules: UsageReductionRules
+) -> None:
+    _worker_state['create_file_processor'] = create_file_processor
+    _worker_state['partnumber_to_product_map'] = partnumber_to_product_map
+    _worker_state['itemcount_to_usage_reduction_rules'] = itemcount_to_usage_reduction_rules
+
+def _process_report(
+    usage_report_filepath: str,
+    output_files_path: str,
+    partner_ids_to_skip: List[int],
+    headers: List[str],
+    chunksize: Optional[int]
+) -> Dict[str, Any]:
+    """Translate one usage report in a worker process and return its summary row."""
+    started = time.perf_counter()
+    summary: Dict[str, Any] = {
+        'usage_report': usage_report_filepath,
+        'output_files_path': output_files_path,
+        'status': 'ok',
+        'error': '',
+    }
+    file_processor: Optional[FileProcessor] = None
+    try:
+        os.makedirs(output_files_path, exist_ok=True)
+        file_processor = _worker_state['create_file_processor'](output_files_path, _worker_state['partnumber_to_product_map'])
+        file_processor.process(
+            usage_report_filepath=usage_report_filepath,
+            partner_ids_to_skip=partner_ids_to_skip,
+            itemcount_to_usage_reduction_rules=_worker_state['itemcount_to_usage_reduction_rules'],
+            headers=headers,
+            chunksize=chunksize
+        )
+    except Exception as e:
+        logger.error("Failed to translate %s: %s", usage_report_filepath, e)
+        summary['status'] = 'failed'
+        summary['error'] = str(e)
+    finally:
+        if file_processor is not None and file_processor.database_loader is not None:
+            file_processor.database_loader.close()
+    summary['seconds'] = round(time.perf_counter() - started, 3)
+    return summary
+
+def _default_file_processor(
+    partnumber_to_product_map_filepath: str,
+    output_files_path: str,
+    partnumber_to_product_map: Optional[ProductMapping]
+) -> FileProcessor:
+    return FileProcessor(output_files_path, partnumber_to_product_map_filepath, partnumber_to_product_map)
+
+def find_usage_reports(path_or_pattern: str) -> List[str]:
+    """Resolve a directory (all usage reports inside it) or a glob pattern into a sorted list of files."""
+    if os.path.isdir(path_or_pattern):
+        filepaths = [
+            os.path.join(path_or_pattern, name) for name in os.listdir(path_or_pattern)
+            if name.lower().endswith(USAGE_REPORT_EXTENSIONS)
+        ]
+    else:
+        filepaths = glob.glob(path_or_pattern)
+    return sorted(path for path in filepaths if os.path.isfile(path))
+
+def report_output_path(output_files_path: str, usage_report_filepath: str) -> str:
+    """The folder a report's outputs are written to: `<output_files_path>/<report name without extensions>`."""
+    name = os.path.basename(usage_report_filepath)
+    if name.lower().endswith(_COMPRESSED_EXTENSIONS):
+        name = os.path.splitext(name)[0]
+    name = os.path.splitext(name)[0]
+    return os.path.join(output_files_path, name)
+
+class BatchProcessor:
+    """
+    Translates many usage reports at once over a process pool.
+
+    The product map and reduction rules are loaded once and handed to each
+    worker process; every report writes its own output set to
+    `<output_files_path>/<report name>/`.
+    """
+
+    def __init__(
+        self,
+        output_files_path: str,
+        partnumber_to_product_map_filepath: str,
+        max_workers: Optional[int] = None,
+        partnumber_to_product_map: Optional[Union[Dict[str, str], ProductMapping]] = None,
+        create_file_processor: Optional[FileProcessorFactory] = None
+    ):
+        """
+        `max_workers` defaults to the number of CPU cores.
+        `create_file_processor(output_files_path, partnumber_to_product_map)` builds the processor for
+        one report, as in watch mode; it is sent to the worker processes, so it must be picklable
+        (e.g. a functools.partial of a module-level function). A database loader it creates is closed
+        once its report is done.
+        """
+        self.output_files_path = output_files_path
+        self.partnumber_to_product_map_filepath = partnumber_to_product_map_filepath
+        self.max_workers = max_workers or os.cpu_count() or 1
+        if partnumber_to_product_map is None:
+            self.partnumber_to_product_map = ProductMapping.from_file(partnumber_to_product_map_filepath)
+        else:
+            self.partnumber_to_product_map = compile_product_mapping(partnumber_to_product_map)
+        self._create_file_processor = create_file_processor or functools.partial(
+            _default_file_processor, partnumber_to_product_map_filepath
+        )
+
+    def process(
+        self,
+        usage_report_filepaths: List[str],
+        partner_ids_to_skip: List[int],
+        itemcount_to_usage_reduction_rules: UsageReductionRules,
+        headers: List[str],
+        chunksize: Optional[int] = None
+    ) -> pd.DataFrame:
+        """
+        Translate every report and write the combined batch_summary.csv and totals files.
+        Returns the summary with one row per report.
+        """
+        if not usage_report_filepaths:
+            logger.error("No usage reports to process")
+            raise ValueError("No usage reports to process")
+        output_dirs = [report_output_path(self.output_files_path, filepath) for filepath in usage_report_filepaths]
+        duplicated = sorted({path for path in output_dirs if output_dirs.count(path) > 1})
+        if duplicated:
+            logger.error("Usage reports with the same name would share outputs: %s", duplicated)
+            raise ValueError(f"Usage reports with the same name would share outputs: {duplicated}")
+
+        max_workers = min(self.max_workers, len(usage_report_filepaths))
+        logger.info("Translating %d usage reports with %d workers", len(usage_report_filepaths), max_workers)
+        with ProcessPoolExecutor(
+            max_workers=max_workers,
+            initializer=_init_worker,
+            initargs=(self._create_file_processor, self.partnumber_to_product_map, itemcount_to_usage_reduction_rules)
+        ) as executor:
+            futures = [
+                executor.submit(_process_report, filepath, output_dir, partner_ids_to_skip, headers, chunksize)
+                for filepath, output_dir in zip(usage_report_filepaths, output_dirs)
+            ]
+            summary_df = pd.DataFrame([future.result() for future in futures])
+
+        os.makedirs(self.output_files_path, exist_ok=True)
+        summary_df.to_csv(f'{self.output_files_path}/batch_summary.csv', index=False)
+        self._write_combined_totals(summary_df)
+        failed = int((summary_df['status'] == 'failed').sum())
+        logger.info("Batch finished: %d succeeded, %d failed", len(summary_df) - failed, failed)
+        return summary_df
+
+    def _write_combined_totals(self, summary_df: pd.DataFrame) -> None:
+        """Merge the per-report totals into combined totals_by_<dimension>.csv files."""
+        totals = TotalsAggregator()
+        for output_dir in summary_df.loc[summary_df['status'] == 'ok', 'output_files_path']:
+            totals.merge(TotalsAggregator.read(output_dir))
+        totals.write(self.output_files_path)
@@ -0,0 +1,98 @@
+import bz2
+import gzip
+import io
+import logging
+import lzma
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_COMPRESSIONS = ('none', 'gzip', 'xz', 'bz2')
+
+_EXTENSIONS: Dict[str, str] = {'none': '', 'gzip': '.gz', 'xz': '.xz', 'bz2': '.bz2'}
+_DEFAULT_LEVELS: Dict[str, int] = {'gzip': 6, 'xz': 6, 'bz2': 9}
+_LEVEL_RANGES: Dict[str, Tuple[int, int]] = {'gzip': (0, 9), 'xz': (0, 9), 'bz2': (1, 9)}
+# Commands psql can read compressed COPY data through
+_DECOMPRESS_COMMANDS: Dict[str, str] = {'gzip': 'gzip -dc', 'xz': 'xz -dc', 'bz2': 'bzip2 -dc'}
+
+class OutputCompression:
+    """
+    How output files are written: as plain text ('none') or through a streaming
+    gzip, xz or bz2 compressor at `level`, with the matching file extension.
+
+    Files are compressed as they are written, on whichever thread writes them, so
+    with output workers the compression runs off the main thread. gzip files carry
+    no timestamp, so the same rows always compress to the same bytes.
+    """
+
+    def __init__(self, method: str = 'none', level: Optional[int] = None):
+        """`level` defaults to 6 for gzip and xz, and 9 for bz2."""
+        if method not in OUTPUT_COMPRESSIONS:
+            logger.error("Invalid output compression: %s", method)
+            raise ValueError(f"Output compression must be one of {OUTPUT_COMPRESSIONS}. Found: {method}")
+        if method != 'none':
+            if level is None:
+                level = _DEFAULT_LEVELS[method]
+            low, high = _LEVEL_RANGES[method]
+            if not low <= level <= high:
+                logger.error("Invalid %s compression level: %s", method, level)
+                raise ValueError(f"{method} compression level must be between {low} and {high}. Found: {level}")
+        self.method = method
+        self.level = level if method != 'none' else None
+
+    def __repr__(self) -> str:
+        return f"OutputCompression({self.method!r}, {self.level!r})"
+
+    @property
+    def enabled(self) -> bool:
+        return self.method != 'none'
+
+    @property
+    def extension(self) -> str:
+        return _EXTENSIONS[self.method]
+
+    @property
+    def decompress_command(self) -> Optional[str]:
+        """Shell command writing a compressed file's content to stdout, e.g. for psql's \\copy ... FROM PROGRAM."""
+        return _DECOMPRESS_COMMANDS.get(self.method)
+
+    def filename(self, name: str) -> str:
+        """The name of the output file `name` once compressed, e.g. insert_into_chargeable.sql.gz."""
+        return f'{name}{self.extension}'
+
+    def open(self, filepath: str, mode: str = 'w', newline: Optional[str] = None, encoding: Optional[str] = None) -> Any:
+        """
+        Open `filepath` for writing ('w') or appending ('a') text.
+        Appending to a compressed file adds a new compressed stream, which every decompressor reads as one file.
+        """
+        if mode not in ('w', 'a'):
+            raise ValueError(f"Output files are opened with mode 'w' or 'a'. Found: {mode}")
+        if not self.enabled:
+            return open(filepath, mode, newline=newline, encoding=encoding)
+        binary_mode = f'{mode}b'
+        if self.method == 'gzip':
+            raw = open(filepath, binary_mode)
+            try:
+                # The file name and mtime are left out of the header to keep outputs reproducible
+                compressed: Any = _OwningGzipFile(
+                    filename='', mode=binary_mode, compresslevel=self.level, fileobj=raw, mtime=0
+                )
+            except Exception:
+                raw.close()
+                raise
+        elif self.method == 'xz':
+            compressed = lzma.open(filepath, binary_mode, preset=self.level)
+        else:
+            compressed = bz2.open(filepath, binary_mode, compresslevel=self.level)
+        return io.TextIOWrapper(compressed, encoding=encoding, newline=newline)
+
+class _OwningGzipFile(gzip.GzipFile):
+    """A GzipFile that also closes the file object it writes to."""
+
+    def close(self) -> None:
+        fileobj = self.fileobj
+        try:
+            super().close()
+        finally:
+            if fileobj is not None:
+                fileobj.close()
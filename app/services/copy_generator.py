@@ -0,0 +1,135 @@
+import pandas as pd
+from typing import Any, List, Optional
+from app.services.compression import OutputCompression
+from app.services.sql_generator import CHARGEABLE_COLUMNS, DOMAINS_COLUMNS, DEFAULT_BLOCK_SIZE
+from app.utils.strings import escape_copy_text_column, escape_copy_csv_column
+
+COPY_FORMATS = ('text', 'csv')
+
+class CopyDataWriter:
+    """
+    Streams COPY-ready data, one line per row, to a file.
+
+    Rows can be written in any number of batches. With `compression`, the file is compressed as it is written.
+    """
+
+    def __init__(self, filepath: str, compression: Optional[OutputCompression] = None):
+        self.filepath = filepath
+        self.compression = compression or OutputCompression()
+        self._file: Any = None
+
+    def __enter__(self) -> "CopyDataWriter":
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def open(self) -> None:
+        self._file = self.compression.open(self.filepath, "w", newline='')
+
+    def write_rows(self, rows: List[str]) -> None:
+        if not rows:
+            return
+        self._file.write('\n'.join(rows) + '\n')
+
+    def close(self) -> None:
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+
+class CopyGenerator:
+    """
+    Writes the chargeable and domains tables as PostgreSQL COPY data, in text or csv format,
+    plus a psql script with the matching \\copy commands.
+
+    Rows are the same as the ones written by SQLGenerator; missing values become NULL.
+    """
+
+    def __init__(self, copy_format: str = 'csv'):
+        if copy_format not in COPY_FORMATS:
+            raise ValueError(f"COPY format must be one of {COPY_FORMATS}. Found: {copy_format}")
+        self.copy_format = copy_format
+        self.extension = 'csv' if copy_format == 'csv' else 'txt'
+        self.separator = ',' if copy_format == 'csv' else '\t'
+        self._escape_column = escape_copy_csv_column if copy_format == 'csv' else escape_copy_text_column
+
+    DRIVER_SCRIPT_FILENAME = 'copy_into_tables.sql'
+
+    def output_filenames(self, compression: Optional[OutputCompression] = None) -> List[str]:
+        """Names of the files written to the output folder."""
+        return [self.chargeable_filename(compression), self.domains_filename(compression), self.DRIVER_SCRIPT_FILENAME]
+
+    def chargeable_filename(self, compression: Optional[OutputCompression] = None) -> str:
+        return (compression or OutputCompression()).filename(f'copy_into_chargeable.{self.extension}')
+
+    def domains_filename(self, compression: Optional[OutputCompression] = None) -> str:
+        return (compression or OutputCompression()).filename(f'copy_into_domains.{self.extension}')
+
+    def chargeable_writer(self, output_files_path: str, compression: Optional[OutputCompression] = None) -> CopyDataWriter:
+        """Create a streaming writer for the chargeable table."""
+        return CopyDataWriter(f'{output_files_path}/{self.chargeable_filename(compression)}', compression)
+
+    def domains_writer(self, output_files_path: str, compression: Optional[OutputCompression] = None) -> CopyDataWriter:
+        """Create a streaming writer for the domains table."""
+        return CopyDataWriter(f'{output_files_path}/{self.domains_filename(compression)}', compression)
+
+    def chargeable_rows(self, chargeable_df: pd.DataFrame) -> List[str]:
+        """Build the COPY lines for the chargeable table, one column at a time."""
+        return self._format_rows([
+            chargeable_df['PartnerID'],
+            chargeable_df['product'],
+            chargeable_df['partnerPurchasedPlanID'],
+            chargeable_df['plan'],
+            chargeable_df['usage'].astype('int64'),
+        ])
+
+    def domains_rows(self, domains_df: pd.DataFrame) -> List[str]:
+        """Build the COPY lines for the domains table, one column at a time."""
+        return self._format_rows([domains_df['partnerPurchasedPlanID'], domains_df['domains']])
+
+    def write_chargeable_rows(
+        self,
+        writer: CopyDataWriter,
+        chargeable_df: pd.DataFrame,
+        block_size: int = DEFAULT_BLOCK_SIZE
+    ) -> None:
+        """Stream the chargeable lines to `writer` in blocks of `block_size` rows."""
+        for start in range(0, len(chargeable_df), block_size):
+            writer.write_rows(self.chargeable_rows(chargeable_df.iloc[start:start + block_size]))
+
+    def write_domains_rows(
+        self,
+        writer: CopyDataWriter,
+        domains_df: pd.DataFrame,
+        block_size: int = DEFAULT_BLOCK_SIZE
+    ) -> None:
+        """Stream the domains lines to `writer` in blocks of `block_size` rows."""
+        for start in range(0, len(domains_df), block_size):
+            writer.write_rows(self.domains_rows(domains_df.iloc[start:start + block_size]))
+
+    def write_driver_script(self, output_files_path: str, compression: Optional[OutputCompression] = None) -> None:
+        """
+        Write copy_into_tables.sql, a psql script loading both data files (run it from the output folder).
+        Compressed data files are read through their decompressor with FROM PROGRAM.
+        """
+        compression = compression or OutputCompression()
+        with open(f'{output_files_path}/{self.DRIVER_SCRIPT_FILENAME}', "w") as f:
+            for table, columns, filename in (
+                ('chargeable', CHARGEABLE_COLUMNS, self.chargeable_filename(compression)),
+                ('domains', DOMAINS_COLUMNS, self.domains_filename(compression)),
+            ):
+                prepared_columns = ", ".join(map(lambda c: f'"{c}"', columns))
+                source = f"'{filename}'"
+                if compression.enabled:
+                    source = f"PROGRAM '{compression.decompress_command} {filename}'"
+                f.write(f"\\copy {table} ({prepared_columns}) FROM {source} WITH (FORMAT {self.copy_format})\n")
+
+    def _format_rows(self, columns: List[pd.Series]) -> List[str]:
+        """Escape each column and join them with the format's separator."""
+        escaped = [self._escape_column(column).to_numpy(dtype=object) for column in columns]
+        rows = escaped[0].astype(object)
+        for values in escaped[1:]:
+            rows = rows + self.separator + values
+        return rows.tolist()
@@ -0,0 +1,279 @@
+import logging
+import os
+import threading
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional, Tuple
+from app.services.compression import OutputCompression
+from app.services.sql_generator import CHARGEABLE_COLUMNS, DOMAINS_COLUMNS, DEFAULT_BLOCK_SIZE, SQLGenerator
+
+logger = logging.getLogger(__name__)
+
+# Rows matched per DELETE statement, keeping each row-value IN list short
+DEFAULT_DELETE_ROWS = 1000
+
+# Rows copied per vectorized gather; the gather's byte index takes 8 bytes per byte of row text
+GATHER_ROWS = 16_384
+
+_EMPTY_KEYS = np.zeros(0, dtype='uint64')
+
+class RowSnapshot:
+    """
+    The rows of one table emitted by the last delta run, kept in `snapshot_path` as:
+    - `<table>.keys.npy`: the 64-bit hash of each row, sorted;
+    - `<table>.ends.npy`: where each row's text ends in the rows file, in the same order;
+    - `<table>.rows`: the rows' VALUES tuples, as written to the INSERT statements.
+
+    The arrays are memory-mapped, so looking rows up by key does not load the snapshot.
+    A new snapshot is staged next to the current one and only replaces it on `commit`.
+    """
+
+    def __init__(self, snapshot_path: str, table: str):
+        self.snapshot_path = snapshot_path
+        self.table = table
+
+    def filepaths(self, staged: bool = False) -> Tuple[str, str, str]:
+        suffix = '.new' if staged else ''
+        base = os.path.join(self.snapshot_path, self.table)
+        return f'{base}.keys.npy{suffix}', f'{base}.ends.npy{suffix}', f'{base}.rows{suffix}'
+
+    def load(self, staged: bool = False) -> Tuple[np.ndarray, np.ndarray, Any]:
+        """The sorted keys, row ends and row text of the snapshot; empty if there is none yet."""
+        keys_filepath, ends_filepath, rows_filepath = self.filepaths(staged)
+        if not os.path.exists(keys_filepath):
+            return _EMPTY_KEYS, np.zeros(0, dtype='int64'), b''
+        keys = np.load(keys_filepath, mmap_mode='r')
+        ends = np.load(ends_filepath, mmap_mode='r')
+        rows_size = os.path.getsize(rows_filepath)
+        if len(keys) != len(ends) or (len(ends) and ends[-1] != rows_size) or (not len(ends) and rows_size):
+            logger.error("Delta snapshot of %s in %s is inconsistent", self.table, self.snapshot_path)
+            raise RuntimeError(
+                f"Delta snapshot of {self.table} in {self.snapshot_path} is inconsistent; remove it to start a new one"
+            )
+        rows = np.memmap(rows_filepath, dtype='uint8', mode='r') if rows_size else b''
+        return keys, ends, rows
+
+    def commit(self) -> None:
+        """Replace the snapshot with the staged one, if any."""
+        if not os.path.exists(self.filepaths(staged=True)[0]):
+            return
+        for staged_filepath, filepath in zip(self.filepaths(staged=True), self.filepaths()):
+            os.replace(staged_filepath, filepath)
+
+class DeltaSQLWriter:
+    """
+    Collects the VALUES tuples of one table and, once closed, writes only the difference
+    with the table's snapshot: a DELETE of every row whose count changed or that disappeared,
+    then an INSERT of the rows that are new or whose count changed, in one transaction.
+
+    Rows are compared by a 64-bit hash of their text. A row's count is how many times it
+    appears in the table, so duplicate rows are deleted and re-inserted together.
+    The rows are staged as a new snapshot, committed by the generator after a successful run.
+    """
+
+    def __init__(
+        self,
+        filepath: str,
+        table: str,
+        columns: List[str],
+        snapshot: RowSnapshot,
+        compression: Optional[OutputCompression] = None,
+        delete_rows: int = DEFAULT_DELETE_ROWS
+    ):
+        self.filepath = filepath
+        self.table = table
+        self.columns = columns
+        self.snapshot = snapshot
+        self.compression = compression or OutputCompression()
+        self.delete_rows = delete_rows
+        self.inserted = 0
+        self.deleted = 0
+        self._rows_file: Any = None
+        self._keys: List[np.ndarray] = []
+        self._ends: List[np.ndarray] = []
+        self._size = 0
+
+    def __enter__(self) -> "DeltaSQLWriter":
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self._discard()
+            return
+        self.close()
+
+    def open(self) -> None:
+        os.makedirs(self.snapshot.snapshot_path, exist_ok=True)
+        # Rows in arrival order; sorted by key into the staged snapshot on close
+        self._rows_file = open(self._unsorted_filepath, 'wb')
+
+    def write_rows(self, rows: List[str]) -> None:
+        if not rows:
+            return
+        text = ''.join(rows)
+        encoded = text.encode('utf-8')
+        if len(encoded) == len(text):
+            # ASCII: each row's length in bytes is its length in characters
+            lengths = np.fromiter(map(len, rows), dtype='int64', count=len(rows))
+        else:
+            lengths = np.fromiter((len(row.encode('utf-8')) for row in rows), dtype='int64', count=len(rows))
+        self._keys.append(pd.util.hash_array(np.array(rows, dtype=object)))
+        self._ends.append(self._size + np.cumsum(lengths))
+        self._rows_file.write(encoded)
+        self._size = int(self._ends[-1][-1])
+
+    def close(self) -> None:
+        if self._rows_file is None:
+            return
+        self._rows_file.close()
+        self._rows_file = None
+        self._stage_snapshot()
+        os.remove(self._unsorted_filepath)
+        self._write_delta()
+        logger.info("Delta of %s: %d rows deleted, %d rows inserted", self.table, self.deleted, self.inserted)
+
+    @property
+    def _unsorted_filepath(self) -> str:
+        return os.path.join(self.snapshot.snapshot_path, f'{self.table}.rows.unsorted')
+
+    def _discard(self) -> None:
+        if self._rows_file is not None:
+            self._rows_file.close()
+            self._rows_file = None
+            os.remove(self._unsorted_filepath)
+
+    def _stage_snapshot(self) -> None:
+        """Sort the collected rows by key into the staged snapshot."""
+        keys = np.concatenate(self._keys) if self._keys else _EMPTY_KEYS
+        ends = np.concatenate(self._ends) if self._ends else np.zeros(0, dtype='int64')
+        order = np.argsort(keys, kind='stable')
+        keys_filepath, ends_filepath, rows_filepath = self.snapshot.filepaths(staged=True)
+        lengths = np.diff(ends, prepend=0)
+        with open(rows_filepath, 'wb') as rows_file:
+            if self._size:
+                rows = np.memmap(self._unsorted_filepath, dtype='uint8', mode='r')
+                for start in range(0, len(order), GATHER_ROWS):
+                    rows_file.write(_row_bytes(rows, ends, order[start:start + GATHER_ROWS])[0].tobytes())
+                del rows
+        _save_array(keys_filepath, keys[order])
+        _save_array(ends_filepath, np.cumsum(lengths[order], dtype='int64'))
+
+    def _write_delta(self) -> None:
+        previous_keys, previous_ends, previous_rows = self.snapshot.load()
+        current_keys, current_ends, current_rows = self.snapshot.load(staged=True)
+        deleted_keys, inserted_keys = _changed_keys(previous_keys, current_keys)
+        # One copy of each deleted row is enough to match all of them
+        deleted_positions = np.searchsorted(previous_keys, deleted_keys)
+        inserted_positions = np.flatnonzero(np.isin(current_keys, inserted_keys))
+        prepared_columns = ", ".join(map(lambda c: f'"{c}"', self.columns))
+        with self.compression.open(self.filepath, "w") as f:
+            f.write('BEGIN;\n')
+            for start in range(0, len(deleted_positions), self.delete_rows):
+                rows = _joined_rows(previous_rows, previous_ends, deleted_positions[start:start + self.delete_rows])
+                f.write(f'DELETE FROM {self.table} WHERE ({prepared_columns}) IN (\n' + rows + '\n);\n')
+            if len(inserted_positions):
+                f.write(f'INSERT INTO {self.table} ({prepared_columns}) VALUES\n')
+                for start in range(0, len(inserted_positions), GATHER_ROWS):
+                    if start:
+                        f.write(',\n')
+                    f.write(_joined_rows(current_rows, current_ends, inserted_positions[start:start + GATHER_ROWS]))
+                f.write('\n;\n')
+            f.write('COMMIT;\n')
+        self.deleted = len(deleted_positions)
+        self.inserted = len(inserted_positions)
+
+class DeltaSQLGenerator:
+    """
+    Writes, instead of the full INSERT files, the changes since the last delta run sharing
+    `snapshot_path`: delta_chargeable.sql and delta_domains.sql, each deleting the rows that
+    are gone or changed and inserting the new ones, in one transaction.
+
+    The first run, without a snapshot, inserts every row. The snapshots of both tables are
+    only replaced by `commit_snapshots`, called once the whole run succeeded, so a failed run
+    can be repeated. Runs sharing a snapshot folder must not overlap.
+    """
+
+    CHARGEABLE_FILENAME = 'delta_chargeable.sql'
+    DOMAINS_FILENAME = 'delta_domains.sql'
+
+    def __init__(self, snapshot_path: str):
+        self.snapshot_path = snapshot_path
+        self._snapshots: Dict[str, RowSnapshot] = {
+            'chargeable': RowSnapshot(snapshot_path, 'chargeable'),
+            'domains': RowSnapshot(snapshot_path, 'domains'),
+        }
+        self._lock = threading.Lock()
+
+    def output_filenames(self, compression: Optional[OutputCompression] = None) -> List[str]:
+        """Names of the files written to the output folder."""
+        compression = compression or OutputCompression()
+        return [compression.filename(self.CHARGEABLE_FILENAME), compression.filename(self.DOMAINS_FILENAME)]
+
+    def chargeable_writer(self, output_files_path: str, compression: Optional[OutputCompression] = None) -> DeltaSQLWriter:
+        """Create a writer collecting the chargeable rows and writing their delta on close."""
+        compression = compression or OutputCompression()
+        filepath = f'{output_files_path}/{compression.filename(self.CHARGEABLE_FILENAME)}'
+        return DeltaSQLWriter(filepath, 'chargeable', CHARGEABLE_COLUMNS, self._snapshots['chargeable'], compression)
+
+    def domains_writer(self, output_files_path: str, compression: Optional[OutputCompression] = None) -> DeltaSQLWriter:
+        """Create a writer collecting the domains rows and writing their delta on close."""
+        compression = compression or OutputCompression()
+        filepath = f'{output_files_path}/{compression.filename(self.DOMAINS_FILENAME)}'
+        return DeltaSQLWriter(filepath, 'domains', DOMAINS_COLUMNS, self._snapshots['domains'], compression)
+
+    def write_chargeable_rows(self, writer: DeltaSQLWriter, chargeable_df: pd.DataFrame, block_size: int = DEFAULT_BLOCK_SIZE) -> None:
+        """Stream the chargeable VALUES tuples to `writer` in blocks of `block_size` rows."""
+        SQLGenerator.write_chargeable_rows(writer, chargeable_df, block_size)
+
+    def write_domains_rows(self, writer: DeltaSQLWriter, domains_df: pd.DataFrame, block_size: int = DEFAULT_BLOCK_SIZE) -> None:
+        """Stream the domains VALUES tuples to `writer` in blocks of `block_size` rows."""
+        SQLGenerator.write_domains_rows(writer, domains_df, block_size)
+
+    def commit_snapshots(self) -> None:
+        """Make the rows of this run the snapshot the next run is compared with."""
+        with self._lock:
+            for snapshot in self._snapshots.values():
+                snapshot.commit()
+        logger.info("Delta snapshots committed to %s", self.snapshot_path)
+
+def _changed_keys(previous_keys: np.ndarray, current_keys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    The keys to delete (in the previous rows, with a different count now) and to insert
+    (in the current rows, with a different count before), from two sorted key arrays.
+    """
+    previous_unique, previous_counts = np.unique(previous_keys, return_counts=True)
+    current_unique, current_counts = np.unique(current_keys, return_counts=True)
+    _, previous_index, current_index = np.intersect1d(previous_unique, current_unique, assume_unique=True, return_indices=True)
+    unchanged = previous_counts[previous_index] == current_counts[current_index]
+    previous_changed = np.ones(len(previous_unique), dtype=bool)
+    previous_changed[previous_index[unchanged]] = False
+    current_changed = np.ones(len(current_unique), dtype=bool)
+    current_changed[current_index[unchanged]] = False
+    return previous_unique[previous_changed], current_unique[current_changed]
+
+def _row_bytes(rows: Any, ends: np.ndarray, positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    The bytes of the rows at `positions`, one after the other, and their lengths, gathered with one
+    fancy index into `rows` (the rows file, whose rows end at `ends`) instead of a slice per row.
+    """
+    if not len(positions):
+        return np.zeros(0, dtype='uint8'), np.zeros(0, dtype='int64')
+    row_ends = np.asarray(ends[positions], dtype='int64')
+    row_starts = np.where(positions > 0, ends[positions - 1], 0).astype('int64')
+    lengths = row_ends - row_starts
+    # Byte i of the output comes from byte i + (start of its row - start of its row in the output)
+    shifts = np.repeat(row_starts - (np.cumsum(lengths) - lengths), lengths)
+    return np.asarray(rows[np.arange(len(shifts), dtype='int64') + shifts]), lengths
+
+def _joined_rows(rows: Any, ends: np.ndarray, positions: np.ndarray, separator: bytes = b',\n') -> str:
+    """The text of the rows at `positions`, joined by `separator` and decoded at once."""
+    data, lengths = _row_bytes(rows, ends, positions)
+    row_ends = np.cumsum(lengths)[:-1]
+    data = np.insert(data, np.repeat(row_ends, len(separator)), np.tile(np.frombuffer(separator, dtype='uint8'), len(row_ends)))
+    return data.tobytes().decode('utf-8')
+
+def _save_array(filepath: str, values: np.ndarray) -> None:
+    # np.save adds .npy to names without it, so the file is written through a handle
+    with open(filepath, 'wb') as f:
+        np.save(f, values)
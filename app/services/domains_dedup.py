@@ -0,0 +1,228 @@
+import logging
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from typing import Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DOMAINS_DEDUP_COLUMNS = ['partnerPurchasedPlanID', 'domains']
+
+DEFAULT_MEMORY_BUDGET_BYTES = 256 * 1024 * 1024
+DEFAULT_PARTITIONS = 64
+DEFAULT_BLOCK_SIZE = 100_000
+
+# Approximate cost of one kept domain in the in-memory lookup: its uint64 hash, its position and a reference to
+# its string, with room to grow
+_LOOKUP_ENTRY_BYTES = 32
+
+class DomainsDeduplicator:
+    """
+    Keeps the first occurrence of each domain across a stream of domains chunks,
+    within a memory budget.
+
+    Chunks are added in stream order with `add`, and `drain` yields the surviving
+    rows in the same order. While the rows kept so far fit in `memory_budget_bytes`,
+    everything stays in memory: each chunk is checked against the sorted hashes of the
+    domains already kept. Past the budget, the kept rows are spilled to disk in hash partitions
+    of the domain. `drain` then deduplicates each partition on its own, so only one
+    partition needs to fit in memory, and writes its surviving rows back to disk cut into
+    ranges of `block_size` stream positions. The partitions are then merged back into stream
+    order one range at a time, so the merge holds at most `block_size` rows.
+
+    Domains are compared as strings wherever their hashes match, never by hash alone, so
+    first-occurrence semantics are exact. Use as a context manager, or call `close`, to remove the spill files.
+    """
+
+    def __init__(
+        self,
+        memory_budget_bytes: int = DEFAULT_MEMORY_BUDGET_BYTES,
+        spill_path: Optional[str] = None,
+        partitions: int = DEFAULT_PARTITIONS,
+        block_size: int = DEFAULT_BLOCK_SIZE
+    ):
+        """`spill_path` is the folder the spill directory is created in; defaults to the system temp folder."""
+        if memory_budget_bytes <= 0:
+            raise ValueError(f"Memory budget must be a positive integer. Found: {memory_budget_bytes}")
+        if partitions <= 0:
+            raise ValueError(f"Partitions must be a positive integer. Found: {partitions}")
+        self.memory_budget_bytes = memory_budget_bytes
+        self.spill_path = spill_path
+        self.partitions = partitions
+        self.block_size = block_size
+        self._rows_seen = 0
+        self._buffer: List[pd.DataFrame] = []
+        self._reset_lookup()
+        self._buffered_bytes = 0
+        self._spill_dir: Optional[str] = None
+        self._spill_files: Dict[int, List[str]] = {}
+        self._spills = 0
+
+    def __enter__(self) -> "DomainsDeduplicator":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    @property
+    def spilled(self) -> bool:
+        """Whether rows were spilled to disk."""
+        return self._spills > 0
+
+    def add(self, domains_df: pd.DataFrame) -> None:
+        """
+        Add the next chunk of domains rows, e.g. the output of prepare_domains_df for one chunk.
+        Rows whose domain was already kept from an earlier chunk still in memory are dropped right away.
+        """
+        chunk = domains_df[DOMAINS_DEDUP_COLUMNS].drop_duplicates(subset=['domains'], keep='first')
+        chunk = chunk.assign(seq=self._rows_seen + np.arange(len(chunk), dtype='int64'))
+        self._rows_seen += len(chunk)
+        domains = chunk['domains'].to_numpy(dtype=object)
+        hashes = _domain_hashes(domains)
+        if len(self._buffered_hashes):
+            is_new = ~self._is_buffered(domains, hashes)
+            chunk, domains, hashes = chunk[is_new], domains[is_new], hashes[is_new]
+        if chunk.empty:
+            return
+        self._buffer.append(chunk)
+        self._add_to_lookup(domains, hashes)
+        self._buffered_bytes += int(chunk.memory_usage(deep=True, index=False).sum()) + len(chunk) * _LOOKUP_ENTRY_BYTES
+        if self._buffered_bytes > self.memory_budget_bytes:
+            self._spill()
+
+    def drain(self) -> Iterator[pd.DataFrame]:
+        """Yield the first occurrence of every domain, in stream order, in blocks of at most `block_size` rows."""
+        if not self.spilled:
+            kept = self._take_buffer()
+            for start in range(0, len(kept), self.block_size):
+                yield kept.iloc[start:start + self.block_size].drop(columns='seq')
+            return
+
+        self._spill()
+        logger.info("Merging %d spilled domains partitions", len(self._spill_files))
+        # stream range -> the partitions' deduplicated rows in it, one file per partition
+        merge_files: Dict[int, List[str]] = {}
+        for partition in sorted(self._spill_files):
+            for stream_range, filepath in self._dedup_partition(partition):
+                merge_files.setdefault(stream_range, []).append(filepath)
+        self._spill_files = {}
+        for stream_range in sorted(merge_files):
+            filepaths = merge_files[stream_range]
+            rows = pd.concat([pd.read_pickle(filepath) for filepath in filepaths], ignore_index=True)
+            for filepath in filepaths:
+                os.remove(filepath)
+            yield rows.sort_values('seq', kind='stable', ignore_index=True).drop(columns='seq')
+
+    def close(self) -> None:
+        """Remove the spill files."""
+        if self._spill_dir is not None:
+            shutil.rmtree(self._spill_dir, ignore_errors=True)
+            self._spill_dir = None
+        self._spill_files = {}
+        self._buffer = []
+        self._reset_lookup()
+
+    def _reset_lookup(self) -> None:
+        # Hashes of the buffered domains, sorted, with the position of each domain in _buffered_domains,
+        # which holds them in arrival order and grows by doubling
+        self._buffered_hashes = np.empty(0, dtype=np.uint64)
+        self._buffered_positions = np.empty(0, dtype=np.int64)
+        self._buffered_domains = np.empty(0, dtype=object)
+        self._buffered_count = 0
+
+    def _add_to_lookup(self, domains: np.ndarray, hashes: np.ndarray) -> None:
+        count = self._buffered_count + len(domains)
+        if count > len(self._buffered_domains):
+            grown = np.empty(max(count, 2 * len(self._buffered_domains)), dtype=object)
+            grown[:self._buffered_count] = self._buffered_domains[:self._buffered_count]
+            self._buffered_domains = grown
+        self._buffered_domains[self._buffered_count:count] = domains
+        # A stable sort of two sorted runs is a merge
+        merged_hashes = np.concatenate([self._buffered_hashes, hashes])
+        order = np.argsort(merged_hashes, kind='stable')
+        self._buffered_hashes = merged_hashes[order]
+        positions = np.arange(self._buffered_count, count, dtype=np.int64)
+        self._buffered_positions = np.concatenate([self._buffered_positions, positions])[order]
+        self._buffered_count = count
+
+    def _is_buffered(self, domains: np.ndarray, hashes: np.ndarray) -> np.ndarray:
+        """Whether each domain is among the buffered domains: looked up by hash, then confirmed as a string."""
+        buffered_hashes = self._buffered_hashes
+        # Probing in hash order walks the sorted hashes once
+        probe_order = np.argsort(hashes)
+        sorted_probes = hashes[probe_order]
+        starts = np.empty(len(hashes), dtype=np.int64)
+        starts[probe_order] = np.searchsorted(buffered_hashes, sorted_probes)
+        found = buffered_hashes.take(starts, mode='clip') == hashes
+        is_buffered = np.zeros(len(domains), dtype=bool)
+        candidates = self._buffered_domains[self._buffered_positions[starts[found]]]
+        is_buffered[found] = candidates == domains[found]
+        # A hash shared by distinct domains: compare against every buffered domain with that hash
+        for row in np.flatnonzero(found & ~is_buffered):
+            end = np.searchsorted(buffered_hashes, hashes[row], side='right')
+            positions = self._buffered_positions[starts[row]:end]
+            is_buffered[row] = domains[row] in self._buffered_domains[positions].tolist()
+        return is_buffered
+
+    def _take_buffer(self) -> pd.DataFrame:
+        if self._buffer:
+            kept = pd.concat(self._buffer, ignore_index=True)
+        else:
+            kept = pd.DataFrame({column: pd.Series(dtype=object) for column in DOMAINS_DEDUP_COLUMNS + ['seq']})
+        self._buffer = []
+        self._reset_lookup()
+        self._buffered_bytes = 0
+        return kept
+
+    def _spill(self) -> None:
+        """Write the buffered rows to their hash partitions on disk and empty the buffer."""
+        kept = self._take_buffer()
+        if kept.empty:
+            return
+        if self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix='domains_dedup_', dir=self.spill_path)
+        partition_of_row = self._partition_of(kept['domains'])
+        order = np.argsort(partition_of_row, kind='stable')
+        bounds = np.searchsorted(partition_of_row[order], np.arange(self.partitions + 1))
+        for partition in range(self.partitions):
+            rows = order[bounds[partition]:bounds[partition + 1]]
+            if len(rows) == 0:
+                continue
+            filepath = os.path.join(self._spill_dir, f'spill_{partition:04d}_{self._spills:06d}.pkl')
+            kept.take(rows).to_pickle(filepath)
+            self._spill_files.setdefault(partition, []).append(filepath)
+        self._spills += 1
+        logger.info("Spilled %d domains rows to %s", len(kept), self._spill_dir)
+
+    def _partition_of(self, domains: pd.Series) -> np.ndarray:
+        hashes = pd.util.hash_pandas_object(domains, index=False).to_numpy()
+        return (hashes % np.uint64(self.partitions)).astype('int64')
+
+    def _dedup_partition(self, partition: int) -> List[Tuple[int, str]]:
+        """
+        Deduplicate one partition and write its surviving rows back to disk, cut into ranges of
+        `block_size` stream positions (seq), one file per range. Returns (range, file) pairs.
+        Spill files are read in the order they were written, which is stream order.
+        """
+        filepaths = self._spill_files[partition]
+        rows = pd.concat([pd.read_pickle(filepath) for filepath in filepaths], ignore_index=True)
+        rows = rows.drop_duplicates(subset=['domains'], keep='first')
+        for filepath in filepaths:
+            os.remove(filepath)
+        stream_ranges = rows['seq'].to_numpy() // self.block_size
+        bounds = np.flatnonzero(np.diff(stream_ranges)) + 1
+        range_files = []
+        for start, end in zip(np.concatenate([[0], bounds]), np.concatenate([bounds, [len(rows)]])):
+            if start == end:
+                continue
+            stream_range = int(stream_ranges[start])
+            filepath = os.path.join(self._spill_dir, f'merge_{stream_range:06d}_{partition:04d}.pkl')
+            rows.iloc[start:end].to_pickle(filepath)
+            range_files.append((stream_range, filepath))
+        return range_files
+
+def _domain_hashes(domains: np.ndarray) -> np.ndarray:
+    """uint64 hash of each domain."""
+    return pd.util.hash_array(domains, categorize=False)
@@ -0,0 +1,146 @@
+import logging
+import os
+import threading
+import zlib
+import numpy as np
+import pandas as pd
+from collections import Counter
+from typing import Dict, List, Optional
+from app.services.compression import OutputCompression
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SAMPLE_ROWS = 1000
+
+ERROR_COUNTS_FILENAME = 'error_counts.csv'
+
+class _CappedErrorLog:
+    """The state of one error log: rows seen, and the sample of the rows past the cap with their random keys."""
+
+    def __init__(self, name: str, seed: int):
+        self.name = name
+        self.rows = 0
+        self.columns: List[str] = []
+        self.sample: Optional[pd.DataFrame] = None
+        self.keys = np.zeros(0, dtype='float64')
+        # Seeded per log, so the sample does not depend on the order logs are written in
+        self.rng = np.random.default_rng([seed, zlib.crc32(name.encode('utf-8'))])
+
+class ErrorSink:
+    """
+    Bounds the error logs of a run: the first `max_rows` rows of each log are written in full, as
+    they are found; the rows past that are kept as a uniform sample of up to `sample_rows` rows,
+    written to `<log>_sample.csv` by `write`, and every row is counted per reason and PartnerID
+    in error_counts.csv.
+
+    The sample gives each row past the cap a random key and keeps the rows with the smallest keys,
+    so it is a reservoir sample folded in frame by frame, and the same for chunked and single-shot runs.
+    """
+
+    def __init__(self, max_rows: int, sample_rows: int = DEFAULT_SAMPLE_ROWS, seed: int = 0):
+        if max_rows < 0:
+            logger.error("Invalid error log row cap: %s", max_rows)
+            raise ValueError(f"Error log row cap must be zero or a positive integer. Found: {max_rows}")
+        if sample_rows < 0:
+            logger.error("Invalid error log sample size: %s", sample_rows)
+            raise ValueError(f"Error log sample size must be zero or a positive integer. Found: {sample_rows}")
+        self.max_rows = max_rows
+        self.sample_rows = sample_rows
+        self.seed = seed
+        self._logs: Dict[str, _CappedErrorLog] = {}
+        self._counts: Counter = Counter()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def reason(name: str) -> str:
+        """The reason an error log stands for, e.g. 'no_partnumber' for no_partnumber_error_df."""
+        return name[:-len('_error_df')] if name.endswith('_error_df') else name
+
+    @staticmethod
+    def output_filenames(names: List[str], compression: Optional[OutputCompression] = None) -> List[str]:
+        """Names of the sample files of the error logs `names`, and of the counts file."""
+        compression = compression or OutputCompression()
+        return [compression.filename(f'{name}_sample.csv') for name in names] + [ERROR_COUNTS_FILENAME]
+
+    def add(self, name: str, error_df: pd.DataFrame, append: bool = False) -> pd.DataFrame:
+        """
+        Count and sample the rows of one error log frame, and return the rows to write in full.
+        Without `append`, the log starts over, as its file does.
+        """
+        with self._lock:
+            if not append or name not in self._logs:
+                self._discard_counts(name)
+                self._logs[name] = _CappedErrorLog(name, self.seed)
+            log = self._logs[name]
+            log.columns = list(error_df.columns)
+            self._count(name, error_df)
+            in_full = max(min(self.max_rows - log.rows, len(error_df)), 0)
+            log.rows += len(error_df)
+            if in_full < len(error_df):
+                self._sample(log, error_df.iloc[in_full:])
+            return error_df.iloc[:in_full]
+
+    def write(self, output_files_path: str, compression: Optional[OutputCompression] = None) -> None:
+        """Write the sample of every error log, in the order its rows were found, and the counts."""
+        compression = compression or OutputCompression()
+        with self._lock:
+            for log in self._logs.values():
+                sample_df = pd.DataFrame(columns=log.columns) if log.sample is None else log.sample.sort_index(kind='stable')
+                filepath = os.path.join(output_files_path, compression.filename(f'{log.name}_sample.csv'))
+                with compression.open(filepath, 'w', newline='', encoding='utf-8') as f:
+                    sample_df.to_csv(f, index=False)
+                if log.rows > self.max_rows:
+                    logger.warning(
+                        "%s: %d rows, %d written in full, %d sampled",
+                        log.name, log.rows, self.max_rows, len(sample_df)
+                    )
+            self.counts().to_csv(os.path.join(output_files_path, ERROR_COUNTS_FILENAME), index=False)
+        logger.info("Error log samples and counts written to %s", output_files_path)
+
+    def counts(self) -> pd.DataFrame:
+        """Rows per reason and PartnerID, over every row of the error logs."""
+        rows = [(reason, partner_id, count) for (reason, partner_id), count in self._counts.items()]
+        counts_df = pd.DataFrame(rows, columns=['reason', 'PartnerID', 'rows'])
+        return counts_df.sort_values(['reason', 'PartnerID'], kind='stable', ignore_index=True)
+
+    def _count(self, name: str, error_df: pd.DataFrame) -> None:
+        if error_df.empty:
+            return
+        reason = self.reason(name)
+        if 'PartnerID' in error_df.columns:
+            partner_ids = error_df['PartnerID'].astype('string').fillna('')
+        else:
+            partner_ids = pd.Series('', index=error_df.index)
+        for partner_id, count in partner_ids.value_counts(sort=False).items():
+            self._counts[(reason, partner_id)] += int(count)
+
+    def _discard_counts(self, name: str) -> None:
+        reason = self.reason(name)
+        for key in [key for key in self._counts if key[0] == reason]:
+            del self._counts[key]
+
+    def _sample(self, log: _CappedErrorLog, overflow_df: pd.DataFrame) -> None:
+        """Fold the rows past the cap into the log's sample, keeping the rows with the smallest keys."""
+        if self.sample_rows == 0:
+            return
+        # Positions past the cap, to write the sample back in arrival order
+        positions = np.arange(log.rows - len(overflow_df), log.rows)
+        keys = log.rng.random(len(overflow_df))
+        if log.sample is not None and len(log.sample) == self.sample_rows:
+            # Only rows beating the largest kept key can enter the sample
+            candidates = keys < log.keys.max()
+            if not candidates.any():
+                return
+            overflow_df, positions, keys = overflow_df[candidates], positions[candidates], keys[candidates]
+        candidate_df = overflow_df.set_axis(positions)
+        sample_df = candidate_df if log.sample is None else pd.concat([log.sample, candidate_df])
+        all_keys = np.concatenate([log.keys, keys])
+        kept = _smallest(all_keys, self.sample_rows)
+        log.sample = sample_df.iloc[kept]
+        log.keys = all_keys[kept]
+
+def _smallest(keys: np.ndarray, count: int) -> np.ndarray:
+    """Positions of the `count` smallest keys."""
+    if len(keys) <= count:
+        return np.arange(len(keys))
+    return np.sort(np.argpartition(keys, count - 1)[:count])
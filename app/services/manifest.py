@@ -0,0 +1,76 @@
+import hashlib
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = 'run_manifest.json'
+MANIFEST_VERSION = 1
+
+_READ_BLOCK_SIZE = 1024 * 1024
+
+def file_digest(filepath: str) -> str:
+    """Content hash of a file, read in blocks so large reports are never held in memory."""
+    digest = hashlib.blake2b(digest_size=32)
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(_READ_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def value_digest(value: Any) -> str:
+    """Content hash of a JSON-serializable value, independent of key order."""
+    canonical = json.dumps(value, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.blake2b(canonical.encode('utf-8'), digest_size=32).hexdigest()
+
+class RunManifest:
+    """
+    Records the content hashes of a run's inputs and outputs in `<output_files_path>/run_manifest.json`.
+
+    A run can be skipped when its inputs hash the same as the recorded ones and
+    every recorded output still exists with the recorded hash.
+    """
+
+    def __init__(self, output_files_path: str):
+        self.output_files_path = output_files_path
+        self.filepath = os.path.join(output_files_path, MANIFEST_FILENAME)
+
+    def is_up_to_date(self, inputs: Dict[str, str]) -> bool:
+        """Check whether the recorded run has the same inputs and untouched outputs."""
+        manifest = self._load()
+        if manifest is None or manifest.get('inputs') != inputs:
+            return False
+        for filename, digest in manifest.get('outputs', {}).items():
+            filepath = os.path.join(self.output_files_path, filename)
+            if not os.path.isfile(filepath) or file_digest(filepath) != digest:
+                logger.info("Output %s changed since the last run", filename)
+                return False
+        return True
+
+    def write(self, inputs: Dict[str, str], output_filenames: List[str]) -> None:
+        """Record the inputs and the hashes of the outputs that exist."""
+        outputs = {
+            filename: file_digest(os.path.join(self.output_files_path, filename))
+            for filename in output_filenames
+            if os.path.isfile(os.path.join(self.output_files_path, filename))
+        }
+        manifest = {'version': MANIFEST_VERSION, 'inputs': inputs, 'outputs': outputs}
+        tmp_filepath = f'{self.filepath}.tmp'
+        with open(tmp_filepath, 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_filepath, self.filepath)
+        logger.info("Run manifest written to %s", self.filepath)
+
+    def _load(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.filepath, 'r') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning("Ignoring unreadable run manifest %s: %s", self.filepath, e)
+            return None
+        if not isinstance(manifest, dict) or manifest.get('version') != MANIFEST_VERSION:
+            return None
+        return manifest
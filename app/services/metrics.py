@@ -0,0 +1,261 @@
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+METRICS_FILENAME = 'metrics.json'
+PROMETHEUS_PREFIX = 'translator'
+
+def peak_rss_bytes() -> Optional[int]:
+    """High-water mark of the process resident set size, or None where it cannot be read."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+class StageMetrics:
+    """Totals of one pipeline stage; a stage run once per chunk accumulates across chunks."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.rows_in = 0
+        self.rows_out = 0
+        self.rejected: Dict[str, int] = {}
+        # Process-wide high-water mark, so it never goes down from one stage to the next
+        self.process_peak_rss_bytes: Optional[int] = None
+        self.peak_traced_bytes: Optional[int] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'calls': self.calls,
+            'wall_seconds': round(self.wall_seconds, 6),
+            'cpu_seconds': round(self.cpu_seconds, 6),
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'rejected': dict(self.rejected),
+            'process_peak_rss_bytes': self.process_peak_rss_bytes,
+            'peak_traced_bytes': self.peak_traced_bytes,
+        }
+
+class StageTimer:
+    """
+    Context manager measuring one run of a stage.
+    Call `rows(rows_in, rows_out, **rejected)` inside the block to record row counts.
+    """
+
+    def __init__(self, run_metrics: "RunMetrics", stage: StageMetrics):
+        self._run_metrics = run_metrics
+        self._stage = stage
+
+    def __enter__(self) -> "StageTimer":
+        if self._run_metrics.trace_memory:
+            tracemalloc.reset_peak()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        wall_seconds = time.perf_counter() - self._wall_start
+        cpu_seconds = time.process_time() - self._cpu_start
+        rss_bytes = peak_rss_bytes()
+        with self._run_metrics.lock:
+            stage = self._stage
+            stage.calls += 1
+            stage.wall_seconds += wall_seconds
+            stage.cpu_seconds += cpu_seconds
+            stage.process_peak_rss_bytes = _max(stage.process_peak_rss_bytes, rss_bytes)
+            if self._run_metrics.trace_memory:
+                stage.peak_traced_bytes = _max(stage.peak_traced_bytes, tracemalloc.get_traced_memory()[1])
+
+    def rows(self, rows_in: int, rows_out: int, **rejected: int) -> None:
+        """Record rows in and out, and the rows rejected per reason."""
+        with self._run_metrics.lock:
+            stage = self._stage
+            stage.rows_in += rows_in
+            stage.rows_out += rows_out
+            for reason, count in rejected.items():
+                stage.rejected[reason] = stage.rejected.get(reason, 0) + count
+
+class _NullStageTimer:
+    """Stand-in used when metrics are disabled, so instrumented code pays almost nothing."""
+
+    def __enter__(self) -> "_NullStageTimer":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+    def rows(self, rows_in: int, rows_out: int, **rejected: int) -> None:
+        pass
+
+_NULL_STAGE_TIMER = _NullStageTimer()
+
+class RunMetrics:
+    """
+    Per-stage metrics of one run: wall and CPU time, rows in and out, rows rejected per reason
+    and memory.
+
+    Memory is the process RSS high-water mark at the end of each stage: it covers the whole
+    process since it started, so a stage only raises it if it peaked above every earlier stage.
+    With `trace_memory` the peak of Python allocations within each stage is recorded as well,
+    using tracemalloc, which slows the run down noticeably; it only traces between `start` and `finish`.
+    When `enabled` is False, `stage()` returns a no-op timer and nothing is written.
+
+    Stages may run on several threads at once; their times then overlap, and CPU time
+    is the whole process's. With `trace_memory`, a stage's traced peak covers every
+    thread running at the same time.
+    """
+
+    def __init__(self, enabled: bool = True, trace_memory: bool = False, prometheus_filepath: Optional[str] = None):
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory
+        self.prometheus_filepath = prometheus_filepath
+        self._tracing_started = False
+        self.lock = threading.Lock()
+        self._reset()
+
+    def start(self) -> None:
+        """
+        Reset the stages and start the run clock, and tracemalloc when tracing memory.
+        Every `start` must be followed by `finish`, which stops tracemalloc again.
+        """
+        self._reset()
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing_started = True
+
+    def _reset(self) -> None:
+        self.stages: "OrderedDict[str, StageMetrics]" = OrderedDict()
+        self.status = 'running'
+        self._started_at = time.time()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        self._wall_seconds = 0.0
+        self._cpu_seconds = 0.0
+
+    def stage(self, name: str) -> Any:
+        """Timer for one run of the stage `name`."""
+        if not self.enabled:
+            return _NULL_STAGE_TIMER
+        with self.lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = StageMetrics(name)
+        return StageTimer(self, stage)
+
+    def finish(self, status: str) -> None:
+        """Stop the run clock with the run's final status (ok, skipped or failed)."""
+        self.status = status
+        self._wall_seconds = time.perf_counter() - self._wall_start
+        self._cpu_seconds = time.process_time() - self._cpu_start
+        if self._tracing_started:
+            tracemalloc.stop()
+            self._tracing_started = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'status': self.status,
+            'started_at': self._started_at,
+            'wall_seconds': round(self._wall_seconds, 6),
+            'cpu_seconds': round(self._cpu_seconds, 6),
+            'process_peak_rss_bytes': peak_rss_bytes(),
+            'stages': {name: stage.to_dict() for name, stage in self.stages.items()},
+        }
+
+    def write(self, output_files_path: str) -> None:
+        """
+        Write metrics.json to the output folder, and the Prometheus textfile if configured.
+        Failures are logged, not raised, so they never fail the run they describe.
+        """
+        if not self.enabled:
+            return
+        filepath = os.path.join(output_files_path, METRICS_FILENAME)
+        try:
+            _write_atomically(filepath, json.dumps(self.to_dict(), indent=2) + '\n')
+            logger.info("Run metrics written to %s", filepath)
+            if self.prometheus_filepath:
+                _write_atomically(self.prometheus_filepath, self.to_prometheus())
+                logger.info("Prometheus metrics written to %s", self.prometheus_filepath)
+        except Exception as e:
+            logger.error("Failed to write run metrics: %s", e)
+
+    def to_prometheus(self) -> str:
+        """The metrics in the Prometheus text exposition format, for the node exporter's textfile collector."""
+        metrics = self.to_dict()
+        lines = []
+
+        def gauge(name: str, help_text: str, samples: Any) -> None:
+            lines.append(f'# HELP {PROMETHEUS_PREFIX}_{name} {help_text}')
+            lines.append(f'# TYPE {PROMETHEUS_PREFIX}_{name} gauge')
+            for labels, value in samples:
+                if value is None:
+                    continue
+                label_text = ','.join(f'{key}="{_escape_label(str(val))}"' for key, val in labels.items())
+                lines.append(f'{PROMETHEUS_PREFIX}_{name}{{{label_text}}} {value}' if label_text
+                             else f'{PROMETHEUS_PREFIX}_{name} {value}')
+
+        stages = metrics['stages']
+        gauge('run_success', 'Whether the last run succeeded (1) or failed (0).',
+              [({}, 0 if metrics['status'] == 'failed' else 1)])
+        gauge('run_wall_seconds', 'Wall time of the last run.', [({}, metrics['wall_seconds'])])
+        gauge('run_cpu_seconds', 'CPU time of the last run.', [({}, metrics['cpu_seconds'])])
+        gauge('process_peak_rss_bytes', 'Peak resident memory of the process since it started, at the end of the last run.',
+              [({}, metrics['process_peak_rss_bytes'])])
+        gauge('stage_wall_seconds', 'Wall time spent in each pipeline stage.',
+              [({'stage': name}, stage['wall_seconds']) for name, stage in stages.items()])
+        gauge('stage_cpu_seconds', 'CPU time spent in each pipeline stage.',
+              [({'stage': name}, stage['cpu_seconds']) for name, stage in stages.items()])
+        gauge('stage_rows_in', 'Rows entering each pipeline stage.',
+              [({'stage': name}, stage['rows_in']) for name, stage in stages.items()])
+        gauge('stage_rows_out', 'Rows leaving each pipeline stage.',
+              [({'stage': name}, stage['rows_out']) for name, stage in stages.items()])
+        gauge('stage_rows_rejected', 'Rows rejected by each pipeline stage, per reason.',
+              [({'stage': name, 'reason': reason}, count)
+               for name, stage in stages.items() for reason, count in stage['rejected'].items()])
+        gauge('stage_process_peak_rss_bytes', 'Peak resident memory of the process since it started, at the end of each pipeline stage.',
+              [({'stage': name}, stage['process_peak_rss_bytes']) for name, stage in stages.items()])
+        gauge('stage_peak_traced_bytes', 'Peak Python allocations within each pipeline stage.',
+              [({'stage': name}, stage['peak_traced_bytes']) for name, stage in stages.items()])
+        return '\n'.join(lines) + '\n'
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _max(current: Optional[int], value: Optional[int]) -> Optional[int]:
+    if value is None:
+        return current
+    return value if current is None else max(current, value)
+
+def _write_atomically(filepath: str, text: str) -> None:
+    """
+    Write through a temporary file so readers (e.g. the textfile collector) never see a partial file.
+    The temporary file has a unique name, so concurrent runs writing the same file do not clash.
+    """
+    directory, name = os.path.split(os.path.abspath(filepath))
+    f = tempfile.NamedTemporaryFile('w', dir=directory, prefix=f'.{name}.', suffix='.tmp', delete=False)
+    try:
+        with f:
+            f.write(text)
+        # Temporary files are private; keep the metrics readable by e.g. the node exporter
+        os.chmod(f.name, 0o644)
+        os.replace(f.name, filepath)
+    except BaseException:
+        os.remove(f.name)
+        raise
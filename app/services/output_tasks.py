@@ -0,0 +1,79 @@
+import logging
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Optional
+
+logger = logging.getLogger(__name__)
+
+class OutputTasks:
+    """
+    Runs output tasks (file writes, database loads) either inline or on a thread pool,
+    so writing to disk overlaps with computing the next outputs.
+
+    With `max_workers` 0 every task runs inline when submitted, exactly as a plain call.
+    With a single worker, tasks run one at a time in submission order, which keeps
+    appends to the same file ordered. `max_pending` bounds the tasks waiting in the
+    queue, so frames queued for writing cannot pile up in memory.
+
+    The first failing task's exception, in submission order, is re-raised by `wait`
+    or when leaving the context manager, just as if it had been raised inline.
+    """
+
+    def __init__(self, max_workers: int = 0, max_pending: Optional[int] = None):
+        if max_workers < 0:
+            raise ValueError(f"Output workers must be zero or a positive integer. Found: {max_workers}")
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self._executor: Optional[ThreadPoolExecutor] = None
+        if max_workers:
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='output')
+        self._pending: Deque[Future] = deque()
+
+    def __enter__(self) -> "OutputTasks":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+            return
+        # The block already failed: let queued tasks finish without masking its exception
+        self.close(raise_errors=False)
+
+    @property
+    def concurrent(self) -> bool:
+        return self._executor is not None
+
+    def submit(self, task: Callable[..., Any], *args: Any, **kwargs: Any) -> None:
+        """Run `task(*args, **kwargs)` inline, or queue it on the pool."""
+        if self._executor is None:
+            task(*args, **kwargs)
+            return
+        self._pending.append(self._executor.submit(task, *args, **kwargs))
+        if self.max_pending is not None:
+            while len(self._pending) > self.max_pending:
+                self._pending.popleft().result()
+
+    def wait(self) -> None:
+        """Wait for every queued task, re-raising the first failure in submission order."""
+        first_error: Optional[BaseException] = None
+        while self._pending:
+            error = self._pending.popleft().exception()
+            if error is not None and first_error is None:
+                first_error = error
+        if first_error is not None:
+            raise first_error
+
+    def close(self, raise_errors: bool = True) -> None:
+        """Wait for the queued tasks and stop the pool."""
+        try:
+            if raise_errors:
+                self.wait()
+            else:
+                for future in self._pending:
+                    if future.exception() is not None:
+                        logger.error("Output task failed after an earlier error: %s", future.exception())
+                self._pending.clear()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
@@ -1,39 +1,447 @@
+import json
+import logging
+import os
+import threading
+import numpy as np
 import pandas as pd
-from typing import Any
-from app.utils.strings import escape_sql_value
+from typing import Any, Dict, List, Optional
+from app.services.compression import OutputCompression
+from app.utils.strings import escape_sql_column
+
+logger = logging.getLogger(__name__)
+
+CHARGEABLE_COLUMNS = ["partnerID", "product", "partnerPurchasedPlanID", "plan", "usage"]
+DOMAINS_COLUMNS = ["partnerPurchasedPlanID", "domain"]
+
+# Columns the chargeable rows can be sharded by; domains rows only carry partnerPurchasedPlanID
+SHARD_KEYS = ('PartnerID', 'partnerPurchasedPlanID')
+
+# Rows formatted and written per block, bounding the memory used by the SQL text
+DEFAULT_BLOCK_SIZE = 100_000
+
+class SQLStatementWriter:
+    """
+    Streams a single multi-row INSERT statement to a file.
+
+    Rows can be written in any number of batches; the output is the same as
+    writing every row at once. With `compression`, the file is compressed as it is written.
+    With `statement_rows`, a new INSERT statement is started every `statement_rows` rows, and with
+    `transaction_statements`, every `transaction_statements` statements are wrapped in BEGIN/COMMIT.
+    With either of them, or `skip_empty`, a file without rows is left empty instead of holding an
+    INSERT statement without values.
+
+    Rows go to a temporary file next to `filepath`, renamed into place on `close`; if the
+    `with` block fails, it is removed, so a failed run never leaves a complete-looking file.
+    """
+
+    def __init__(
+        self,
+        filepath: str,
+        table: str,
+        columns: List[str],
+        compression: Optional[OutputCompression] = None,
+        statement_rows: Optional[int] = None,
+        transaction_statements: Optional[int] = None,
+        skip_empty: bool = False
+    ):
+        self.filepath = filepath
+        self.table = table
+        self.columns = columns
+        self.compression = compression or OutputCompression()
+        self.statement_rows = statement_rows
+        self.transaction_statements = transaction_statements
+        # Statements are started by the first row written to them
+        self._lazy = statement_rows is not None or transaction_statements is not None or skip_empty
+        self.rows = 0
+        self.statements = 0
+        self._file: Any = None
+        self._has_rows = False
+        self._statement_open = False
+        self._statement_row_count = 0
+
+    def __enter__(self) -> "SQLStatementWriter":
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.discard()
+            return
+        self.close()
+
+    def open(self) -> None:
+        prepared_columns = list(map(lambda c: f'"{c}"', self.columns))
+        self._header = f'INSERT INTO {self.table} ({", ".join(prepared_columns)}) VALUES' + '\n'
+        self._file = self.compression.open(self._tmp_filepath, "w")
+        if not self._lazy:
+            self._file.write(self._header)
+
+    def write_rows(self, rows: List[str]) -> None:
+        if not rows:
+            return
+        self.rows += len(rows)
+        if not self._lazy:
+            if self._has_rows:
+                self._file.write(',\n')
+            self._file.write(',\n'.join(rows))
+            self._has_rows = True
+            return
+        start = 0
+        while start < len(rows):
+            if not self._statement_open:
+                self._begin_statement()
+            else:
+                self._file.write(',\n')
+            count = len(rows) - start
+            if self.statement_rows is not None:
+                count = min(count, self.statement_rows - self._statement_row_count)
+            self._file.write(',\n'.join(rows[start:start + count]))
+            self._statement_row_count += count
+            start += count
+            if self._statement_row_count == self.statement_rows:
+                self._end_statement()
+
+    def close(self) -> None:
+        if self._file is None:
+            return
+        if not self._lazy:
+            self._file.write('\n')
+            self._file.write(';\n')
+            self.statements = 1
+        else:
+            if self._statement_open:
+                self._end_statement()
+            if self.transaction_statements and self.statements % self.transaction_statements:
+                self._file.write('COMMIT;\n')
+        self._file.close()
+        self._file = None
+        os.replace(self._tmp_filepath, self.filepath)
+
+    def discard(self) -> None:
+        """Drop the rows written so far, leaving no file at `filepath`."""
+        if self._file is None:
+            return
+        try:
+            self._file.close()
+        finally:
+            self._file = None
+            os.remove(self._tmp_filepath)
+
+    @property
+    def _tmp_filepath(self) -> str:
+        return f'{self.filepath}.tmp'
+
+    def _begin_statement(self) -> None:
+        if self.transaction_statements and self.statements % self.transaction_statements == 0:
+            self._file.write('BEGIN;\n')
+        self._file.write(self._header)
+        self._statement_open = True
+        self._statement_row_count = 0
+
+    def _end_statement(self) -> None:
+        self._file.write('\n;\n')
+        self._statement_open = False
+        self.statements += 1
+        if self.transaction_statements and self.statements % self.transaction_statements == 0:
+            self._file.write('COMMIT;\n')
 
 class SQLGenerator:
+    CHARGEABLE_FILENAME = 'insert_into_chargeable.sql'
+    DOMAINS_FILENAME = 'insert_into_domains.sql'
+
+    @classmethod
+    def output_filenames(cls, compression: Optional[OutputCompression] = None) -> List[str]:
+        """Names of the files written to the output folder."""
+        compression = compression or OutputCompression()
+        return [compression.filename(cls.CHARGEABLE_FILENAME), compression.filename(cls.DOMAINS_FILENAME)]
+
+    @classmethod
+    def chargeable_writer(cls, output_files_path: str, compression: Optional[OutputCompression] = None) -> SQLStatementWriter:
+        """Create a streaming writer for the chargeable table."""
+        compression = compression or OutputCompression()
+        filepath = f'{output_files_path}/{compression.filename(cls.CHARGEABLE_FILENAME)}'
+        return SQLStatementWriter(filepath, 'chargeable', CHARGEABLE_COLUMNS, compression)
+
+    @classmethod
+    def domains_writer(cls, output_files_path: str, compression: Optional[OutputCompression] = None) -> SQLStatementWriter:
+        """Create a streaming writer for the domains table."""
+        compression = compression or OutputCompression()
+        filepath = f'{output_files_path}/{compression.filename(cls.DOMAINS_FILENAME)}'
+        return SQLStatementWriter(filepath, 'domains', DOMAINS_COLUMNS, compression)
+
+    @classmethod
+    def chargeable_rows(cls, chargeable_df: pd.DataFrame) -> List[str]:
+        """Build the VALUES tuples for the chargeable table, one column at a time."""
+        usage = chargeable_df['usage'].astype('int64')
+        return cls._format_rows([
+            chargeable_df['PartnerID'],
+            chargeable_df['product'],
+            chargeable_df['partnerPurchasedPlanID'],
+            chargeable_df['plan'],
+            usage,
+        ])
+
+    @classmethod
+    def domains_rows(cls, domains_df: pd.DataFrame) -> List[str]:
+        """Build the VALUES tuples for the domains table, one column at a time."""
+        return cls._format_rows([domains_df['partnerPurchasedPlanID'], domains_df['domains']])
+
+    @classmethod
+    def write_chargeable_rows(
+        cls,
+        writer: SQLStatementWriter,
+        chargeable_df: pd.DataFrame,
+        block_size: int = DEFAULT_BLOCK_SIZE
+    ) -> None:
+        """Stream the chargeable VALUES tuples to `writer` in blocks of `block_size` rows."""
+        for start in range(0, len(chargeable_df), block_size):
+            writer.write_rows(cls.chargeable_rows(chargeable_df.iloc[start:start + block_size]))
+
+    @classmethod
+    def write_domains_rows(
+        cls,
+        writer: SQLStatementWriter,
+        domains_df: pd.DataFrame,
+        block_size: int = DEFAULT_BLOCK_SIZE
+    ) -> None:
+        """Stream the domains VALUES tuples to `writer` in blocks of `block_size` rows."""
+        for start in range(0, len(domains_df), block_size):
+            writer.write_rows(cls.domains_rows(domains_df.iloc[start:start + block_size]))
+
     @classmethod
-    def write_chargeable_sql(cls, chargeable_df: pd.DataFrame, output_files_path: str) -> None:
+    def write_chargeable_sql(
+        cls,
+        chargeable_df: pd.DataFrame,
+        output_files_path: str,
+        block_size: int = DEFAULT_BLOCK_SIZE
+    ) -> None:
         """Write SQL insert statements for the chargeable table."""
-        with open(f'{output_files_path}/insert_into_chargeable.sql', "w") as f:
-            columns = ["partnerID", "product", "partnerPurchasedPlanID", "plan", "usage"]
-            columns = list(map(lambda c: f'"{c}"', columns))
-            start_of_query = f'INSERT INTO chargeable ({", ".join(columns)}) VALUES'
-            row_array = []
-            for _, row in chargeable_df.iterrows():
-                usage = int(row['usage'])
-                values = [row['PartnerID'], row['product'], row['partnerPurchasedPlanID'], row['plan'], usage]
-                values = list(map(escape_sql_value, values))
-                row_query = f"({', '.join(values)})"
-                row_array.append(row_query)
-            f.write(start_of_query + '\n')
-            f.write(',\n'.join(row_array) + '\n')
-            f.write(';\n')
-
-    @classmethod
-    def write_domains_sql(cls, domains_df: pd.DataFrame, output_files_path: str) -> None:
+        with cls.chargeable_writer(output_files_path) as writer:
+            cls.write_chargeable_rows(writer, chargeable_df, block_size)
+
+    @classmethod
+    def write_domains_sql(
+        cls,
+        domains_df: pd.DataFrame,
+        output_files_path: str,
+        block_size: int = DEFAULT_BLOCK_SIZE
+    ) -> None:
         """Write SQL insert statements for the domains table."""
-        with open(f'{output_files_path}/insert_into_domains.sql', "w") as f:
-            columns = ['partnerPurchasedPlanID', 'domain']
-            prepared_columns = list(map(lambda c: f'"{c}"', columns))
-            start_of_query = f'INSERT INTO domains ({", ".join(prepared_columns)}) VALUES'
-            row_array = []
-            for _, row in domains_df.iterrows():
-                values = [row['partnerPurchasedPlanID'], row['domains']]
-                prepared_values = list(map(escape_sql_value, values))
-                row_query = f"({', '.join(prepared_values)})"
-                row_array.append(row_query)
-            f.write(start_of_query + '\n')
-            f.write(',\n'.join(row_array) + '\n')
-            f.write(';\n')
\ No newline at end of file
+        with cls.domains_writer(output_files_path) as writer:
+            cls.write_domains_rows(writer, domains_df, block_size)
+
+    @classmethod
+    def _format_rows(cls, columns: List[pd.Series]) -> List[str]:
+        """Escape each column and join them into '(v1, v2, ...)' tuples."""
+        escaped = [escape_sql_column(column).to_numpy(dtype=object) for column in columns]
+        rows = np.full(len(escaped[0]), '(', dtype=object) + escaped[0]
+        for values in escaped[1:]:
+            rows = rows + ', ' + values
+        return (rows + ')').tolist()
+
+class SQLLayout:
+    """
+    How the INSERT statements are laid out: `statement_rows` rows per statement (None: one
+    statement per file), `transaction_statements` statements per BEGIN/COMMIT batch (None:
+    no explicit transactions) and `shards` files per table, rows being assigned to a shard
+    by a hash of `shard_key`.
+
+    Shards let several sessions load a table in parallel, and bounded statements and
+    transactions keep each one small and let a failed load resume at the next batch.
+    """
+
+    def __init__(
+        self,
+        statement_rows: Optional[int] = None,
+        transaction_statements: Optional[int] = None,
+        shards: int = 1,
+        shard_key: str = 'PartnerID'
+    ):
+        for name, value in (('statement_rows', statement_rows), ('transaction_statements', transaction_statements)):
+            if value is not None and value <= 0:
+                logger.error("Invalid %s: %s", name, value)
+                raise ValueError(f"{name} must be a positive integer. Found: {value}")
+        if shards <= 0:
+            logger.error("Invalid number of SQL shards: %s", shards)
+            raise ValueError(f"SQL shards must be a positive integer. Found: {shards}")
+        if shard_key not in SHARD_KEYS:
+            logger.error("Invalid SQL shard key: %s", shard_key)
+            raise ValueError(f"SQL shard key must be one of {SHARD_KEYS}. Found: {shard_key}")
+        self.statement_rows = statement_rows
+        self.transaction_statements = transaction_statements
+        self.shards = shards
+        self.shard_key = shard_key
+
+    def __repr__(self) -> str:
+        return (f"SQLLayout({self.statement_rows!r}, {self.transaction_statements!r}, "
+                f"{self.shards!r}, {self.shard_key!r})")
+
+    @property
+    def enabled(self) -> bool:
+        """Whether the layout differs from one INSERT statement per table in one file."""
+        return self.statement_rows is not None or self.transaction_statements is not None or self.shards > 1
+
+    def shard_of(self, values: pd.Series) -> np.ndarray:
+        """The shard of each value; the same value always lands in the same shard, across chunks and runs."""
+        if self.shards == 1:
+            return np.zeros(len(values), dtype='int64')
+        hashes = pd.util.hash_array(values.astype(str).to_numpy(dtype=object))
+        return (hashes % np.uint64(self.shards)).astype('int64')
+
+class ShardedSQLWriter:
+    """
+    Streams the rows of one table to one SQLStatementWriter per shard.
+
+    Rows keep their order within each shard. Once closed, the shards and their row
+    counts are recorded in the generator's shard manifest; if the `with` block fails,
+    every shard is discarded and nothing is recorded.
+    """
+
+    def __init__(self, generator: "ShardedSQLGenerator", output_files_path: str, table: str, writers: List[SQLStatementWriter]):
+        self.generator = generator
+        self.output_files_path = output_files_path
+        self.table = table
+        self.writers = writers
+        self._open = False
+
+    def __enter__(self) -> "ShardedSQLWriter":
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.discard()
+            return
+        self.close()
+
+    def open(self) -> None:
+        for writer in self.writers:
+            writer.open()
+        self._open = True
+
+    def write_rows(self, rows: List[str], shards: np.ndarray) -> None:
+        """Write each row to the shard at the same position in `shards`."""
+        if len(self.writers) == 1:
+            self.writers[0].write_rows(rows)
+            return
+        values = np.array(rows, dtype=object)
+        for shard, writer in enumerate(self.writers):
+            writer.write_rows(values[shards == shard].tolist())
+
+    def close(self) -> None:
+        if not self._open:
+            return
+        for writer in self.writers:
+            writer.close()
+        self._open = False
+        self.generator.record_shards(self.output_files_path, self.table, self.writers)
+
+    def discard(self) -> None:
+        for writer in self.writers:
+            writer.discard()
+        self._open = False
+
+class ShardedSQLGenerator:
+    """
+    Writes the chargeable and domains tables as INSERT statements laid out by a SQLLayout:
+    bounded statements, transaction batches and shard files, plus a manifest (sql_shards.json)
+    listing each table's shard files with their row and statement counts.
+
+    Chargeable rows are sharded by the layout's shard key; domains rows, which only carry
+    partnerPurchasedPlanID, are sharded by it. With a single shard, the files keep the
+    SQLGenerator names; otherwise the shard number is added, e.g. insert_into_chargeable_003.sql.
+    """
+
+    SHARD_MANIFEST_FILENAME = 'sql_shards.json'
+
+    def __init__(self, layout: SQLLayout):
+        self.layout = layout
+        self._shard_keys = {'chargeable': layout.shard_key, 'domains': 'partnerPurchasedPlanID'}
+        self._manifest: Dict[str, List[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def output_filenames(self, compression: Optional[OutputCompression] = None) -> List[str]:
+        """Names of the files written to the output folder."""
+        return (self.shard_filenames(SQLGenerator.CHARGEABLE_FILENAME, compression)
+                + self.shard_filenames(SQLGenerator.DOMAINS_FILENAME, compression)
+                + [self.SHARD_MANIFEST_FILENAME])
+
+    def shard_filenames(self, filename: str, compression: Optional[OutputCompression] = None) -> List[str]:
+        """The names of the shard files of the table written to `filename` by SQLGenerator."""
+        compression = compression or OutputCompression()
+        if self.layout.shards == 1:
+            return [compression.filename(filename)]
+        stem, extension = filename.rsplit('.', 1)
+        return [compression.filename(f'{stem}_{shard:03d}.{extension}') for shard in range(self.layout.shards)]
+
+    def chargeable_writer(self, output_files_path: str, compression: Optional[OutputCompression] = None) -> ShardedSQLWriter:
+        """Create a streaming writer for the chargeable table."""
+        return self._writer(output_files_path, 'chargeable', CHARGEABLE_COLUMNS, SQLGenerator.CHARGEABLE_FILENAME, compression)
+
+    def domains_writer(self, output_files_path: str, compression: Optional[OutputCompression] = None) -> ShardedSQLWriter:
+        """Create a streaming writer for the domains table."""
+        return self._writer(output_files_path, 'domains', DOMAINS_COLUMNS, SQLGenerator.DOMAINS_FILENAME, compression)
+
+    def write_chargeable_rows(
+        self,
+        writer: ShardedSQLWriter,
+        chargeable_df: pd.DataFrame,
+        block_size: int = DEFAULT_BLOCK_SIZE
+    ) -> None:
+        """Stream the chargeable VALUES tuples to their shards in blocks of `block_size` rows."""
+        for start in range(0, len(chargeable_df), block_size):
+            block = chargeable_df.iloc[start:start + block_size]
+            writer.write_rows(SQLGenerator.chargeable_rows(block), self.layout.shard_of(block[self._shard_keys['chargeable']]))
+
+    def write_domains_rows(
+        self,
+        writer: ShardedSQLWriter,
+        domains_df: pd.DataFrame,
+        block_size: int = DEFAULT_BLOCK_SIZE
+    ) -> None:
+        """Stream the domains VALUES tuples to their shards in blocks of `block_size` rows."""
+        for start in range(0, len(domains_df), block_size):
+            block = domains_df.iloc[start:start + block_size]
+            writer.write_rows(SQLGenerator.domains_rows(block), self.layout.shard_of(block[self._shard_keys['domains']]))
+
+    def record_shards(self, output_files_path: str, table: str, writers: List[SQLStatementWriter]) -> None:
+        """Add a table's shards to the manifest and rewrite it; the tables can be closed from different threads."""
+        with self._lock:
+            self._manifest[table] = [
+                {
+                    'shard': shard,
+                    'file': writer.filepath.rsplit('/', 1)[-1],
+                    'rows': writer.rows,
+                    'statements': writer.statements,
+                }
+                for shard, writer in enumerate(writers)
+            ]
+            content = {
+                'statement_rows': self.layout.statement_rows,
+                'transaction_statements': self.layout.transaction_statements,
+                'shards': self.layout.shards,
+                'tables': {
+                    name: {'shard_key': self._shard_keys[name], 'rows': sum(s['rows'] for s in shards), 'shards': shards}
+                    for name, shards in sorted(self._manifest.items())
+                },
+            }
+            with open(f'{output_files_path}/{self.SHARD_MANIFEST_FILENAME}', 'w') as f:
+                json.dump(content, f, indent=2)
+                f.write('\n')
+
+    def _writer(
+        self,
+        output_files_path: str,
+        table: str,
+        columns: List[str],
+        filename: str,
+        compression: Optional[OutputCompression]
+    ) -> ShardedSQLWriter:
+        writers = [
+            SQLStatementWriter(
+                f'{output_files_path}/{shard_filename}', table, columns, compression,
+                self.layout.statement_rows, self.layout.transaction_statements, skip_empty=True
+            )
+            for shard_filename in self.shard_filenames(filename, compression)
+        ]
+        return ShardedSQLWriter(self, output_files_path, table, writers)
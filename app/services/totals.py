@@ -0,0 +1,122 @@
+import logging
+import os
+import pandas as pd
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Totals file name suffix -> chargeable column to group on
+TOTALS_DIMENSIONS: Dict[str, str] = {
+    'product': 'product',
+    'partner': 'PartnerID',
+    'plan': 'plan',
+}
+TOTALS_MEASURES: List[str] = ['itemCount', 'usage']
+# Dimensions whose totals are split over several files, file name -> measures written to it.
+# totals_by_product.csv keeps its original product,itemCount columns for the consumers reading
+# it, and the usage per product goes to its own file
+TOTALS_FILES: Dict[str, Dict[str, List[str]]] = {
+    'product': {'totals_by_product.csv': ['itemCount'], 'totals_by_product_usage.csv': ['usage']},
+}
+
+class TotalsAggregator:
+    """
+    Running sums of raw itemCount and reduced usage per product, per PartnerID and per plan.
+
+    `update` folds in one frame of chargeable rows, e.g. one chunk, grouping on the
+    frame's own columns without copying it; only the small per-key sums are kept.
+    Aggregators built from different chunks, reports or workers combine with `merge`,
+    and `read` loads the totals files a run wrote so they can be merged too.
+    """
+
+    def __init__(self, dimensions: Optional[Dict[str, str]] = None, measures: Optional[List[str]] = None):
+        self.dimensions = dict(TOTALS_DIMENSIONS if dimensions is None else dimensions)
+        self.measures = list(TOTALS_MEASURES if measures is None else measures)
+        self._totals: Dict[str, pd.DataFrame] = {name: self._empty(name) for name in self.dimensions}
+
+    def update(self, chargeable_df: pd.DataFrame) -> "TotalsAggregator":
+        """Add the sums of one frame of chargeable rows."""
+        missing = [col for col in list(self.dimensions.values()) + self.measures if col not in chargeable_df.columns]
+        if missing:
+            logger.error("Missing required columns for totals: %s", missing)
+            raise ValueError(f"Missing required columns for totals: {missing}")
+        if chargeable_df.empty:
+            return self
+        for name, column in self.dimensions.items():
+            partial = chargeable_df.groupby(column, observed=True, sort=False)[self.measures].sum()
+            self._totals[name] = self._combine(self._totals[name], partial)
+        return self
+
+    def merge(self, other: "TotalsAggregator") -> "TotalsAggregator":
+        """Add the totals of another aggregator with the same dimensions, e.g. from another worker."""
+        if other.dimensions != self.dimensions or other.measures != self.measures:
+            logger.error("Cannot merge totals with different dimensions or measures")
+            raise ValueError("Cannot merge totals with different dimensions or measures")
+        for name in self.dimensions:
+            self._totals[name] = self._combine(self._totals[name], other._totals[name])
+        return self
+
+    def totals(self, name: str) -> pd.DataFrame:
+        """Totals of one dimension, one row per key sorted by key, one column per measure."""
+        totals = self._totals[name]
+        # A categorical index would be ordered by category rather than by value
+        if isinstance(totals.index.dtype, pd.CategoricalDtype):
+            totals.index = totals.index.astype(object)
+        return totals.sort_index()
+
+    def write(self, output_files_path: str) -> None:
+        """Write the totals files of every dimension, totals_by_<dimension>.csv unless split in TOTALS_FILES."""
+        for name in self.dimensions:
+            totals = self.totals(name)
+            for filename, measures in self.files(name).items():
+                filepath = os.path.join(output_files_path, filename)
+                try:
+                    totals[measures].to_csv(filepath, index=True)
+                except Exception as e:
+                    logger.error("Failed to write %s: %s", filepath, e)
+                    raise
+        logger.info("Totals by %s written to %s", ", ".join(self.dimensions), output_files_path)
+
+    @classmethod
+    def read(
+        cls,
+        output_files_path: str,
+        dimensions: Optional[Dict[str, str]] = None,
+        measures: Optional[List[str]] = None
+    ) -> "TotalsAggregator":
+        """Load the totals files written by `write`."""
+        aggregator = cls(dimensions, measures)
+        for name, column in aggregator.dimensions.items():
+            aggregator._totals[name] = pd.concat([
+                pd.read_csv(os.path.join(output_files_path, filename), index_col=column)[measures]
+                for filename, measures in aggregator.files(name).items()
+            ], axis=1)[aggregator.measures]
+        return aggregator
+
+    def files(self, name: str) -> Dict[str, List[str]]:
+        """The totals files of one dimension, file name -> measures written to it."""
+        files = {
+            filename: [measure for measure in measures if measure in self.measures]
+            for filename, measures in TOTALS_FILES.get(name, {f'totals_by_{name}.csv': self.measures}).items()
+        }
+        return {filename: measures for filename, measures in files.items() if measures}
+
+    def output_filenames(self) -> List[str]:
+        return [filename for name in self.dimensions for filename in self.files(name)]
+
+    def _empty(self, name: str) -> pd.DataFrame:
+        return pd.DataFrame(
+            {measure: pd.Series(dtype='int64') for measure in self.measures},
+            index=pd.Index([], name=self.dimensions[name])
+        )
+
+    def _combine(self, totals: pd.DataFrame, partial: pd.DataFrame) -> pd.DataFrame:
+        if totals.empty:
+            return partial
+        if partial.empty:
+            return totals
+        if isinstance(totals.index.dtype, pd.CategoricalDtype) or isinstance(partial.index.dtype, pd.CategoricalDtype):
+            # Chunks can have different categories; group on the values instead
+            totals.index = totals.index.astype(object)
+            partial.index = partial.index.astype(object)
+        return pd.concat([totals, partial]).groupby(level=0, sort=False).sum()
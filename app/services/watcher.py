@@ -0,0 +1,217 @@
+import logging
+import os
+import shutil
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from app.domain.product_mapping import ProductMapping
+from app.domain.usage_reduction import UsageReductionRules, compile_usage_reduction_rules
+from app.services.batch import USAGE_REPORT_EXTENSIONS, FileProcessorFactory, report_output_path
+from app.services.processor import FileProcessor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLL_INTERVAL_SECONDS = 2.0
+DEFAULT_MAX_WORKERS = 2
+
+class FolderWatcher:
+    """
+    Long-running translator: watches a folder on the local filesystem and translates
+    every usage report that arrives in it.
+
+    The folder is polled every `poll_interval` seconds. A report is picked up once its
+    size and mtime are unchanged between two polls, so files still being copied in are
+    left alone. At most `max_workers` reports are translated at a time, on a thread pool,
+    while the others wait in the folder in arrival order.
+
+    The product map and the reduction rules are loaded once and shared by every run; the
+    map is reloaded only when the mtime of its file changes. Each report writes its outputs
+    to `<output_files_path>/<report name>/`, as in batch mode, and is then moved to
+    `done_path`, or to `failed_path` if translating it failed.
+    """
+
+    def __init__(
+        self,
+        watch_path: str,
+        output_files_path: str,
+        partnumber_to_product_map_filepath: str,
+        partner_ids_to_skip: List[int],
+        itemcount_to_usage_reduction_rules: UsageReductionRules,
+        headers: List[str],
+        chunksize: Optional[int] = None,
+        done_path: Optional[str] = None,
+        failed_path: Optional[str] = None,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        poll_interval: float = DEFAULT_POLL_INTERVAL_SECONDS,
+        create_file_processor: Optional[FileProcessorFactory] = None
+    ):
+        """
+        `done_path` and `failed_path` default to `done` and `failed` inside `watch_path`.
+        `create_file_processor(output_files_path, partnumber_to_product_map)` builds the processor
+        for one report (e.g. with metrics or a shared database loader) with the current map.
+        """
+        if max_workers <= 0:
+            logger.error("Invalid number of watch workers: %s", max_workers)
+            raise ValueError(f"Watch workers must be a positive integer. Found: {max_workers}")
+        if poll_interval <= 0:
+            logger.error("Invalid poll interval: %s", poll_interval)
+            raise ValueError(f"Poll interval must be a positive number. Found: {poll_interval}")
+        self.watch_path = watch_path
+        self.output_files_path = output_files_path
+        self.partnumber_to_product_map_filepath = partnumber_to_product_map_filepath
+        self.partner_ids_to_skip = partner_ids_to_skip
+        self.itemcount_to_usage_reduction_rules = compile_usage_reduction_rules(itemcount_to_usage_reduction_rules)
+        self.headers = headers
+        self.chunksize = chunksize
+        self.done_path = done_path or os.path.join(watch_path, 'done')
+        self.failed_path = failed_path or os.path.join(watch_path, 'failed')
+        self.max_workers = max_workers
+        self.poll_interval = poll_interval
+        self._create_file_processor = create_file_processor or self._default_file_processor
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._in_flight: Dict[str, Future] = {}
+        # filepath -> (size, mtime) seen at the previous poll
+        self._last_seen: Dict[str, Tuple[int, int]] = {}
+        self._mapping_mtime: Optional[int] = None
+        self.partnumber_to_product_map: Optional[ProductMapping] = None
+        self.processed = 0
+        self.failed = 0
+        self._reload_mapping_if_changed(required=True)
+
+    def run(self, stop_event: Optional[threading.Event] = None, max_polls: Optional[int] = None) -> None:
+        """
+        Poll the folder until `stop_event` is set (or `max_polls` polls were made), then wait
+        for the reports being translated to finish.
+        """
+        stop_event = stop_event or threading.Event()
+        for path in (self.output_files_path, self.done_path, self.failed_path):
+            os.makedirs(path, exist_ok=True)
+        logger.info("Watching %s for usage reports with %d workers", self.watch_path, self.max_workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='watch')
+        polls = 0
+        try:
+            while not stop_event.is_set():
+                self.poll()
+                polls += 1
+                if max_polls is not None and polls >= max_polls:
+                    break
+                stop_event.wait(self.poll_interval)
+        except KeyboardInterrupt:
+            logger.info("Interrupted, finishing the reports in progress")
+        finally:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            self._collect_finished()
+        logger.info("Stopped watching %s: %d processed, %d failed", self.watch_path, self.processed, self.failed)
+
+    def poll(self) -> None:
+        """Reload the map if it changed and start translating the reports that are ready, up to `max_workers`."""
+        if self._executor is None:
+            raise RuntimeError("FolderWatcher.poll must be called from run")
+        self._collect_finished()
+        self._reload_mapping_if_changed()
+        for filepath in self._ready_reports():
+            if len(self._in_flight) >= self.max_workers:
+                break
+            logger.info("Queued %s", filepath)
+            self._in_flight[filepath] = self._executor.submit(self._process, filepath, self.partnumber_to_product_map)
+
+    def _ready_reports(self) -> List[str]:
+        """Reports in the watched folder, oldest first, whose size and mtime did not change since the last poll."""
+        seen: Dict[str, Tuple[int, int]] = {}
+        try:
+            names = os.listdir(self.watch_path)
+        except FileNotFoundError:
+            logger.warning("Watched folder %s does not exist", self.watch_path)
+            names = []
+        for name in names:
+            filepath = os.path.join(self.watch_path, name)
+            if name.startswith('.') or not name.lower().endswith(USAGE_REPORT_EXTENSIONS) or filepath in self._in_flight:
+                continue
+            try:
+                stat = os.stat(filepath)
+            except FileNotFoundError:
+                continue
+            if os.path.isfile(filepath):
+                seen[filepath] = (stat.st_size, stat.st_mtime_ns)
+        ready = [filepath for filepath, state in seen.items() if self._last_seen.get(filepath) == state]
+        self._last_seen = seen
+        return sorted(ready, key=lambda filepath: (seen[filepath][1], filepath))
+
+    def _process(self, usage_report_filepath: str, partnumber_to_product_map: ProductMapping) -> bool:
+        """Translate one report with the given map and move it to the done or failed folder."""
+        try:
+            file_processor = self._create_file_processor(
+                report_output_path(self.output_files_path, usage_report_filepath), partnumber_to_product_map
+            )
+            os.makedirs(file_processor.output_files_path, exist_ok=True)
+            file_processor.process(
+                usage_report_filepath=usage_report_filepath,
+                partner_ids_to_skip=self.partner_ids_to_skip,
+                itemcount_to_usage_reduction_rules=self.itemcount_to_usage_reduction_rules,
+                headers=self.headers,
+                chunksize=self.chunksize
+            )
+        except Exception as e:
+            logger.error("Failed to translate %s: %s", usage_report_filepath, e)
+            self._move(usage_report_filepath, self.failed_path)
+            return False
+        self._move(usage_report_filepath, self.done_path)
+        logger.info("Translated %s", usage_report_filepath)
+        return True
+
+    def _collect_finished(self) -> None:
+        for filepath, future in list(self._in_flight.items()):
+            if not future.done():
+                continue
+            del self._in_flight[filepath]
+            self._last_seen.pop(filepath, None)
+            try:
+                succeeded = future.result()
+            except Exception as e:
+                # Only moving the report can fail here; it stays in the folder and is retried
+                logger.error("Failed to move %s: %s", filepath, e)
+                continue
+            if succeeded:
+                self.processed += 1
+            else:
+                self.failed += 1
+
+    def _reload_mapping_if_changed(self, required: bool = False) -> None:
+        """
+        Load the product map when its file's mtime changed since it was last loaded.
+        A map that cannot be read is logged and the previous one kept, unless `required`.
+        """
+        try:
+            mtime = os.stat(self.partnumber_to_product_map_filepath).st_mtime_ns
+            if mtime == self._mapping_mtime:
+                return
+            mapping = ProductMapping.from_file(self.partnumber_to_product_map_filepath)
+        except (OSError, RuntimeError, ValueError) as e:
+            if required:
+                logger.error("Failed to load mapping: %s", e)
+                raise RuntimeError(f"Failed to load mapping: {e}")
+            logger.error("Keeping the current product map, failed to reload it: %s", e)
+            return
+        if self._mapping_mtime is not None:
+            logger.info("Reloaded product map from %s", self.partnumber_to_product_map_filepath)
+        self.partnumber_to_product_map = mapping
+        self._mapping_mtime = mtime
+
+    def _move(self, filepath: str, destination_path: str) -> str:
+        """Move a report into `destination_path`, adding a counter to its name if one with the same name is there."""
+        name = os.path.basename(filepath)
+        target = os.path.join(destination_path, name)
+        counter = 1
+        while os.path.exists(target):
+            target = os.path.join(destination_path, f'{counter}_{name}')
+            counter += 1
+        shutil.move(filepath, target)
+        return target
+
+    def _default_file_processor(
+        self,
+        output_files_path: str,
+        partnumber_to_product_map: Optional[ProductMapping]
+    ) -> FileProcessor:
+        return FileProcessor(output_files_path, self.partnumber_to_product_map_filepath, partnumber_to_product_map)
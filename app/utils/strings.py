@@ -1,5 +1,7 @@
-from typing import Any, Optional
+from typing import Any, Callable, Optional
 import logging
+import numpy as np
+import pandas as pd
 
 logger = logging.getLogger(__name__)
 
@@ -17,6 +19,63 @@ def escape_sql_value(value: Any) -> str:
         return f"'{escaped}'"
     return str(value)
 
+def escape_sql_column(values: pd.Series) -> pd.Series:
+    """
+    Escapes a whole column for safe inclusion in SQL statements.
+    Produces the same text as escape_sql_value for every value, using columnar operations:
+    - Numeric columns are converted to strings at once.
+    - Categorical columns are escaped once per category.
+    - Columns holding only strings are escaped and quoted at once.
+    Any other column falls back to escape_sql_value per value.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return _escape_categories(values, escape_sql_column, escape_sql_value(np.nan))
+    if pd.api.types.is_numeric_dtype(values.dtype):
+        return values.astype(str)
+    if pd.api.types.infer_dtype(values, skipna=False) == 'string':
+        return "'" + values.str.replace("'", "''", regex=False) + "'"
+    return values.map(escape_sql_value)
+
+def escape_copy_text_column(values: pd.Series) -> pd.Series:
+    """
+    Escapes a whole column for the PostgreSQL COPY text format.
+    - Missing values are written as \\N.
+    - Backslashes, tabs, newlines and carriage returns are backslash-escaped.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return _escape_categories(values, escape_copy_text_column, '\\N')
+    text = values.astype(str)
+    if not pd.api.types.is_numeric_dtype(values.dtype):
+        text = (
+            text.str.replace('\\', '\\\\', regex=False)
+            .str.replace('\t', '\\t', regex=False)
+            .str.replace('\n', '\\n', regex=False)
+            .str.replace('\r', '\\r', regex=False)
+        )
+    return text.mask(values.isna(), '\\N')
+
+def escape_copy_csv_column(values: pd.Series) -> pd.Series:
+    """
+    Escapes a whole column for the PostgreSQL COPY csv format.
+    - Missing values are written as an unquoted empty field.
+    - Empty strings and values containing quotes, commas, newlines or the end-of-data marker are quoted.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return _escape_categories(values, escape_copy_csv_column, '')
+    text = values.astype(str)
+    if not pd.api.types.is_numeric_dtype(values.dtype):
+        needs_quotes = text.str.contains('[",\n\r]', regex=True) | (text == '') | (text == '\\.')
+        quoted = '"' + text.str.replace('"', '""', regex=False) + '"'
+        text = text.where(~needs_quotes, quoted)
+    return text.mask(values.isna(), '')
+
+def _escape_categories(values: pd.Series, escape_column: Callable[[pd.Series], pd.Series], missing: str) -> pd.Series:
+    """Escape each category once and broadcast the results to all rows."""
+    escaped_categories = escape_column(pd.Series(values.cat.categories, dtype=object)).to_numpy(dtype=object)
+    # The extra trailing value is picked up by the -1 code of missing values
+    lookup = np.append(escaped_categories, missing)
+    return pd.Series(lookup[values.cat.codes.to_numpy()], index=values.index, dtype=object)
+
 def normalize_alphanumeric_string(input_str: str, expected_length: Optional[int] = None) -> str:
     """
     Normalize a string by removing all non-alphanumeric characters.
@@ -29,4 +88,15 @@ def normalize_alphanumeric_string(input_str: str, expected_length: Optional[int]
             expected_length, result, len(result)
         )
         raise ValueError(f'Normalized string must have {expected_length} characters. Found: {result}')
-    return result
\ No newline at end of file
+    return result
+
+def normalize_alphanumeric_column(values: pd.Series) -> pd.Series:
+    """
+    Columnar normalize_alphanumeric_string: removes all non-alphanumeric characters from every value.
+    Each distinct value is normalized only once and the results are broadcast back to all rows.
+    Missing values are normalized to 'nan', as normalize_alphanumeric_string does for a NaN read from CSV.
+    """
+    codes, uniques = pd.factorize(values, use_na_sentinel=False)
+    # [\W_] matches exactly the characters for which str.isalnum() is False
+    normalized_uniques = pd.Series(uniques, dtype=object).astype(str).str.replace(r'[\W_]', '', regex=True)
+    return pd.Series(normalized_uniques.to_numpy(dtype=object)[codes], index=values.index, dtype=object)
@@ -0,0 +1,137 @@
+"""
+Seeded generator of synthetic usage reports for benchmarks.
+
+The reports have the same columns as input/sample_usage_report.csv and a
+similar shape: a few rows per account, a handful of partners and plans, and
+PartNumbers drawn from the product typemap with a skewed distribution.
+"""
+
+import json
+import os
+import numpy as np
+import pandas as pd
+from dataclasses import dataclass
+from typing import List, Optional
+
+USAGE_REPORT_COLUMNS = [
+    'PartnerID', 'partnerGuid', 'accountid', 'accountGuid', 'username', 'domains',
+    'itemname', 'plan', 'itemType', 'PartNumber', 'itemCount',
+]
+
+PLANS = ['E2016_Exch_1_HOSTWAY', 'E2016_Comp_Sec_1_HOSTWAY', 'E2016_Exch_Skype_1_HOSTWAY', 'E2013_Everything_1']
+PLAN_WEIGHTS = [0.954, 0.044, 0.0015, 0.0005]
+
+ITEM_NAMES = [
+    'Account_contacts', 'Dns_foreignDomains', 'SpamStopper_advancedFilteringMailboxes',
+    'MSExchange_mailboxes', 'ActiveSync_mailboxes', 'OWA_mailboxes', 'Archive_mailboxes',
+]
+
+# Rows written to the CSV per generated block, bounding memory for the 10M-row reports
+GENERATION_BLOCK_SIZE = 1_000_000
+
+@dataclass
+class UsageReportProfile:
+    """Distribution controls for a synthetic usage report."""
+    rows_per_account: float = 3.5
+    partners: int = 50
+    skipped_partner_id: int = 26392
+    skipped_partner_rate: float = 0.05
+    missing_partnumber_rate: float = 0.70
+    unmapped_partnumber_rate: float = 0.02
+    nonpositive_itemcount_rate: float = 0.05
+    duplicate_domain_rate: float = 0.10
+    partnumber_zipf_exponent: float = 1.2
+
+def generate_usage_report(
+    rows: int,
+    partnumbers: List[str],
+    seed: int = 42,
+    profile: Optional[UsageReportProfile] = None,
+    first_account: int = 0
+) -> pd.DataFrame:
+    """Generate `rows` synthetic usage report rows. The same arguments always give the same report."""
+    profile = profile or UsageReportProfile()
+    rng = np.random.default_rng([seed, first_account])
+
+    accounts_in_block = max(1, int(round(rows / profile.rows_per_account)))
+    account = first_account + np.sort(rng.integers(0, accounts_in_block, size=rows))
+    unique_accounts, account_codes = np.unique(account, return_inverse=True)
+
+    # Per-account attributes
+    account_rng = np.random.default_rng([seed, 1])
+    partner_pool = 20_000 + account_rng.choice(10_000, size=profile.partners, replace=False)
+    account_partner = partner_pool[unique_accounts % profile.partners]
+    skipped = _hash_fraction(unique_accounts, seed, 1) < profile.skipped_partner_rate
+    account_partner = np.where(skipped, profile.skipped_partner_id, account_partner)
+    account_guid = _guids(rng, len(unique_accounts))
+    # Some accounts reuse the domain of an earlier account
+    duplicate = (_hash_fraction(unique_accounts, seed, 2) < profile.duplicate_domain_rate) & (unique_accounts > 0)
+    domain_owner = np.where(duplicate, (unique_accounts * 7919) % np.maximum(unique_accounts, 1), unique_accounts)
+    account_domain = np.char.add(np.char.add('account', domain_owner.astype(str)), '.example.com').astype(object)
+
+    # Per-row attributes
+    ranks = np.arange(1, len(partnumbers) + 1, dtype='float64')
+    weights = ranks ** -profile.partnumber_zipf_exponent
+    partnumber = rng.choice(np.array(partnumbers, dtype=object), size=rows, p=weights / weights.sum())
+    draw = rng.random(rows)
+    partnumber = np.where(draw < profile.missing_partnumber_rate, None, partnumber)
+    unmapped = (draw >= profile.missing_partnumber_rate) & (
+        draw < profile.missing_partnumber_rate + profile.unmapped_partnumber_rate
+    )
+    partnumber = np.where(unmapped, 'UNMAPPED0001', partnumber)
+    item_count = rng.geometric(0.3, size=rows)
+    nonpositive = rng.random(rows) < profile.nonpositive_itemcount_rate
+    item_count = np.where(nonpositive, -rng.integers(0, 2, size=rows), item_count)
+
+    partner_id = account_partner[account_codes]
+    partner_ids, partner_codes = np.unique(partner_id, return_inverse=True)
+    partner_guid = _guids(np.random.default_rng([seed, 2]), len(partner_ids))
+    return pd.DataFrame({
+        'PartnerID': partner_id,
+        'partnerGuid': partner_guid[partner_codes],
+        'accountid': 1_000_000 + account,
+        'accountGuid': account_guid[account_codes],
+        'username': np.char.add('user', account.astype(str)).astype(object),
+        'domains': account_domain[account_codes],
+        'itemname': rng.choice(np.array(ITEM_NAMES, dtype=object), size=rows),
+        'plan': rng.choice(np.array(PLANS, dtype=object), size=rows, p=PLAN_WEIGHTS),
+        'itemType': rng.integers(0, 2, size=rows),
+        'PartNumber': partnumber,
+        'itemCount': item_count,
+    }, columns=USAGE_REPORT_COLUMNS)
+
+def write_usage_report(
+    filepath: str,
+    rows: int,
+    partnumbers: List[str],
+    seed: int = 42,
+    profile: Optional[UsageReportProfile] = None
+) -> str:
+    """Write a synthetic usage report CSV block by block, so memory does not grow with `rows`."""
+    profile = profile or UsageReportProfile()
+    os.makedirs(os.path.dirname(filepath) or '.', exist_ok=True)
+    with open(filepath, 'w', newline='') as f:
+        for start in range(0, max(rows, 1), GENERATION_BLOCK_SIZE):
+            block_rows = min(GENERATION_BLOCK_SIZE, rows - start)
+            # Blocks get disjoint account ranges, so accounts never span two blocks
+            first_account = int(round(start / profile.rows_per_account))
+            block = generate_usage_report(block_rows, partnumbers, seed, profile, first_account)
+            block.to_csv(f, index=False, header=start == 0)
+    return filepath
+
+def load_partnumbers(partnumber_to_product_map_filepath: str) -> List[str]:
+    """PartNumbers of the product typemap, used as the pool of mapped PartNumbers."""
+    with open(partnumber_to_product_map_filepath, 'r') as f:
+        return sorted(json.load(f).keys())
+
+def _guids(rng: np.random.Generator, count: int) -> np.ndarray:
+    """`count` random GUID strings."""
+    values = rng.integers(0, 2 ** 63, size=(count, 2))
+    digits = [f'{int(high):016x}{int(low):016x}' for high, low in values]
+    return np.array([f'{d[:8]}-{d[8:12]}-{d[12:16]}-{d[16:20]}-{d[20:]}' for d in digits], dtype=object)
+
+def _hash_fraction(values: np.ndarray, seed: int, salt: int) -> np.ndarray:
+    """Deterministic pseudo-random fraction in [0, 1) per value, independent of the block it is generated in."""
+    with np.errstate(over='ignore'):
+        mixed = values.astype('uint64') * np.uint64(0x9E3779B97F4A7C15) + np.uint64(seed * 1000 + salt)
+    return (mixed >> np.uint64(32)).astype('float64') / float(2 ** 32)
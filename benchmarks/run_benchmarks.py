@@ -0,0 +1,214 @@
+"""
+Benchmark the pipeline stages on synthetic usage reports.
+
+Usage:
+    python -m benchmarks.run_benchmarks [--sizes 100k 1m 10m] [--seed 42] [--repeat 5] [--output results.json]
+
+Each stage is run on the output of the previous stage: `--repeat` times to time it
+(wall and CPU time of the fastest run) and once more under tracemalloc to measure its
+peak memory, so the tracing overhead does not skew the timings. Results are written as JSON.
+
+The validation stage's wall time is also reported as a share of the load time; the benchmark
+fails (exit status 1) when it exceeds VALIDATION_OVERHEAD_BUDGET.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+from benchmarks.data_generator import UsageReportProfile, load_partnumbers, write_usage_report
+from app.domain.df_functions import (
+    load_and_prepare_dataframe,
+    add_processed_column,
+    apply_product_mapping,
+    apply_usage_reduction,
+    prepare_domains_df,
+)
+from app.domain.business_rules_chargeable import filter_chargeable_df
+from app.domain.business_rules_domain import map_partner_purchased_plan_id, split_partner_purchased_plan_id_column
+from app.domain.schema import apply_usage_report_schema, usage_report_read_dtypes
+from app.domain.usage_reduction import UsageReductionRules
+from app.domain.validation import DEFAULT_VALIDATION_RULES, ValidationRules, apply_validation_rules
+from app.services.sql_generator import SQLGenerator
+
+SIZES = {'100k': 100_000, '1m': 1_000_000, '10m': 10_000_000}
+
+HEADERS = ['PartnerID', 'accountGuid', 'domains', 'plan', 'PartNumber', 'itemCount']
+PARTNER_IDS_TO_SKIP = [26392]
+# Timing runs per stage; the fastest is kept, as a single run of a sub-second stage is noisy
+DEFAULT_REPEAT = 5
+# Validation wall time as a share of the load time, with the built-in rules
+VALIDATION_OVERHEAD_BUDGET = 0.10
+USAGE_REDUCTION_RULES = {'EA000001GB0O': 1000, 'PMQ00005GB0R': 5000, 'SSX006NR': 1000, 'SPQ00001MB0R': 2000}
+
+ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PARTNUMBER_TO_PRODUCT_MAP_FILEPATH = os.path.join(ROOT_PATH, 'input', 'product_type_mapping.json')
+DATA_PATH = os.path.join(ROOT_PATH, 'benchmarks', 'data')
+RESULTS_PATH = os.path.join(ROOT_PATH, 'benchmarks', 'results')
+
+def measure(name: str, func: Callable[[], Any], rows_in: int, repeat: int = DEFAULT_REPEAT) -> Dict[str, Any]:
+    """Run `func` `repeat` times for timing, keeping the fastest, then again under tracemalloc for its peak memory."""
+    wall_seconds = cpu_seconds = float('inf')
+    for _ in range(repeat):
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        result = func()
+        run_wall_seconds, run_cpu_seconds = time.perf_counter() - wall_start, time.process_time() - cpu_start
+        if run_wall_seconds < wall_seconds:
+            wall_seconds, cpu_seconds = run_wall_seconds, run_cpu_seconds
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'stage': name,
+        'rows_in': rows_in,
+        'rows_out': _rows(result),
+        'wall_seconds': round(wall_seconds, 6),
+        'cpu_seconds': round(cpu_seconds, 6),
+        'peak_memory_bytes': peak_bytes,
+        'result': result,
+    }
+
+def benchmark_report(
+    usage_report_filepath: str,
+    partnumber_to_product_map: Dict[str, str],
+    repeat: int = DEFAULT_REPEAT
+) -> List[Dict[str, Any]]:
+    """Run every stage in pipeline order on one usage report."""
+    rules = UsageReductionRules(USAGE_REDUCTION_RULES)
+    stages: List[Dict[str, Any]] = []
+
+    def run(name: str, func: Callable[[], Any], rows_in: int) -> Any:
+        stage = measure(name, func, rows_in, repeat)
+        result = stage.pop('result')
+        stages.append(stage)
+        print(f"  {name:<40} {stage['wall_seconds']:>9.3f}s {stage['peak_memory_bytes'] / 2 ** 20:>9.1f} MiB")
+        return result
+
+    df = run('load_and_prepare_dataframe', lambda: load_and_prepare_dataframe(
+        usage_report_filepath, HEADERS, dtype=usage_report_read_dtypes(HEADERS)
+    ), rows_in=0)
+    rows = len(df)
+    df = run('apply_validation_rules',
+             lambda: apply_validation_rules(df, ValidationRules(DEFAULT_VALIDATION_RULES))[0], rows)
+    df = run('apply_usage_report_schema', lambda: apply_usage_report_schema(df.copy())[0], rows)
+    # The per-row mapping that split_partner_purchased_plan_id_column replaces, for comparison
+    run('add_processed_column', lambda: add_processed_column(
+        df[['accountGuid']].copy(), 'partnerPurchasedPlanID', 'accountGuid', map_partner_purchased_plan_id
+    ), len(df))
+    df = run('split_partner_purchased_plan_id_column',
+             lambda: split_partner_purchased_plan_id_column(df.copy())[0], len(df))
+    chargeable_df = run('filter_chargeable_df', lambda: filter_chargeable_df(df, PARTNER_IDS_TO_SKIP)[0], len(df))
+    chargeable_df = run('apply_product_mapping',
+                        lambda: apply_product_mapping(chargeable_df.copy(), partnumber_to_product_map), len(chargeable_df))
+    chargeable_df = run('apply_usage_reduction',
+                        lambda: apply_usage_reduction(chargeable_df.copy(), rules), len(chargeable_df))
+    domains_df = run('prepare_domains_df', lambda: prepare_domains_df(df), len(df))
+
+    with tempfile.TemporaryDirectory() as output_files_path:
+        run('SQLGenerator.write_chargeable_sql',
+            lambda: _written(SQLGenerator.write_chargeable_sql, chargeable_df, output_files_path), len(chargeable_df))
+        run('SQLGenerator.write_domains_sql',
+            lambda: _written(SQLGenerator.write_domains_sql, domains_df, output_files_path), len(domains_df))
+    return stages
+
+def ensure_usage_report(rows: int, seed: int, partnumbers: List[str], profile: UsageReportProfile) -> str:
+    """Generate the synthetic report once and reuse it on later runs."""
+    filepath = os.path.join(DATA_PATH, f'usage_report_{rows}_{seed}.csv')
+    if not os.path.isfile(filepath):
+        print(f"Generating {rows} rows into {filepath}")
+        tmp_filepath = f'{filepath}.tmp'
+        write_usage_report(tmp_filepath, rows, partnumbers, seed=seed, profile=profile)
+        os.replace(tmp_filepath, filepath)
+    return filepath
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', nargs='+', choices=sorted(SIZES), default=['100k'])
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='Timing runs per stage (default: %(default)s)')
+    parser.add_argument('--output', help='Results file (default: benchmarks/results/<timestamp>.json)')
+    args = parser.parse_args(argv)
+    if args.repeat <= 0:
+        parser.error(f"--repeat must be a positive integer. Found: {args.repeat}")
+
+    logging.disable(logging.WARNING)
+    with open(PARTNUMBER_TO_PRODUCT_MAP_FILEPATH, 'r') as f:
+        partnumber_to_product_map = json.load(f)
+    partnumbers = load_partnumbers(PARTNUMBER_TO_PRODUCT_MAP_FILEPATH)
+    profile = UsageReportProfile()
+
+    started_at = datetime.now(timezone.utc)
+    results: Dict[str, Any] = {
+        'started_at': started_at.isoformat(),
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'profile': vars(profile),
+        'environment': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'runs': [],
+    }
+    over_budget: List[str] = []
+    for size in args.sizes:
+        rows = SIZES[size]
+        usage_report_filepath = ensure_usage_report(rows, args.seed, partnumbers, profile)
+        print(f"Benchmarking {size} ({rows} rows)")
+        stages = benchmark_report(usage_report_filepath, partnumber_to_product_map, args.repeat)
+        overhead = validation_overhead(stages)
+        print(f"  validation overhead: {overhead:.1%} of load time (budget {VALIDATION_OVERHEAD_BUDGET:.0%})")
+        if overhead > VALIDATION_OVERHEAD_BUDGET:
+            over_budget.append(size)
+        results['runs'].append({
+            'size': size,
+            'rows': rows,
+            'usage_report_bytes': os.path.getsize(usage_report_filepath),
+            'stages': stages,
+            'validation_overhead': round(overhead, 4),
+            'validation_within_budget': overhead <= VALIDATION_OVERHEAD_BUDGET,
+        })
+
+    output = args.output or os.path.join(RESULTS_PATH, f"{started_at.strftime('%Y%m%dT%H%M%SZ')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+    if over_budget:
+        print(f"FAILED: validation overhead over budget for {', '.join(over_budget)}")
+        return 1
+    return 0
+
+def validation_overhead(stages: List[Dict[str, Any]]) -> float:
+    """Fastest wall time of apply_validation_rules divided by that of load_and_prepare_dataframe."""
+    wall_seconds = {stage['stage']: stage['wall_seconds'] for stage in stages}
+    return wall_seconds['apply_validation_rules'] / wall_seconds['load_and_prepare_dataframe']
+
+def _written(write: Callable[[pd.DataFrame, str], None], df: pd.DataFrame, output_files_path: str) -> int:
+    write(df, output_files_path)
+    return len(df)
+
+def _rows(result: Any) -> Optional[int]:
+    if isinstance(result, int):
+        return result
+    if isinstance(result, pd.DataFrame):
+        return len(result)
+    return None
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,11 +1,6 @@
 import sys
-import logging
-from app.main import main
+from app.cli import main
 
+# Kept for existing scripts; same as `python -m app run [options]`
 if __name__ == "__main__":
-    try:
-        main()
-    except Exception as e:
-        logging.basicConfig(level=logging.ERROR)
-        logging.error("An error occurred during execution: %s", e)
-        sys.exit(1)
\ No newline at end of file
+    sys.exit(main(['run'] + sys.argv[1:]))
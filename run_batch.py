@@ -0,0 +1,6 @@
+import sys
+from app.cli import main
+
+# Kept for existing scripts; same as `python -m app batch <directory or glob of usage reports> [options]`
+if __name__ == "__main__":
+    sys.exit(main(['batch'] + sys.argv[1:]))
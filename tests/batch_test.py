@@ -0,0 +1,128 @@
+"""
+Tests for the BatchProcessor class from the batch module.
+
+This file covers:
+- Resolving usage reports from a directory or a glob pattern, including compressed CSV reports.
+- Translating several reports over a process pool, one output set per report.
+- Combined batch summary and totals by Product.
+- Reporting failed reports without stopping the batch.
+- Building each report's processor from the same config as a single run.
+"""
+
+import functools
+import gzip
+import json
+import os
+import sqlite3
+import pandas as pd
+import pytest
+from app.config.config import load_config
+from app.main import create_file_processor
+from app.services.batch import BatchProcessor, find_usage_reports
+
+HEADERS = ["PartnerID", "accountGuid", "domains", "plan", "PartNumber", "itemCount"]
+
+@pytest.fixture
+def tmp_mapping_file(tmp_path):
+    """Fixture to create a temporary mapping JSON file."""
+    file_path = tmp_path / "mapping.json"
+    file_path.write_text(json.dumps({"A": "ProductA", "B": "ProductB"}))
+    return str(file_path)
+
+@pytest.fixture
+def reports_dir(tmp_path):
+    """Fixture with two valid usage reports and one report missing columns."""
+    reports = tmp_path / "reports"
+    reports.mkdir()
+    for name, count in (("day1", 10), ("day2", 5)):
+        pd.DataFrame({
+            "PartnerID": [1, 2],
+            "accountGuid": ["a1b2c3d4e5f6g7h8i9j0k1l2m3n4o5p6", "12345678901234567890123456789012"],
+            "domains": ["a.com", "b.com"],
+            "plan": ["plan1", "plan2"],
+            "PartNumber": ["A", "B"],
+            "itemCount": [count, count]
+        }).to_csv(reports / f"{name}.csv", index=False)
+    (reports / "broken.csv").write_text("foo,bar\n1,2\n")
+    (reports / "notes.txt").write_text("not a report")
+    return reports
+
+def test_find_usage_reports_directory(reports_dir):
+    """Test that a directory resolves to its CSV files, sorted."""
+    names = [os.path.basename(path) for path in find_usage_reports(str(reports_dir))]
+    assert names == ["broken.csv", "day1.csv", "day2.csv"]
+
+def test_find_usage_reports_glob(reports_dir):
+    """Test that a glob pattern resolves to the matching files."""
+    names = [os.path.basename(path) for path in find_usage_reports(str(reports_dir / "day*.csv"))]
+    assert names == ["day1.csv", "day2.csv"]
+
+def test_batch_process(reports_dir, tmp_mapping_file, tmp_path):
+    """Test translating several reports and writing the combined outputs."""
+    output_dir = tmp_path / "out"
+    batch_processor = BatchProcessor(str(output_dir), tmp_mapping_file, max_workers=2)
+    summary_df = batch_processor.process(
+        usage_report_filepaths=find_usage_reports(str(reports_dir)),
+        partner_ids_to_skip=[],
+        itemcount_to_usage_reduction_rules={},
+        headers=HEADERS
+    )
+    assert list(summary_df["status"]) == ["failed", "ok", "ok"]
+    assert "Missing required columns" in summary_df.loc[0, "error"]
+    assert (output_dir / "day1" / "insert_into_chargeable.sql").exists()
+    assert (output_dir / "day2" / "insert_into_domains.sql").exists()
+    assert (output_dir / "batch_summary.csv").exists()
+    totals = pd.read_csv(output_dir / "totals_by_product.csv", index_col="product")["itemCount"]
+    assert totals.to_dict() == {"ProductA": 15, "ProductB": 15}
+    assert (output_dir / "totals_by_partner.csv").exists()
+    assert (output_dir / "totals_by_plan.csv").exists()
+
+def test_batch_process_no_reports(tmp_mapping_file, tmp_path):
+    """Test error when there are no reports to process."""
+    with pytest.raises(ValueError):
+        BatchProcessor(str(tmp_path), tmp_mapping_file).process([], [], {}, HEADERS)
+
+def test_batch_process_duplicated_names(tmp_mapping_file, tmp_path):
+    """Test error when two reports would write to the same output folder."""
+    with pytest.raises(ValueError):
+        BatchProcessor(str(tmp_path), tmp_mapping_file).process(["x/day.csv", "y/day.csv"], [], {}, HEADERS)
+
+def test_batch_process_compressed_report(reports_dir, tmp_mapping_file, tmp_path):
+    """Test that a compressed report is found and writes its outputs under its plain name."""
+    with open(reports_dir / "day1.csv", "rb") as plain, gzip.open(reports_dir / "day3.csv.gz", "wb") as compressed:
+        compressed.write(plain.read())
+    filepaths = find_usage_reports(str(reports_dir))
+    assert os.path.basename(filepaths[-1]) == "day3.csv.gz"
+    output_dir = tmp_path / "out"
+    summary_df = BatchProcessor(str(output_dir), tmp_mapping_file, max_workers=1).process(
+        usage_report_filepaths=filepaths[-1:],
+        partner_ids_to_skip=[],
+        itemcount_to_usage_reduction_rules={},
+        headers=HEADERS
+    )
+    assert summary_df['status'].tolist() == ['ok']
+    assert (output_dir / "day3" / "insert_into_chargeable.sql").exists()
+
+def test_batch_process_honors_config(reports_dir, tmp_mapping_file, tmp_path):
+    """Test that reports are translated by processors built from the config, with its metrics and database."""
+    output_dir = tmp_path / "out"
+    database_path = tmp_path / "batch.db"
+    config = load_config({
+        "OUTPUT_FILES_PATH": str(output_dir),
+        "PARTNUMBER_TO_PRODUCT_MAP_FILEPATH": tmp_mapping_file,
+        "METRICS_ENABLED": "true",
+        "DATABASE_URL": f"sqlite:///{database_path}",
+    }, use_dotenv=False)
+    summary_df = BatchProcessor(
+        str(output_dir), tmp_mapping_file, max_workers=1, create_file_processor=functools.partial(create_file_processor, config)
+    ).process(
+        usage_report_filepaths=find_usage_reports(str(reports_dir / "day*.csv")),
+        partner_ids_to_skip=[],
+        itemcount_to_usage_reduction_rules={},
+        headers=HEADERS
+    )
+    assert list(summary_df["status"]) == ["ok", "ok"]
+    assert (output_dir / "day1" / "metrics.json").exists()
+    assert (output_dir / "day2" / "metrics.json").exists()
+    with sqlite3.connect(database_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM chargeable").fetchone() == (4,)
@@ -5,13 +5,22 @@ This file covers:
 - Removing rows without PartNumber.
 - Removing rows with negative itemCount.
 - Removing rows with PartnerID in the skip list.
+- Dropping rows without itemCount without logging them.
 - Behavior when multiple filters apply.
 - Error when required columns are missing.
+- Rejection reason codes, with the first matching reason winning.
+- Plugging in an extra rejection reason.
 """
 
 import pandas as pd
 import pytest
-from app.domain.business_rules_chargeable import filter_chargeable_df
+from app.domain.business_rules_chargeable import (
+    CHARGEABLE_REJECTION_REASONS,
+    RejectionReason,
+    classify_chargeable_rows,
+    filter_chargeable_df,
+    split_chargeable_df,
+)
 
 @pytest.fixture
 def sample_df():
@@ -42,6 +51,19 @@ def test_filter_chargeable_df_removes_partner_ids_to_skip(sample_df):
     assert 4 not in filtered['PartnerID'].values
     assert 5 not in filtered['PartnerID'].values
 
+def test_filter_chargeable_df_drops_missing_itemcount_silently():
+    """Test that rows without itemCount are dropped but not logged as non-positive."""
+    df = pd.DataFrame({
+        'PartNumber': ['A', 'B', 'C'],
+        'itemCount': pd.Series([10, None, 0], dtype='Int64'),
+        'PartnerID': [1, 2, 3]
+    })
+    for frame in (df, df.astype({'itemCount': 'float64'})):
+        filtered, no_partnumber, itemcount_nonpositive = filter_chargeable_df(frame, partner_ids_to_skip=[])
+        assert list(filtered['PartnerID']) == [1]
+        assert no_partnumber.empty
+        assert list(itemcount_nonpositive['PartnerID']) == [3]
+
 def test_filter_chargeable_df_all_filters(sample_df):
     """Test applying all filters together."""
     filtered, no_partnumber, itemcount_negative = filter_chargeable_df(sample_df, partner_ids_to_skip=[1])
@@ -51,4 +73,31 @@ def test_filter_chargeable_df_missing_columns():
     """Test error when required columns are missing."""
     df = pd.DataFrame({'foo': [1], 'bar': [2]})
     with pytest.raises(ValueError):
-        filter_chargeable_df(df, partner_ids_to_skip=[])
\ No newline at end of file
+        filter_chargeable_df(df, partner_ids_to_skip=[])
+
+def test_classify_chargeable_rows_first_reason_wins():
+    """Test that a row failing several rules gets the code of the first one."""
+    df = pd.DataFrame({
+        'PartNumber': [None, 'B', 'C', 'D'],
+        'itemCount': [0, -1, 5, 5],
+        'PartnerID': [9, 9, 9, 1]
+    })
+    codes = classify_chargeable_rows(df, partner_ids_to_skip=[9])
+    assert codes.tolist() == [1, 2, 3, 0]
+
+def test_filter_chargeable_df_error_frames_are_independent(sample_df):
+    """Test that the returned frames can get new columns without touching the input."""
+    filtered, no_partnumber, itemcount_negative = filter_chargeable_df(sample_df, partner_ids_to_skip=[])
+    filtered['product'] = 'X'
+    assert 'product' not in sample_df.columns
+    assert list(filtered.index) == [0, 3, 4]
+
+def test_split_chargeable_df_with_extra_reason(sample_df):
+    """Test that an extra rejection reason gets its own error frame."""
+    reasons = CHARGEABLE_REJECTION_REASONS + [
+        RejectionReason('itemcount_too_large', lambda df, partner_ids_to_skip: df['itemCount'] > 25)
+    ]
+    chargeable, error_dfs = split_chargeable_df(sample_df, partner_ids_to_skip=[], rejection_reasons=reasons)
+    assert list(chargeable['PartnerID']) == [1, 4]
+    assert list(error_dfs) == ['no_partnumber', 'itemcount_nonpositive', 'itemcount_too_large']
+    assert list(error_dfs['itemcount_too_large']['PartnerID']) == [5]
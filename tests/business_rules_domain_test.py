@@ -5,6 +5,7 @@ This file covers:
 - Normalization and validation of accountGuid as partnerPurchasedPlanID.
 - Adding the partnerPurchasedPlanID column to a DataFrame.
 - Error handling for invalid or missing accountGuid values.
+- Splitting rows with an invalid accountGuid out of the DataFrame.
 """
 
 import pandas as pd
@@ -12,6 +13,7 @@ import pytest
 from app.domain.business_rules_domain import (
     map_partner_purchased_plan_id,
     add_partner_purchased_plan_id_column,
+    split_partner_purchased_plan_id_column,
 )
 
 def test_map_partner_purchased_plan_id_valid():
@@ -47,4 +49,27 @@ def test_add_partner_purchased_plan_id_column_invalid_guid():
     """Test error when all accountGuid values are invalid."""
     df = pd.DataFrame({"accountGuid": ["short-guid", "another-short"]})
     with pytest.raises(ValueError):
-        add_partner_purchased_plan_id_column(df)
\ No newline at end of file
+        add_partner_purchased_plan_id_column(df)
+
+def test_split_partner_purchased_plan_id_column():
+    """Test that valid rows get partnerPurchasedPlanID and invalid rows are split out."""
+    df = pd.DataFrame({
+        "accountGuid": ["a1b2-c3d4_e5f6g7h8i9j0k1l2m3n4o5p6", "short-guid", None],
+        "PartnerID": [1, 2, 3]
+    })
+    valid, invalid = split_partner_purchased_plan_id_column(df)
+    assert list(valid["partnerPurchasedPlanID"]) == ["a1b2c3d4e5f6g7h8i9j0k1l2m3n4o5p6"]
+    assert list(invalid["PartnerID"]) == [2, 3]
+
+def test_split_partner_purchased_plan_id_column_all_valid():
+    """Test that no rows are split out when every accountGuid is valid."""
+    df = pd.DataFrame({"accountGuid": ["12345678-9012-3456-7890-123456789012"]})
+    valid, invalid = split_partner_purchased_plan_id_column(df)
+    assert len(valid) == 1
+    assert invalid.empty
+    assert "partnerPurchasedPlanID" in invalid.columns
+
+def test_split_partner_purchased_plan_id_column_missing_accountGuid():
+    """Test error when accountGuid column is missing."""
+    with pytest.raises(ValueError):
+        split_partner_purchased_plan_id_column(pd.DataFrame({"other": ["foo"]}))
@@ -0,0 +1,98 @@
+"""
+Tests for the command line interface from the cli module.
+
+This file covers:
+- Cold start of --help within a fixed time budget, without the environment set.
+- Importing the CLI, main and config modules without loading pandas or reading any file.
+- Command line options overriding the environment variables.
+- The run and batch subcommands, and the exit code on errors.
+"""
+
+import os
+import subprocess
+import sys
+import time
+import pandas as pd
+import pytest
+from app.cli import main
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Wall time allowed for `python -m app --help`, interpreter start-up included
+STARTUP_BUDGET_SECONDS = 1.0
+
+def _run_python(args, cwd):
+    env = {key: value for key, value in os.environ.items() if key not in ("OUTPUT_FILES_PATH", "USAGE_REPORT_FILEPATH")}
+    env["PYTHONPATH"] = ROOT
+    return subprocess.run([sys.executable] + args, cwd=cwd, env=env, capture_output=True, text=True)
+
+def test_help_starts_within_budget(tmp_path):
+    """Test that --help answers within the start-up budget with no environment or .env file."""
+    _run_python(["-m", "app", "--help"], tmp_path)  # warm the bytecode cache
+    started = time.perf_counter()
+    result = _run_python(["-m", "app", "--help"], tmp_path)
+    elapsed = time.perf_counter() - started
+    assert result.returncode == 0
+    assert all(command in result.stdout for command in ("run", "batch", "watch"))
+    assert elapsed < STARTUP_BUDGET_SECONDS
+
+def test_import_has_no_side_effects(tmp_path):
+    """Test that importing the entry points loads neither pandas nor the configuration."""
+    result = _run_python([
+        "-c",
+        "import sys, app.cli, app.main, app.config.config as c; "
+        "print(sorted(m for m in ('pandas', 'numpy', 'dotenv') if m in sys.modules), c._config)"
+    ], tmp_path)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "[] None"
+
+@pytest.fixture
+def usage_report(tmp_path):
+    """Small usage report and product map."""
+    report = tmp_path / "report.csv"
+    pd.DataFrame({
+        "PartnerID": [1, 2],
+        "accountGuid": ["a1b2c3d4e5f6g7h8i9j0k1l2m3n4o5p6", "12345678901234567890123456789012"],
+        "domains": ["a.com", "b.com"],
+        "plan": ["plan1", "plan2"],
+        "PartNumber": ["A", "B"],
+        "itemCount": [10, 20]
+    }).to_csv(report, index=False)
+    (tmp_path / "map.json").write_text('{"A": "ProductA", "B": "ProductB"}')
+    return report
+
+def test_run_options_override_environment(usage_report, tmp_path, monkeypatch):
+    """Test that the output folder and report given on the command line win over the environment."""
+    monkeypatch.setenv("OUTPUT_FILES_PATH", str(tmp_path / "from_env"))
+    monkeypatch.setenv("USAGE_REPORT_FILEPATH", str(tmp_path / "missing.csv"))
+    output_dir = tmp_path / "from_cli"
+    output_dir.mkdir()
+    exit_code = main([
+        "run", str(usage_report), "-o", str(output_dir), "-m", str(tmp_path / "map.json"),
+        "--partner-ids-to-skip", "2", "--compression", "gzip", "--no-metrics"
+    ])
+    assert exit_code == 0
+    assert (output_dir / "insert_into_chargeable.sql.gz").exists()
+    assert not (output_dir / "metrics.json").exists()
+    assert not (tmp_path / "from_env").exists()
+
+def test_batch_command(usage_report, tmp_path):
+    """Test translating a folder of reports with the batch subcommand."""
+    output_dir = tmp_path / "out"
+    exit_code = main([
+        "batch", str(tmp_path / "*.csv"), "-o", str(output_dir), "-m", str(tmp_path / "map.json"), "--max-workers", "1"
+    ])
+    assert exit_code == 0
+    assert (output_dir / "batch_summary.csv").exists()
+    assert (output_dir / "report" / "insert_into_chargeable.sql").exists()
+
+def test_run_error_exit_code(tmp_path, monkeypatch):
+    """Test that a failing run returns exit code 1 instead of raising."""
+    monkeypatch.delenv("USAGE_REPORT_FILEPATH", raising=False)
+    assert main(["run", str(tmp_path / "missing.csv"), "-o", str(tmp_path), "-m", str(tmp_path / "missing.json")]) == 1
+
+def test_invalid_arguments_exit():
+    """Test that an unknown subcommand exits with a usage error."""
+    with pytest.raises(SystemExit) as excinfo:
+        main(["translate"])
+    assert excinfo.value.code == 2
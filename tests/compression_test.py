@@ -0,0 +1,63 @@
+"""
+Tests for the OutputCompression class from the compression module.
+
+This file covers:
+- Writing plain, gzip, xz and bz2 files with the matching extensions.
+- Appending to compressed files.
+- Reproducible gzip output.
+- Error handling for unknown methods and out-of-range levels.
+"""
+
+import bz2
+import gzip
+import lzma
+import pytest
+from app.services.compression import OutputCompression
+
+_READERS = {'gzip': gzip.open, 'xz': lzma.open, 'bz2': bz2.open}
+
+@pytest.mark.parametrize("method, extension", [("gzip", ".gz"), ("xz", ".xz"), ("bz2", ".bz2")])
+def test_write_and_append_compressed(tmp_path, method, extension):
+    """Test that written and appended text reads back through the matching decompressor."""
+    compression = OutputCompression(method)
+    filepath = tmp_path / compression.filename("rows.csv")
+    assert filepath.name == f"rows.csv{extension}"
+    with compression.open(str(filepath), "w") as f:
+        f.write("a,b\n1,2\n")
+    with compression.open(str(filepath), "a") as f:
+        f.write("3,4\n")
+    with _READERS[method](filepath, "rt") as f:
+        assert f.read() == "a,b\n1,2\n3,4\n"
+
+def test_no_compression_writes_plain_text(tmp_path):
+    """Test that the default writes plain files under their own name."""
+    compression = OutputCompression()
+    assert not compression.enabled
+    assert compression.filename("rows.sql") == "rows.sql"
+    with compression.open(str(tmp_path / "rows.sql")) as f:
+        f.write("INSERT")
+    assert (tmp_path / "rows.sql").read_text() == "INSERT"
+
+def test_gzip_output_is_reproducible(tmp_path):
+    """Test that the same text compresses to the same bytes, whatever the file name and time."""
+    compression = OutputCompression("gzip", 9)
+    for name in ("first.gz", "second.gz"):
+        with compression.open(str(tmp_path / name)) as f:
+            f.write("same rows\n" * 100)
+    assert (tmp_path / "first.gz").read_bytes() == (tmp_path / "second.gz").read_bytes()
+
+def test_default_levels():
+    """Test the default level of each method."""
+    assert OutputCompression("gzip").level == 6
+    assert OutputCompression("xz").level == 6
+    assert OutputCompression("bz2").level == 9
+    assert OutputCompression("none", 5).level is None
+
+def test_invalid_compression():
+    """Test error for an unknown method or an out-of-range level."""
+    with pytest.raises(ValueError):
+        OutputCompression("zip")
+    with pytest.raises(ValueError):
+        OutputCompression("gzip", 10)
+    with pytest.raises(ValueError):
+        OutputCompression("bz2", 0)
@@ -0,0 +1,66 @@
+"""
+Tests for the load_config function from the config module.
+
+This file covers:
+- Reading settings from the environment, with their defaults.
+- Overrides taking precedence over the environment.
+- Error handling for missing required settings and invalid values.
+- Loading nothing when the module is imported.
+"""
+
+import pytest
+from app.config import config as config_module
+from app.config.config import load_config
+
+REQUIRED = {"OUTPUT_FILES_PATH": "./output", "PARTNUMBER_TO_PRODUCT_MAP_FILEPATH": "./map.json"}
+
+@pytest.fixture
+def clean_env(monkeypatch):
+    """Environment with only the required settings."""
+    for name in list(config_module.Config.__dataclass_fields__):
+        monkeypatch.delenv(name.upper(), raising=False)
+    for name, value in REQUIRED.items():
+        monkeypatch.setenv(name, value)
+
+def test_load_config_defaults(clean_env):
+    """Test the defaults of the optional settings."""
+    config = load_config(use_dotenv=False)
+    assert config.output_files_path == "./output"
+    assert config.usage_report_filepath is None
+    assert config.partner_ids_to_skip == [26392]
+    assert config.chunksize is None
+    assert config.output_format == "sql"
+    assert config.metrics_enabled is False
+    assert config.output_compression == "none"
+    assert config.output_compression_level is None
+    assert config.output_workers is None
+
+def test_load_config_overrides_environment(clean_env, monkeypatch):
+    """Test that overrides win over the environment and that None overrides are ignored."""
+    monkeypatch.setenv("CHUNKSIZE", "10")
+    monkeypatch.setenv("FORCE_RUN", "yes")
+    config = load_config({"CHUNKSIZE": "20", "OUTPUT_FILES_PATH": "./other", "FORCE_RUN": None}, use_dotenv=False)
+    assert config.chunksize == 20
+    assert config.output_files_path == "./other"
+    assert config.force_run is True
+
+def test_load_config_missing_required(clean_env, monkeypatch):
+    """Test error when a required setting is missing."""
+    monkeypatch.delenv("OUTPUT_FILES_PATH")
+    with pytest.raises(ValueError, match="OUTPUT_FILES_PATH"):
+        load_config(use_dotenv=False)
+
+def test_load_config_invalid_values(clean_env):
+    """Test error for a non-integer number and invalid JSON rules."""
+    with pytest.raises(ValueError, match="CHUNKSIZE"):
+        load_config({"CHUNKSIZE": "many"}, use_dotenv=False)
+    with pytest.raises(ValueError, match="ITEMCOUNT_TO_USAGE_REDUCTION_RULES"):
+        load_config({"ITEMCOUNT_TO_USAGE_REDUCTION_RULES": "{"}, use_dotenv=False)
+
+def test_module_attributes_are_lazy(clean_env, monkeypatch):
+    """Test that module-level settings are read on first access, not on import."""
+    monkeypatch.setattr(config_module, "_config", None)
+    monkeypatch.setenv("CHUNKSIZE", "5")
+    assert config_module.CHUNKSIZE == 5
+    with pytest.raises(AttributeError):
+        config_module.NOT_A_SETTING
@@ -0,0 +1,78 @@
+"""
+Tests for the consolidation module.
+
+This file covers:
+- Summing itemCount and usage of chargeable rows sharing their keys, in first-appearance order.
+- Rounding usage on each row or after the sum.
+- Consolidating chunk by chunk matching a single frame.
+- Error handling for missing columns and invalid rounding points.
+"""
+
+import pandas as pd
+import pytest
+from app.domain.consolidation import ChargeableConsolidator, consolidate_chargeable_df
+from app.domain.usage_reduction import UsageReductionRules
+
+@pytest.fixture
+def chargeable_df():
+    df = pd.DataFrame({
+        "PartnerID": [2, 1, 2, 2, 1],
+        "product": ["p", "p", "p", "q", "p"],
+        "partnerPurchasedPlanID": ["b", "a", "b", "b", "a"],
+        "plan": ["plan", "plan", "plan", "plan", "plan"],
+        "PartNumber": ["X", "Y", "X", "Y", "Y"],
+        "itemCount": [1500, 3, 1700, 4, 5],
+    })
+    return df
+
+@pytest.fixture
+def rules():
+    return UsageReductionRules({"X": 1000})
+
+def _with_usage(df, rules):
+    return df.assign(usage=rules.round(rules.reduce(df["itemCount"], df["PartNumber"])))
+
+def test_consolidate_sums_rows_sharing_keys(chargeable_df, rules):
+    """Test that rows sharing their keys become one row, in the order the keys first appear."""
+    result = consolidate_chargeable_df(_with_usage(chargeable_df, rules), rules)
+    assert list(result.columns) == ["PartnerID", "product", "partnerPurchasedPlanID", "plan", "itemCount", "usage"]
+    assert result[["PartnerID", "product"]].values.tolist() == [[2, "p"], [1, "p"], [2, "q"]]
+    assert list(result["itemCount"]) == [3200, 8, 4]
+    assert list(result["usage"]) == [2, 8, 4]
+
+def test_consolidate_rounding_after_sum(chargeable_df, rules):
+    """Test that with the 'sum' rounding point usage is rounded once the reduced values are summed."""
+    result = consolidate_chargeable_df(_with_usage(chargeable_df, rules), rules, rounding_point="sum")
+    assert list(result["usage"]) == [3, 8, 4]
+    assert result["usage"].dtype == "int64"
+
+@pytest.mark.parametrize("rounding_point", ["row", "sum"])
+def test_consolidate_in_chunks_matches_single_frame(chargeable_df, rules, rounding_point):
+    """Test that folding in chunks gives the same rows as consolidating the whole frame."""
+    df = _with_usage(chargeable_df, rules)
+    consolidator = ChargeableConsolidator(rules, rounding_point)
+    for start in range(0, len(df), 2):
+        consolidator.update(df.iloc[start:start + 2])
+    pd.testing.assert_frame_equal(consolidator.consolidated(), consolidate_chargeable_df(df, rules, rounding_point))
+
+def test_consolidate_keeps_missing_keys(rules):
+    """Test that rows with a missing key value are kept, grouped together."""
+    df = pd.DataFrame({
+        "PartnerID": [1, 1], "product": ["p", "p"], "partnerPurchasedPlanID": ["a", "a"],
+        "plan": [None, None], "PartNumber": ["Y", "Y"], "itemCount": [1, 2], "usage": [1, 2],
+    })
+    result = consolidate_chargeable_df(df, rules)
+    assert list(result["usage"]) == [3]
+
+def test_consolidate_empty():
+    """Test that consolidating no rows gives an empty frame with the output columns."""
+    result = ChargeableConsolidator(UsageReductionRules({})).consolidated()
+    assert result.empty
+    assert {"PartnerID", "product", "partnerPurchasedPlanID", "plan", "usage"} <= set(result.columns)
+
+def test_consolidate_errors(chargeable_df, rules):
+    """Test errors for missing columns and invalid rounding points."""
+    with pytest.raises(ValueError):
+        consolidate_chargeable_df(chargeable_df, rules)
+    with pytest.raises(ValueError):
+        ChargeableConsolidator(rules, rounding_point="chunk")
@@ -0,0 +1,83 @@
+"""
+Tests for the CopyGenerator class from the copy_generator module.
+
+This file covers:
+- Writing the chargeable and domains tables as COPY data in csv and text formats.
+- Escaping NULLs, separators, quotes, tabs and backslashes.
+- Streaming in blocks producing the same file.
+- Writing the \\copy driver script, reading compressed data files through their decompressor.
+- Error handling for unknown COPY formats.
+"""
+
+import pandas as pd
+import pytest
+from app.services.compression import OutputCompression
+from app.services.copy_generator import CopyGenerator
+
+@pytest.fixture
+def chargeable_df():
+    """Sample chargeable DataFrame with values that need escaping."""
+    return pd.DataFrame({
+        "PartnerID": [1, 2, 3],
+        "product": ["prodA", 'prod,"B"', "prod\tC\\"],
+        "partnerPurchasedPlanID": ["idA", "idB", "idC"],
+        "plan": ["planA", None, ""],
+        "usage": [10, 20, 30]
+    })
+
+def _write_chargeable(generator, df, output_dir, block_size=100_000):
+    with generator.chargeable_writer(str(output_dir)) as writer:
+        generator.write_chargeable_rows(writer, df, block_size)
+    return (output_dir / generator.chargeable_filename()).read_text()
+
+def test_write_chargeable_csv(chargeable_df, tmp_path):
+    """Test csv format quoting and NULLs."""
+    content = _write_chargeable(CopyGenerator("csv"), chargeable_df, tmp_path)
+    assert content == (
+        '1,prodA,idA,planA,10\n'
+        '2,"prod,""B""",idB,,20\n'
+        '3,prod\tC\\,idC,"",30\n'
+    )
+
+def test_write_chargeable_text(chargeable_df, tmp_path):
+    """Test text format escaping and NULLs."""
+    content = _write_chargeable(CopyGenerator("text"), chargeable_df, tmp_path)
+    assert content == (
+        '1\tprodA\tidA\tplanA\t10\n'
+        '2\tprod,"B"\tidB\t\\N\t20\n'
+        '3\tprod\\tC\\\\\tidC\t\t30\n'
+    )
+
+def test_write_in_blocks_matches_single_block(chargeable_df, tmp_path):
+    """Test that streaming in small blocks produces the same file."""
+    generator = CopyGenerator("csv")
+    expected = _write_chargeable(generator, chargeable_df, tmp_path)
+    assert _write_chargeable(generator, chargeable_df, tmp_path, block_size=1) == expected
+
+def test_write_domains_csv(tmp_path):
+    """Test the domains COPY data."""
+    generator = CopyGenerator("csv")
+    df = pd.DataFrame({"partnerPurchasedPlanID": ["idA", "idB"], "domains": ["a.com", "b.com"]})
+    with generator.domains_writer(str(tmp_path)) as writer:
+        generator.write_domains_rows(writer, df)
+    assert (tmp_path / "copy_into_domains.csv").read_text() == "idA,a.com\nidB,b.com\n"
+
+def test_write_driver_script(tmp_path):
+    """Test the \\copy driver script refers to the data files and format."""
+    CopyGenerator("text").write_driver_script(str(tmp_path))
+    script = (tmp_path / "copy_into_tables.sql").read_text()
+    assert "\\copy chargeable (\"partnerID\", \"product\", \"partnerPurchasedPlanID\", \"plan\", \"usage\") " \
+        "FROM 'copy_into_chargeable.txt' WITH (FORMAT text)" in script
+    assert "FROM 'copy_into_domains.txt' WITH (FORMAT text)" in script
+
+def test_invalid_copy_format():
+    """Test error for an unknown COPY format."""
+    with pytest.raises(ValueError):
+        CopyGenerator("binary")
+
+def test_write_driver_script_compressed(tmp_path):
+    """Test the \\copy driver script reads compressed data files with FROM PROGRAM."""
+    CopyGenerator("csv").write_driver_script(str(tmp_path), OutputCompression("gzip"))
+    script = (tmp_path / "copy_into_tables.sql").read_text()
+    assert "FROM PROGRAM 'gzip -dc copy_into_chargeable.csv.gz' WITH (FORMAT csv)" in script
+    assert "FROM PROGRAM 'gzip -dc copy_into_domains.csv.gz' WITH (FORMAT csv)" in script
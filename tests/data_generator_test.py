@@ -0,0 +1,41 @@
+"""
+Tests for the synthetic usage report generator used by the benchmarks.
+
+This file covers:
+- Generated reports are deterministic for a seed.
+- Reports have the usage report columns and the requested shares of missing PartNumbers and non-positive itemCount.
+- Writing a report in blocks gives one CSV with a single header.
+"""
+
+import pandas as pd
+from benchmarks import data_generator
+from benchmarks.data_generator import USAGE_REPORT_COLUMNS, UsageReportProfile, generate_usage_report, write_usage_report
+
+PARTNUMBERS = ["AC0000010U0R", "EA000001GB0O", "PLN002NR"]
+
+def test_generate_usage_report_is_deterministic():
+    """Test that the same seed gives the same report and another seed a different one."""
+    first = generate_usage_report(1000, PARTNUMBERS, seed=7)
+    assert first.equals(generate_usage_report(1000, PARTNUMBERS, seed=7))
+    assert not first.equals(generate_usage_report(1000, PARTNUMBERS, seed=8))
+
+def test_generate_usage_report_follows_profile():
+    """Test the columns and the shares of missing PartNumbers and non-positive itemCount."""
+    profile = UsageReportProfile(missing_partnumber_rate=0.5, nonpositive_itemcount_rate=0.2, unmapped_partnumber_rate=0.0)
+    df = generate_usage_report(20000, PARTNUMBERS, seed=1, profile=profile)
+    assert list(df.columns) == USAGE_REPORT_COLUMNS
+    assert len(df) == 20000
+    assert abs(df["PartNumber"].isna().mean() - 0.5) < 0.02
+    assert abs((df["itemCount"] <= 0).mean() - 0.2) < 0.02
+    assert set(df["PartNumber"].dropna()) <= set(PARTNUMBERS)
+    # Rows of an account share its accountGuid, domain and PartnerID
+    assert (df.groupby("accountid")[["accountGuid", "domains", "PartnerID"]].nunique() == 1).all().all()
+
+def test_write_usage_report_in_blocks(tmp_path, monkeypatch):
+    """Test that a report written in several blocks reads back as one CSV."""
+    monkeypatch.setattr(data_generator, "GENERATION_BLOCK_SIZE", 300)
+    filepath = write_usage_report(str(tmp_path / "report.csv"), 1000, PARTNUMBERS, seed=3)
+    df = pd.read_csv(filepath)
+    assert list(df.columns) == USAGE_REPORT_COLUMNS
+    assert len(df) == 1000
+    assert df["accountid"].is_monotonic_increasing
@@ -0,0 +1,115 @@
+"""
+Tests for the delta module.
+
+This file covers:
+- Writing every row as an insert when there is no snapshot yet.
+- Deleting and inserting only the rows that changed since the committed snapshot.
+- Re-inserting duplicate rows whose count changed.
+- Gathering rows from the snapshot files in blocks, including non-ASCII rows.
+- Committing snapshots only on request, and leaving them untouched by failed writes.
+- Error handling for inconsistent snapshots.
+"""
+
+import os
+import sqlite3
+import pandas as pd
+import pytest
+from app.services.delta import DeltaSQLGenerator, DeltaSQLWriter, RowSnapshot
+
+def _domains_df(rows):
+    return pd.DataFrame(rows, columns=["partnerPurchasedPlanID", "domains"])
+
+def _write_domains(generator, output_dir, rows, commit=True):
+    with generator.domains_writer(str(output_dir)) as writer:
+        generator.write_domains_rows(writer, _domains_df(rows))
+    if commit:
+        generator.commit_snapshots()
+    return writer, (output_dir / "delta_domains.sql").read_text()
+
+def _apply(connection, sql):
+    connection.executescript(sql)
+    return sorted(connection.execute("SELECT * FROM domains").fetchall())
+
+@pytest.fixture
+def connection():
+    connection = sqlite3.connect(":memory:")
+    connection.execute('CREATE TABLE domains ("partnerPurchasedPlanID" TEXT, "domain" TEXT)')
+    return connection
+
+def test_first_run_inserts_every_row(tmp_path, connection):
+    """Test that without a snapshot every row is inserted."""
+    generator = DeltaSQLGenerator(str(tmp_path / "snapshot"))
+    writer, sql = _write_domains(generator, tmp_path, [("id1", "a.com"), ("id2", "b.com")])
+    assert (writer.inserted, writer.deleted) == (2, 0)
+    assert sql.startswith("BEGIN;\n") and sql.endswith("COMMIT;\n")
+    assert _apply(connection, sql) == [("id1", "a.com"), ("id2", "b.com")]
+
+def test_delta_holds_only_changed_rows(tmp_path, connection):
+    """Test that a second run deletes the rows that are gone and inserts the new ones only."""
+    generator = DeltaSQLGenerator(str(tmp_path / "snapshot"))
+    _, sql = _write_domains(generator, tmp_path, [("id1", "a.com"), ("id2", "b.com"), ("id3", "c.com")])
+    _apply(connection, sql)
+    writer, sql = _write_domains(generator, tmp_path, [("id1", "a.com"), ("id3", "c.org"), ("id4", "d.com")])
+    assert (writer.inserted, writer.deleted) == (2, 2)
+    assert "'a.com'" not in sql
+    assert _apply(connection, sql) == [("id1", "a.com"), ("id3", "c.org"), ("id4", "d.com")]
+    writer, sql = _write_domains(generator, tmp_path, [("id4", "d.com"), ("id3", "c.org"), ("id1", "a.com")])
+    assert (writer.inserted, writer.deleted) == (0, 0)
+    assert sql == "BEGIN;\nCOMMIT;\n"
+
+def test_duplicate_rows_follow_their_count(tmp_path, connection):
+    """Test that duplicate rows are deleted and re-inserted when their count changes."""
+    generator = DeltaSQLGenerator(str(tmp_path / "snapshot"))
+    _, sql = _write_domains(generator, tmp_path, [("id1", "a.com")] * 3 + [("id2", "b.com")])
+    _apply(connection, sql)
+    writer, sql = _write_domains(generator, tmp_path, [("id1", "a.com")] * 2 + [("id2", "b.com")])
+    assert (writer.inserted, writer.deleted) == (2, 1)
+    assert _apply(connection, sql) == [("id1", "a.com"), ("id1", "a.com"), ("id2", "b.com")]
+
+def test_snapshot_committed_only_on_request(tmp_path):
+    """Test that an uncommitted or failed run leaves the snapshot as it was."""
+    snapshot_path = tmp_path / "snapshot"
+    generator = DeltaSQLGenerator(str(snapshot_path))
+    _write_domains(generator, tmp_path, [("id1", "a.com")])
+    _write_domains(generator, tmp_path, [("id2", "b.com")], commit=False)
+    with pytest.raises(RuntimeError):
+        with generator.domains_writer(str(tmp_path)) as writer:
+            writer.write_rows(["('id3', 'c.com')"])
+            raise RuntimeError("failed run")
+    assert not os.path.exists(snapshot_path / "domains.rows.unsorted")
+    keys, _, _ = RowSnapshot(str(snapshot_path), "domains").load()
+    assert len(keys) == 1
+    writer, _ = _write_domains(generator, tmp_path, [("id1", "a.com")])
+    assert (writer.inserted, writer.deleted) == (0, 0)
+
+def test_delete_statements_are_bounded(tmp_path):
+    """Test that deleted rows are split into DELETE statements of `delete_rows` rows."""
+    snapshot = RowSnapshot(str(tmp_path), "domains")
+    for rows in ([f"('id{i}', 'd{i}.com')" for i in range(5)], []):
+        with DeltaSQLWriter(str(tmp_path / "delta.sql"), "domains", ["partnerPurchasedPlanID", "domain"],
+                            snapshot, delete_rows=2) as writer:
+            writer.write_rows(rows)
+        snapshot.commit()
+    assert writer.deleted == 5
+    assert (tmp_path / "delta.sql").read_text().count("DELETE FROM domains") == 3
+
+def test_rows_gathered_in_blocks_keep_their_text(tmp_path, connection, monkeypatch):
+    """Test that rows gathered several blocks at a time, including non-ASCII text, are written as they came."""
+    monkeypatch.setattr("app.services.delta.GATHER_ROWS", 2)
+    generator = DeltaSQLGenerator(str(tmp_path / "snapshot"))
+    rows = [(f"id{i}", f"dömain{i}.com" if i % 2 else f"d{i}.com") for i in range(5)]
+    _, sql = _write_domains(generator, tmp_path, rows)
+    assert _apply(connection, sql) == sorted(rows)
+    writer, sql = _write_domains(generator, tmp_path, rows[1:] + [("id5", "ünicode.com")])
+    assert (writer.inserted, writer.deleted) == (1, 1)
+    assert "('id0', 'd0.com')" in sql
+    assert _apply(connection, sql) == sorted(rows[1:] + [("id5", "ünicode.com")])
+
+def test_inconsistent_snapshot(tmp_path):
+    """Test that a snapshot whose files do not match raises RuntimeError."""
+    generator = DeltaSQLGenerator(str(tmp_path / "snapshot"))
+    _write_domains(generator, tmp_path, [("id1", "a.com")])
+    with open(tmp_path / "snapshot" / "domains.rows", "a") as f:
+        f.write("extra")
+    with pytest.raises(RuntimeError):
+        RowSnapshot(str(tmp_path / "snapshot"), "domains").load()
@@ -5,22 +5,33 @@ This file covers:
 - Loading and filtering DataFrames from CSV files.
 - Mapping PartNumber to product.
 - Applying usage reduction rules.
+- Loading DataFrames in chunks.
+- Detecting and loading Parquet and Feather/Arrow IPC inputs with column projection.
+- Reading gzip, xz and bz2 compressed CSV inputs, by extension or magic bytes.
 - Preparing domains DataFrame for SQL insertion.
 - Adding processed columns to DataFrames.
 - Normalizing alphanumeric strings.
 - Error handling for missing columns and invalid inputs.
 """
 
+import bz2
+import gzip
+import lzma
 import pandas as pd
 import pytest
+import sys
 from app.domain.df_functions import (
     load_and_prepare_dataframe,
+    iter_dataframe_chunks,
+    detect_input_format,
+    detect_input_compression,
     apply_product_mapping,
     apply_usage_reduction,
     prepare_domains_df,
     add_processed_column,
     normalize_alphanumeric_string,
 )
+from app.domain.usage_reduction import UsageReductionRules
 
 def test_load_and_prepare_dataframe(tmp_path):
     """Test loading and filtering DataFrame from CSV."""
@@ -39,6 +50,72 @@ def test_load_and_prepare_dataframe_missing_column(tmp_path):
     with pytest.raises(ValueError):
         load_and_prepare_dataframe(str(file), headers=["a", "b", "c"])
 
+def test_load_and_prepare_dataframe_keeps_header_order(tmp_path):
+    """Test that projected columns come back in the order of the headers."""
+    file = tmp_path / "test.csv"
+    file.write_text("a,b,c\n1,2,3")
+    df = load_and_prepare_dataframe(str(file), headers=["c", "a"])
+    assert list(df.columns) == ["c", "a"]
+
+@pytest.mark.parametrize("filename,writer", [
+    ("report.parquet", "to_parquet"),
+    ("report.feather", "to_feather"),
+    ("report.bin", "to_parquet"),
+])
+def test_load_and_prepare_dataframe_columnar(tmp_path, filename, writer):
+    """Test loading Parquet and Feather inputs, detected by extension or magic bytes."""
+    pytest.importorskip("pyarrow")
+    file = tmp_path / filename
+    getattr(pd.DataFrame({"a": [1, 4], "b": ["x", "y"], "c": [3, 6]}), writer)(file)
+    df = load_and_prepare_dataframe(str(file), headers=["a", "b"])
+    assert list(df.columns) == ["a", "b"]
+    assert df["a"].tolist() == [1, 4]
+
+def test_load_and_prepare_dataframe_columnar_missing_column(tmp_path):
+    """Test error when required columns are missing in a Parquet input."""
+    pytest.importorskip("pyarrow")
+    file = tmp_path / "report.parquet"
+    pd.DataFrame({"a": [1]}).to_parquet(file)
+    with pytest.raises(ValueError):
+        load_and_prepare_dataframe(str(file), headers=["a", "b"])
+
+def test_iter_dataframe_chunks_parquet(tmp_path):
+    """Test loading a Parquet input in chunks."""
+    pytest.importorskip("pyarrow")
+    file = tmp_path / "report.parquet"
+    pd.DataFrame({"a": [1, 2, 3], "b": [4, 5, 6]}).to_parquet(file)
+    chunks = list(iter_dataframe_chunks(str(file), headers=["b"], chunksize=2))
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert pd.concat(chunks)["b"].tolist() == [4, 5, 6]
+
+def test_iter_dataframe_chunks_arrow_ipc(tmp_path):
+    """Test loading an Arrow IPC input in chunks."""
+    pytest.importorskip("pyarrow")
+    file = tmp_path / "report.arrow"
+    pd.DataFrame({"a": [1, 2, 3], "b": ["x", "y", "z"]}).to_feather(file)
+    chunks = list(iter_dataframe_chunks(str(file), headers=["a", "b"], chunksize=2))
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert pd.concat(chunks)["b"].tolist() == ["x", "y", "z"]
+
+def test_load_columnar_without_pyarrow(tmp_path, monkeypatch):
+    """Test that a Parquet input without pyarrow installed fails with an error naming it."""
+    pytest.importorskip("pyarrow")
+    file = tmp_path / "report.parquet"
+    pd.DataFrame({"a": [1]}).to_parquet(file)
+    monkeypatch.setitem(sys.modules, "pyarrow.dataset", None)
+    with pytest.raises(RuntimeError, match="pyarrow"):
+        load_and_prepare_dataframe(str(file), headers=["a"])
+
+def test_detect_input_format(tmp_path):
+    """Test format detection by extension, magic bytes and CSV fallback."""
+    assert detect_input_format("report.PARQUET") == "parquet"
+    assert detect_input_format("report.arrow") == "ipc"
+    file = tmp_path / "report"
+    file.write_bytes(b"ARROW1\x00\x00")
+    assert detect_input_format(str(file)) == "ipc"
+    file.write_text("a,b\n1,2")
+    assert detect_input_format(str(file)) == "csv"
+
 def test_apply_product_mapping():
     """Test mapping PartNumber to product."""
     df = pd.DataFrame({"PartNumber": ["X", "Y", "Z"]})
@@ -63,6 +140,18 @@ def test_apply_usage_reduction():
     assert result.loc[0, "usage"] == 10
     assert result.loc[1, "usage"] == 2
 
+def test_apply_usage_reduction_truncates_by_default():
+    """Test that reduced usage is truncated to integers by default."""
+    df = pd.DataFrame({"itemCount": [1999, 5], "PartNumber": ["A", "B"]})
+    result = apply_usage_reduction(df, {"A": 1000})
+    assert list(result["usage"]) == [1, 5]
+
+def test_apply_usage_reduction_compiled_rules():
+    """Test applying compiled rules with a rounding policy."""
+    df = pd.DataFrame({"itemCount": [1500], "PartNumber": ["A"]})
+    result = apply_usage_reduction(df, UsageReductionRules({"A": 1000}, rounding="round_half_up"))
+    assert result.loc[0, "usage"] == 2
+
 def test_apply_usage_reduction_missing_columns():
     """Test error when required columns are missing for usage reduction."""
     df = pd.DataFrame({"foo": [1]})
@@ -115,4 +204,45 @@ def test_normalize_alphanumeric_string():
 def test_normalize_alphanumeric_string_invalid_length():
     """Test error when normalized string does not match expected length."""
     with pytest.raises(ValueError):
-        normalize_alphanumeric_string("abc", expected_length=5)
\ No newline at end of file
+        normalize_alphanumeric_string("abc", expected_length=5)
+
+def test_iter_dataframe_chunks(tmp_path):
+    """Test loading a CSV in chunks filtered to the provided headers."""
+    file = tmp_path / "test.csv"
+    file.write_text("a,b,c\n1,2,3\n4,5,6\n7,8,9")
+    chunks = list(iter_dataframe_chunks(str(file), headers=["a", "c"], chunksize=2))
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert all(list(chunk.columns) == ["a", "c"] for chunk in chunks)
+
+def test_iter_dataframe_chunks_invalid_chunksize(tmp_path):
+    """Test error when chunksize is not positive."""
+    file = tmp_path / "test.csv"
+    file.write_text("a\n1")
+    with pytest.raises(ValueError):
+        list(iter_dataframe_chunks(str(file), headers=["a"], chunksize=0))
+
+@pytest.mark.parametrize("filename, compress", [
+    ("report.csv.gz", gzip.compress),
+    ("report.csv.xz", lzma.compress),
+    ("report", bz2.compress),
+])
+def test_load_compressed_csv(tmp_path, filename, compress):
+    """Test that compressed CSV reports are read like plain ones, in one go or in chunks."""
+    file = tmp_path / filename
+    file.write_bytes(compress(b"a,b,c\n1,2,3\n4,5,6\n7,8,9\n"))
+    df = load_and_prepare_dataframe(str(file), headers=["c", "a"])
+    assert df.values.tolist() == [[3, 1], [6, 4], [9, 7]]
+    chunks = list(iter_dataframe_chunks(str(file), headers=["a"], chunksize=2))
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+
+def test_detect_input_compression(tmp_path):
+    """Test compression detection by extension and magic bytes, and that compressed reports are CSV."""
+    assert detect_input_compression("report.csv.GZ") == "gzip"
+    assert detect_input_format("report.csv.bz2") == "csv"
+    file = tmp_path / "report"
+    file.write_bytes(lzma.compress(b"a\n1\n"))
+    assert detect_input_compression(str(file)) == "xz"
+    file.write_text("a\n1\n")
+    assert detect_input_compression(str(file)) is None
+    with pytest.raises(ValueError):
+        detect_input_format("report.parquet.gz")
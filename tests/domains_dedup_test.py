@@ -0,0 +1,113 @@
+"""
+Tests for the DomainsDeduplicator class from the domains_dedup module.
+
+This file covers:
+- First-occurrence semantics across chunks, kept in memory.
+- Exact string comparison when distinct domains share a hash.
+- The same output when the memory budget forces spilling to disk.
+- Loading one partition at a time when draining, and one block per partition while merging.
+- Removing spill files on close.
+- Validation of the memory budget and partitions.
+"""
+
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from app.services import domains_dedup
+from app.services.domains_dedup import DomainsDeduplicator
+
+def make_chunks(rows, chunksize, seed=0):
+    """Domains rows with many repeats, split into chunks."""
+    rng = np.random.default_rng(seed)
+    domains = [f"d{value}.com" for value in rng.integers(0, rows // 3, size=rows)]
+    df = pd.DataFrame({
+        "partnerPurchasedPlanID": [f"id{index}" for index in range(rows)],
+        "domains": domains,
+    })
+    return df, [df.iloc[start:start + chunksize] for start in range(0, rows, chunksize)]
+
+def expected_rows(df):
+    return df.drop_duplicates(subset=["domains"], keep="first").reset_index(drop=True)
+
+def drain_all(deduplicator):
+    blocks = list(deduplicator.drain())
+    return pd.concat(blocks, ignore_index=True) if blocks else pd.DataFrame(columns=["partnerPurchasedPlanID", "domains"])
+
+def test_dedup_in_memory_keeps_first_occurrence():
+    """Test that each domain keeps the row of its first occurrence, in stream order."""
+    df, chunks = make_chunks(1000, 100)
+    with DomainsDeduplicator() as deduplicator:
+        for chunk in chunks:
+            deduplicator.add(chunk)
+        result = drain_all(deduplicator)
+        assert not deduplicator.spilled
+    expected = df.drop_duplicates(subset=["domains"], keep="first").reset_index(drop=True)
+    pd.testing.assert_frame_equal(result, expected)
+
+def test_dedup_hash_collisions_compare_strings(monkeypatch):
+    """Test that domains sharing a hash are told apart by their strings."""
+    monkeypatch.setattr(domains_dedup, "_domain_hashes", lambda domains: np.array([len(domain) % 2 for domain in domains], dtype="uint64"))
+    df, chunks = make_chunks(1000, 100, seed=2)
+    with DomainsDeduplicator() as deduplicator:
+        for chunk in chunks:
+            deduplicator.add(chunk)
+        result = drain_all(deduplicator)
+    pd.testing.assert_frame_equal(result, expected_rows(df))
+
+def test_dedup_spilled_matches_in_memory(tmp_path):
+    """Test that spilling to disk under a small budget gives the same rows in the same order."""
+    df, chunks = make_chunks(5000, 250, seed=1)
+    with DomainsDeduplicator(memory_budget_bytes=20_000, spill_path=str(tmp_path), partitions=8, block_size=97) as deduplicator:
+        for chunk in chunks:
+            deduplicator.add(chunk)
+        result = drain_all(deduplicator)
+        assert deduplicator.spilled
+    expected = df.drop_duplicates(subset=["domains"], keep="first").reset_index(drop=True)
+    pd.testing.assert_frame_equal(result, expected)
+    assert os.listdir(tmp_path) == []
+
+def test_dedup_drain_bounds_rows_loaded(tmp_path, monkeypatch):
+    """Test that draining loads one partition at a time, then merges one range of stream positions at a time."""
+    reads = []
+    read_pickle = pd.read_pickle
+
+    def counting_read_pickle(filepath):
+        rows = read_pickle(filepath)
+        reads.append((os.path.basename(filepath), len(rows)))
+        return rows
+
+    monkeypatch.setattr(pd, "read_pickle", counting_read_pickle)
+    df, chunks = make_chunks(5000, 250, seed=2)
+    expected = expected_rows(df)
+    with DomainsDeduplicator(memory_budget_bytes=20_000, spill_path=str(tmp_path), partitions=8, block_size=300) as deduplicator:
+        for chunk in chunks:
+            deduplicator.add(chunk)
+        blocks = deduplicator.drain()
+        first_block = next(blocks)
+        rows_per_partition = {}
+        for name, rows in reads:
+            if name.startswith("spill_"):
+                partition = name.split("_")[1]
+                rows_per_partition[partition] = rows_per_partition.get(partition, 0) + rows
+        # Partitions were read one after the other, each holding a fraction of the rows
+        assert list(rows_per_partition) == sorted(rows_per_partition)
+        assert max(rows_per_partition.values()) < len(df) / 4
+        # The first block only needed the first range of every partition
+        merge_reads = [(name, rows) for name, rows in reads if name.startswith("merge_")]
+        assert {name.split("_")[1] for name, _ in merge_reads} == {"000000"}
+        assert sum(rows for _, rows in merge_reads) == len(first_block) <= 300
+        result = pd.concat([first_block] + list(blocks), ignore_index=True)
+    pd.testing.assert_frame_equal(result, expected)
+    assert os.listdir(tmp_path) == []
+
+def test_dedup_empty_stream():
+    """Test that no chunks give no rows."""
+    with DomainsDeduplicator() as deduplicator:
+        assert len(drain_all(deduplicator)) == 0
+
+@pytest.mark.parametrize("kwargs", [{"memory_budget_bytes": 0}, {"partitions": 0}])
+def test_dedup_invalid_arguments(kwargs):
+    """Test that a non-positive budget or partition count is rejected."""
+    with pytest.raises(ValueError):
+        DomainsDeduplicator(**kwargs)
@@ -0,0 +1,85 @@
+"""
+Tests for the error_sink module.
+
+This file covers:
+- Writing error log rows in full up to the cap, then sampling the rest.
+- Bounded, reproducible samples written in the order their rows were found.
+- Sampling chunk by chunk matching a single frame.
+- Counting every rejected row per reason and PartnerID.
+- Starting a log over when it is not appended to.
+- Error handling for invalid caps and sample sizes.
+"""
+
+import pandas as pd
+import pytest
+from app.services.error_sink import ERROR_COUNTS_FILENAME, ErrorSink
+
+@pytest.fixture
+def error_df():
+    return pd.DataFrame({
+        "PartnerID": [str(1 + i % 3) for i in range(100)],
+        "PartNumber": [None] * 100,
+        "row": range(100),
+    })
+
+def test_add_writes_rows_up_to_cap(error_df):
+    """Test that rows up to the cap are returned in full, across consecutive frames."""
+    sink = ErrorSink(max_rows=30, sample_rows=10)
+    assert list(sink.add("no_partnumber_error_df", error_df.iloc[:20])["row"]) == list(range(20))
+    assert list(sink.add("no_partnumber_error_df", error_df.iloc[20:50], append=True)["row"]) == list(range(20, 30))
+    assert sink.add("no_partnumber_error_df", error_df.iloc[50:], append=True).empty
+
+def test_sample_is_bounded_and_reproducible(error_df, tmp_path):
+    """Test that the sample holds at most sample_rows rows past the cap, in arrival order, the same on every run."""
+    samples = []
+    for run in range(2):
+        sink = ErrorSink(max_rows=30, sample_rows=10)
+        sink.add("no_partnumber_error_df", error_df)
+        output_dir = tmp_path / str(run)
+        output_dir.mkdir()
+        sink.write(str(output_dir))
+        samples.append(pd.read_csv(output_dir / "no_partnumber_error_df_sample.csv"))
+    rows = list(samples[0]["row"])
+    assert len(rows) == 10
+    assert rows == sorted(rows) and min(rows) >= 30
+    pd.testing.assert_frame_equal(samples[0], samples[1])
+
+def test_chunked_sample_matches_single_frame(error_df, tmp_path):
+    """Test that folding frames in one by one gives the same sample and counts as one frame."""
+    whole = ErrorSink(max_rows=30, sample_rows=10)
+    whole.add("no_partnumber_error_df", error_df)
+    chunked = ErrorSink(max_rows=30, sample_rows=10)
+    for start in range(0, len(error_df), 7):
+        chunked.add("no_partnumber_error_df", error_df.iloc[start:start + 7], append=start > 0)
+    for sink, name in ((whole, "whole"), (chunked, "chunked")):
+        (tmp_path / name).mkdir()
+        sink.write(str(tmp_path / name))
+    for filename in ("no_partnumber_error_df_sample.csv", ERROR_COUNTS_FILENAME):
+        assert (tmp_path / "whole" / filename).read_text() == (tmp_path / "chunked" / filename).read_text()
+
+def test_counts_per_reason_and_partner(error_df):
+    """Test that every row is counted per reason and PartnerID, including rows past the cap."""
+    sink = ErrorSink(max_rows=5, sample_rows=0)
+    sink.add("no_partnumber_error_df", error_df)
+    sink.add("itemcount_nonpositive_error_df", error_df.iloc[:4].assign(PartnerID=None))
+    assert sink.counts().values.tolist() == [
+        ["itemcount_nonpositive", "", 4],
+        ["no_partnumber", "1", 34], ["no_partnumber", "2", 33], ["no_partnumber", "3", 33],
+    ]
+
+def test_add_without_append_starts_over(error_df, tmp_path):
+    """Test that a log written again without append drops its earlier rows, sample and counts."""
+    sink = ErrorSink(max_rows=5, sample_rows=10)
+    sink.add("no_partnumber_error_df", error_df)
+    assert len(sink.add("no_partnumber_error_df", error_df.iloc[:3])) == 3
+    assert sink.counts()["rows"].sum() == 3
+    sink.write(str(tmp_path))
+    sample_df = pd.read_csv(tmp_path / "no_partnumber_error_df_sample.csv")
+    assert sample_df.empty
+    assert list(sample_df.columns) == ["PartnerID", "PartNumber", "row"]
+
+@pytest.mark.parametrize("max_rows, sample_rows", [(-1, 10), (10, -1)])
+def test_invalid_settings(max_rows, sample_rows):
+    """Test that negative caps and sample sizes raise ValueError."""
+    with pytest.raises(ValueError):
+        ErrorSink(max_rows, sample_rows)
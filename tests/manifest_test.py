@@ -0,0 +1,42 @@
+"""
+Tests for the RunManifest class from the manifest module.
+
+This file covers:
+- Content hashes of files and values.
+- Detecting unchanged inputs and outputs.
+- Detecting changed inputs, changed outputs and missing outputs.
+"""
+
+from app.services.manifest import RunManifest, file_digest, value_digest
+
+def test_value_digest_ignores_key_order():
+    """Test that dictionaries with the same content hash the same."""
+    assert value_digest({"a": 1, "b": 2}) == value_digest({"b": 2, "a": 1})
+    assert value_digest({"a": 1}) != value_digest({"a": 2})
+
+def test_file_digest(tmp_path):
+    """Test that file hashes follow the file contents."""
+    file = tmp_path / "a.txt"
+    file.write_text("one")
+    first = file_digest(str(file))
+    file.write_text("two")
+    assert file_digest(str(file)) != first
+
+def test_is_up_to_date(tmp_path):
+    """Test that a recorded run is up to date until an input or output changes."""
+    (tmp_path / "out.sql").write_text("INSERT")
+    manifest = RunManifest(str(tmp_path))
+    inputs = {"usage_report": "abc"}
+    assert not manifest.is_up_to_date(inputs)
+    manifest.write(inputs, ["out.sql", "never_written.csv"])
+    assert manifest.is_up_to_date(inputs)
+    assert not manifest.is_up_to_date({"usage_report": "def"})
+    (tmp_path / "out.sql").write_text("TAMPERED")
+    assert not manifest.is_up_to_date(inputs)
+    (tmp_path / "out.sql").unlink()
+    assert not manifest.is_up_to_date(inputs)
+
+def test_unreadable_manifest_is_ignored(tmp_path):
+    """Test that a corrupt manifest means the run is not up to date."""
+    (tmp_path / "run_manifest.json").write_text("{not json")
+    assert not RunManifest(str(tmp_path)).is_up_to_date({})
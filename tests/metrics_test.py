@@ -0,0 +1,113 @@
+"""
+Tests for the RunMetrics class from the metrics module.
+
+This file covers:
+- Accumulating time and row counts of a stage run several times.
+- Recording the run status, including failed runs.
+- Tracing memory only between start and finish.
+- The Prometheus textfile format.
+- Disabled metrics recording and writing nothing.
+- Concurrent writes of the same files, and write failures logged instead of raised.
+"""
+
+import json
+import threading
+import tracemalloc
+import pytest
+from app.services.metrics import RunMetrics
+
+def test_stage_accumulates_across_calls():
+    """Test that a stage run once per chunk adds up its rows and rejections."""
+    metrics = RunMetrics()
+    for rows_in, rows_out in [(10, 7), (5, 4)]:
+        with metrics.stage("filter") as stage:
+            stage.rows(rows_in, rows_out, no_partnumber=rows_in - rows_out)
+    metrics.finish("ok")
+    report = metrics.to_dict()
+    assert report["status"] == "ok"
+    assert report["stages"]["filter"]["calls"] == 2
+    assert report["stages"]["filter"]["rows_in"] == 15
+    assert report["stages"]["filter"]["rows_out"] == 11
+    assert report["stages"]["filter"]["rejected"] == {"no_partnumber": 4}
+    assert report["stages"]["filter"]["cpu_seconds"] >= 0
+
+def test_stage_is_recorded_when_it_raises():
+    """Test that a failing stage still records its time."""
+    metrics = RunMetrics()
+    with pytest.raises(ValueError):
+        with metrics.stage("load"):
+            raise ValueError("bad input")
+    metrics.finish("failed")
+    assert metrics.to_dict()["stages"]["load"]["calls"] == 1
+
+def test_trace_memory_records_peak_allocations():
+    """Test that tracing memory records the peak of Python allocations within a stage."""
+    metrics = RunMetrics(trace_memory=True)
+    assert not tracemalloc.is_tracing()
+    metrics.start()
+    assert tracemalloc.is_tracing()
+    with metrics.stage("allocate"):
+        data = bytearray(5 * 1024 * 1024)
+    del data
+    metrics.finish("ok")
+    assert not tracemalloc.is_tracing()
+    assert metrics.to_dict()["stages"]["allocate"]["peak_traced_bytes"] >= 5 * 1024 * 1024
+
+def test_write_json_and_prometheus(tmp_path):
+    """Test the metrics.json report and the Prometheus textfile."""
+    prometheus_path = tmp_path / "translator.prom"
+    metrics = RunMetrics(prometheus_filepath=str(prometheus_path))
+    with metrics.stage("map") as stage:
+        stage.rows(3, 2, unmapped_partnumber=1)
+    metrics.finish("failed")
+    metrics.write(str(tmp_path))
+    with open(tmp_path / "metrics.json") as f:
+        assert json.load(f)["stages"]["map"]["rows_out"] == 2
+    text = prometheus_path.read_text()
+    assert "# TYPE translator_stage_wall_seconds gauge" in text
+    assert "translator_run_success 0" in text
+    assert 'translator_stage_rows_rejected{stage="map",reason="unmapped_partnumber"} 1' in text
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["metrics.json", "translator.prom"]
+
+def test_disabled_metrics(tmp_path):
+    """Test that disabled metrics record no stages and write no files."""
+    metrics = RunMetrics(enabled=False, prometheus_filepath=str(tmp_path / "translator.prom"))
+    with metrics.stage("load") as stage:
+        stage.rows(1, 1)
+    metrics.finish("ok")
+    metrics.write(str(tmp_path))
+    assert metrics.stages == {}
+    assert list(tmp_path.iterdir()) == []
+
+def test_concurrent_writes(tmp_path):
+    """Test that runs writing the same files at once each replace them whole, leaving no temporary files."""
+    prometheus_path = tmp_path / "translator.prom"
+    errors = []
+
+    def write(index):
+        metrics = RunMetrics(prometheus_filepath=str(prometheus_path))
+        with metrics.stage("load") as stage:
+            stage.rows(index, index)
+        metrics.finish("ok")
+        try:
+            for _ in range(20):
+                metrics.write(str(tmp_path))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(index,)) for index in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    with open(tmp_path / "metrics.json") as f:
+        assert json.load(f)["stages"]["load"]["rows_in"] in range(4)
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["metrics.json", "translator.prom"]
+
+def test_write_failure_is_logged(tmp_path, caplog):
+    """Test that failing to write the metrics is logged, not raised."""
+    metrics = RunMetrics()
+    metrics.finish("ok")
+    metrics.write(str(tmp_path / "missing"))
+    assert "Failed to write run metrics" in caplog.text
@@ -0,0 +1,53 @@
+"""
+Tests for the OutputTasks class from the output_tasks module.
+
+This file covers:
+- Running tasks inline when there are no workers.
+- Keeping submission order with a single worker.
+- Re-raising the first failing task in submission order.
+- Bounding the pending tasks.
+"""
+
+import threading
+import time
+import pytest
+from app.services.output_tasks import OutputTasks
+
+def test_inline_tasks_run_immediately():
+    """Test that without workers a task runs when submitted, on the calling thread."""
+    calls = []
+    with OutputTasks() as tasks:
+        tasks.submit(lambda value: calls.append((value, threading.current_thread())), 1)
+        assert calls == [(1, threading.current_thread())]
+        assert not tasks.concurrent
+
+def test_single_worker_keeps_order():
+    """Test that a single worker runs tasks in submission order."""
+    calls = []
+    with OutputTasks(1) as tasks:
+        for value in range(50):
+            tasks.submit(lambda value: (time.sleep(0.001 * (value % 3)), calls.append(value)), value)
+    assert calls == list(range(50))
+
+def test_first_error_is_raised():
+    """Test that the first failing task's exception is raised when the tasks are waited for."""
+    def fail(message):
+        raise ValueError(message)
+    with pytest.raises(ValueError, match="first"):
+        with OutputTasks(2) as tasks:
+            tasks.submit(fail, "first")
+            tasks.submit(fail, "second")
+
+def test_max_pending_bounds_queue():
+    """Test that submitting waits once more than max_pending tasks are queued."""
+    started = []
+    with OutputTasks(1, max_pending=2) as tasks:
+        for value in range(10):
+            tasks.submit(lambda value: (time.sleep(0.002), started.append(value)), value)
+            assert len(tasks._pending) <= 2
+    assert started == list(range(10))
+
+def test_negative_workers():
+    """Test error when the number of workers is negative."""
+    with pytest.raises(ValueError):
+        OutputTasks(-1)
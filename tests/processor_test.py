@@ -4,15 +4,41 @@ Tests for the FileProcessor class from the processor module.
 This file covers:
 - Validation of required columns in DataFrames.
 - Loading the partnumber-to-product mapping from a JSON file.
-- Writing totals by Product and error logs to output files.
+- Writing totals by Product, PartnerID and plan and error logs to output files.
 - Full processing flow, including generation of all expected output files.
+- Chunked processing producing the same outputs as a single-shot run.
+- Routing rows with an invalid accountGuid to an error log instead of aborting.
+- Writing PostgreSQL COPY data instead of INSERT statements.
+- Loading rows straight into a database.
+- Routing rows violating the input schema to an error log, keeping their domains.
+- Skipping runs whose inputs and outputs are unchanged, but not re-runs adding a database.
+- Writing per-stage run metrics, tracing memory only while a run is processed.
+- Chunked runs that spill domains to disk matching a single-shot run.
+- Concurrent output writing matching sequential runs, and reporting errors the same way.
+- Writing compressed outputs on a writer thread by default.
+- Compressed outputs and inputs decompressing to the same files as plain ones.
+- Sharded, batched INSERT statements loading the same rows as the single-statement files.
+- Delta runs writing only the rows changed since the previous run.
+- Consolidating chargeable rows sharing their keys, chunked or not.
+- Validating the usage report, routing violating rows to an error log and summing violations per rule.
+- Capping the error logs, sampling and counting the rows past the cap the same way chunked or not.
 """
 
 import os
+import gzip
 import json
+import lzma
+import sqlite3
+import tracemalloc
 import pandas as pd
 import pytest
+from app.domain.product_mapping import ProductMapping
 from app.services.processor import FileProcessor
+from app.services.db_loader import DatabaseLoader
+from app.services.metrics import RunMetrics
+from app.services.compression import OutputCompression
+from app.services.sql_generator import SQLLayout
+from app.domain.validation import DEFAULT_VALIDATION_RULES, ValidationRules
 
 @pytest.fixture
 def tmp_mapping_file(tmp_path):
@@ -59,20 +85,27 @@ def test_validate_columns_missing(processor, sample_df):
 def test_load_partnumber_to_product_map(processor):
     """Test loading the partnumber-to-product mapping from JSON."""
     mapping = processor._load_partnumber_to_product_map()
-    assert isinstance(mapping, dict)
-    assert "A" in mapping
+    assert isinstance(mapping, ProductMapping)
+    assert "A" in mapping.rules
 
 def test_write_totals_by_product_creates_file(processor, tmp_path):
-    """Test that totals_by_product CSV file is created and contains expected columns."""
+    """Test that the totals CSV files are created and contain expected columns."""
     df = pd.DataFrame({
+        "PartnerID": [1, 1, 2],
         "product": ["A", "B", "A"],
-        "itemCount": [10, 20, 30]
+        "plan": ["p1", "p2", "p1"],
+        "itemCount": [10, 20, 30],
+        "usage": [1, 2, 3]
     })
     processor._write_totals_by_product(df)
     output_file = os.path.join(processor.output_files_path, "totals_by_product.csv")
     assert os.path.exists(output_file)
     out_df = pd.read_csv(output_file)
     assert "itemCount" in out_df.columns
+    assert out_df.to_dict("list") == {"product": ["A", "B"], "itemCount": [40, 20]}
+    partner_df = pd.read_csv(os.path.join(processor.output_files_path, "totals_by_partner.csv"))
+    assert partner_df.to_dict("list") == {"PartnerID": [1, 2], "itemCount": [30, 30], "usage": [3, 3]}
+    assert os.path.exists(os.path.join(processor.output_files_path, "totals_by_plan.csv"))
 
 def test_write_error_logs_creates_files(processor, tmp_path):
     """Test that error log CSV files are created."""
@@ -107,4 +140,580 @@ def test_process_full_flow(processor, tmp_path):
     # Check if output files were created
     assert os.path.exists(os.path.join(processor.output_files_path, "totals_by_product.csv"))
     assert os.path.exists(os.path.join(processor.output_files_path, "insert_into_chargeable.sql"))
-    assert os.path.exists(os.path.join(processor.output_files_path, "insert_into_domains.sql"))
\ No newline at end of file
+    assert os.path.exists(os.path.join(processor.output_files_path, "insert_into_domains.sql"))
+
+def test_process_in_chunks_matches_single_shot(tmp_mapping_file, tmp_path):
+    """Test that streaming the report in chunks produces the same outputs as a single-shot run."""
+    csv_path = tmp_path / "input.csv"
+    pd.DataFrame({
+        "PartnerID": [1, 2, 3, 1, 2],
+        "accountGuid": [
+            "a1b2c3d4e5f6g7h8i9j0k1l2m3n4o5p6",
+            "12345678901234567890123456789012",
+            "abcdefabcdefabcdefabcdefabcdefab",
+            "a1b2c3d4e5f6g7h8i9j0k1l2m3n4o5p6",
+            "12345678901234567890123456789012"
+        ],
+        "domains": ["a.com", "b.com", "a.com", None, "c.com"],
+        "plan": ["plan1", "plan2", "plan3", "plan1", "plan2"],
+        "PartNumber": ["A", None, "B", "A", "B"],
+        "itemCount": [10, 20, 0, 5, 4000]
+    }).to_csv(csv_path, index=False)
+    outputs = {}
+    for chunksize in (None, 2):
+        output_dir = tmp_path / f"out_{chunksize}"
+        output_dir.mkdir()
+        FileProcessor(str(output_dir), tmp_mapping_file).process(
+            usage_report_filepath=str(csv_path),
+            partner_ids_to_skip=[3],
+            itemcount_to_usage_reduction_rules={"B": 1000},
+            headers=["PartnerID", "accountGuid", "domains", "plan", "PartNumber", "itemCount"],
+            chunksize=chunksize
+        )
+        outputs[chunksize] = {name: (output_dir / name).read_text() for name in sorted(os.listdir(output_dir))}
+    assert len(outputs[None]) == 11
+    assert outputs[2] == outputs[None]
+
+def test_process_routes_invalid_account_guid(processor, tmp_path):
+    """Test that rows with an invalid accountGuid are logged and the rest is processed."""
+    csv_path = tmp_path / "input.csv"
+    pd.DataFrame({
+        "PartnerID": [1, 2],
+        "accountGuid": ["a1b2c3d4e5f6g7h8i9j0k1l2m3n4o5p6", "short-guid"],
+        "domains": ["a.com", "b.com"],
+        "plan": ["plan1", "plan2"],
+        "PartNumber": ["A", "B"],
+        "itemCount": [10, 20]
+    }).to_csv(csv_path, index=False)
+    processor.process(
+        usage_report_filepath=str(csv_path),
+        partner_ids_to_skip=[],
+        itemcount_to_usage_reduction_rules={},
+        headers=["PartnerID", "accountGuid", "domains", "plan", "PartNumber", "itemCount"]
+    )
+    invalid_df = pd.read_csv(os.path.join(processor.output_files_path, "invalid_account_guid_error_df.csv"))
+    assert list(invalid_df["accountGuid"]) == ["short-guid"]
+    with open(os.path.join(processor.output_files_path, "insert_into_domains.sql")) as f:
+        content = f.read()
+    assert "a.com" in content
+    assert "b.com" not in content
+
+def test_process_copy_output_format(tmp_mapping_file, tmp_path):
+    """Test that the COPY output format writes the same rows as the INSERT output."""
+    csv_path = tmp_path / "input.csv"
+    pd.DataFrame({
+        "PartnerID": [1, 2],
+        "accountGuid": ["a1b2c3d4e5f6g7h8i9j0k1l2m3n4o5p6", "12345678901234567890123456789012"],
+        "domains": ["a.com", "b.com"],
+        "plan": ["plan1", "plan2"],
+        "PartNumber": ["A", "B"],
+        "itemCount": [10, 20]
+    }).to_csv(csv_path, index=False)
+    processor = FileProcessor(str(tmp_path), tmp_mapping_file, output_format="copy_csv")
+    processor.process(
+        usage_report_filepath=str(csv_path),
+        partner_ids_to_skip=[],
+        itemcount_to_usage_reduction_rules={},
+        headers=["PartnerID", "accountGuid", "domains", "plan", "PartNumber", "itemCount"]
+    )
+    assert (tmp_path / "copy_into_chargeable.csv").read_text() == (
+        "1,ProductA,a1b2c3d4e5f6g7h8i9j0k1l2m3n4o5p6,plan1,10\n"
+        "2,ProductB,12345678901234567890123456789012,plan2,20\n"
+    )
+    assert (tmp_path / "copy_into_domains.csv").exists()
+    assert (tmp_path / "copy_into_tables.sql").exists()
+    assert not (tmp_path / "insert_into_chargeable.sql").exists()
+
+def test_invalid_output_format(tmp_mapping_file, tmp_path):
+    """Test error for an unknown output format."""
+    with pytest.raises(ValueError):
+        FileProcessor(str(tmp_path), tmp_mapping_file, output_format="xml")
+
+def test_process_loads_into_database(tmp_mapping_file, tmp_path):
+    """Test that rows are written straight to the database when a loader is configured."""
+    csv_path = tmp_path / "input.csv"
+    pd.DataFrame({
+        "PartnerID": [1, 2],
+        "accountGuid": ["a1b2c3d4e5f6g7h8i9j0k1l2m3n4o5p6", "12345678901234567890123456789012"],
+        "domains": ["a.com", "a.com"],
+        "plan": ["plan1", "plan2"],
+        "PartNumber": ["A", "B"],
+        "itemCount": [10, 20]
+    }).to_csv(csv_path, index=False)
+    database_path = tmp_path / "test.db"
+    loader = DatabaseLoader.from_url(f"sqlite:///{database_path}")
+    processor = FileProcessor(str(tmp_path), tmp_mapping_file, database_loader=loader)
+    processor.process(
+        usage_report_filepath=str(csv_path),
+        partner_ids_to_skip=[],
+        itemcount_to_usage_reduction_rules={},
+        headers=["PartnerID", "accountGuid", "domains", "plan", "PartNumber", "itemCount"]
+    )
+    loader.close()
+    with sqlite3.connect(database_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM chargeable").fetchone() == (2,)
+        assert conn.execute("SELECT COUNT(*) FROM domains").fetchone() == (1,)
+
+def test_process_routes_schema_violations(processor, tmp_path):
+    """Test that rows violating the input schema are logged and the rest is processed."""
+    csv_path = tmp_path / "input.csv"
+    csv_path.write_text(
+        "PartnerID,accountGuid,domains,plan,PartNumber,itemCount\n"
+        "1,a1b2c3d4e5f6g7h8i9j0k1l2m3n4o5p6,a.com,plan1,A,10\n"
+        "2,12345678901234567890123456789012,b.com,plan2,B,ten\n"
+    )
+    processor.process(
+        usage_report_filepath=str(csv_path),
+        partner_ids_to_skip=[],
+        itemcount_to_usage_reduction_rules={},
+        headers=["PartnerID", "accountGuid", "domains", "plan", "PartNumber", "itemCount"]
+    )
+    violations = pd.read_csv(os.path.join(processor.output_files_path, "schema_violation_error_df.csv"))
+    assert violations["PartnerID"].tolist() == [2]
+    assert violations["schema_violation"].tolist() == ["itemCount"]
+    totals = pd.read_csv(os.path.join(processor.output_files_path, "totals_by_product.csv"))
+    assert totals["itemCount"].tolist() == [10]
+
+def test_schema_violations_keep_domains(tmp_path):
+    """Test that rows missing PartnerID or itemCount are left out of the chargeable rows only, not the domains."""
+    header = "PartnerID,accountGuid,domains,plan,PartNumber,itemCount\n"
+    rows = [
+        "1,a1b2c3d4e5f6g7h8i9j0k1l2m3n4o5p6,a.com,plan1,A,10\n",
+        "{},12345678901234567890123456789012,b.com,plan2,B,3\n",
+        "3,abcdefabcdefabcdefabcdefabcdefab,c.com,plan1,A,{}\n",
+        "4,0123456789abcdef0123456789abcdef,d.com,plan1,A,{}\n",
+    ]
+    broken = tmp_path / "broken.csv"
+    broken.write_text(header + rows[0] + rows[1].format("") + rows[2].format("") + rows[3].format("many"))
+    repaired = tmp_path / "repaired.csv"
+    repaired.write_text(header + rows[0] + rows[1].format("2") + rows[2].format("5") + rows[3].format("7"))
+    domains = {}
+    for name, report in (("broken", broken), ("repaired", repaired)):
+        for chunksize in (None, 2):
+            output_dir = tmp_path / f"{name}_{chunksize}"
+            output_dir.mkdir()
+            FileProcessor(str(output_dir), "input/product_type_mapping.json").process(
+                usage_report_filepath=str(report),
+                partner_ids_to_skip=[],
+                itemcount_to_usage_reduction_rules={},
+                headers=["PartnerID", "accountGuid", "domains", "plan", "PartNumber", "itemCount"],
+                chunksize=chunksize
+            )
+            domains[name, chunksize] = (output_dir / "insert_into_domains.sql").read_text()
+    assert domains["broken", None] == domains["broken", 2] == domains["repaired", None]
+    assert "d.com" in domains["broken", None]
+    violations = pd.read_csv(tmp_path / "broken_None" / "schema_violation_error_df.csv")
+    assert violations["schema_violation"].tolist() == ["PartnerID", "itemCount", "itemCount"]
+    assert "12345678" not in (tmp_path / "broken_None" / "insert_into_chargeable.sql").read_text()
+
+def test_rerun_with_database_loads_rows(tmp_mapping_file, tmp_path):
+    """Test that a re-run adding a database is not skipped as unchanged, and loads the rows."""
+    csv_path = tmp_path / "input.csv"
+    pd.DataFrame({
+        "PartnerID": [1],
+        "accountGuid": ["a1b2c3d4e5f6g7h8i9j0k1l2m3n4o5p6"],
+        "domains": ["a.com"],
+        "plan": ["plan1"],
+        "PartNumber": ["A"],
+        "itemCount": [10]
+    }).to_csv(csv_path, index=False)
+    arguments = dict(
+        usage_report_filepath=str(csv_path),
+        partner_ids_to_skip=[],
+        itemcount_to_usage_reduction_rules={},
+        headers=["PartnerID", "accountGuid", "domains", "plan", "PartNumber", "itemCount"]
+    )
+    FileProcessor(str(tmp_path), tmp_mapping_file).process(**arguments)
+    database_path = tmp_path / "test.db"
+    loader = DatabaseLoader.from_url(f"sqlite:///{database_path}")
+    FileProcessor(str(tmp_path), tmp_mapping_file, database_loader=loader).process(**arguments)
+    loader.close()
+    with sqlite3.connect(database_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM chargeable").fetchone() == (1,)
+        assert conn.execute("SELECT COUNT(*) FROM domains").fetchone() == (1,)
+
+def test_process_skips_unchanged_inputs(processor, tmp_path, monkeypatch):
+    """Test that a re-run with unchanged inputs and outputs is skipped, unless forced or inputs change."""
+    csv_path = tmp_path / "input.csv"
+    pd.DataFrame({
+        "PartnerID": [1],
+        "accountGuid": ["a1b2c3d4e5f6g7h8i9j0k1l2m3n4o5p6"],
+        "domains": ["a.com"],
+        "plan": ["plan1"],
+        "PartNumber": ["A"],
+        "itemCount": [10]
+    }).to_csv(csv_path, index=False)
+    arguments = dict(
+        usage_report_filepath=str(csv_path),
+        partner_ids_to_skip=[],
+        itemcount_to_usage_reduction_rules={},
+        headers=["PartnerID", "accountGuid", "domains", "plan", "PartNumber", "itemCount"]
+    )
+    processor.process(**arguments)
+    assert os.path.exists(os.path.join(processor.output_files_path, "run_manifest.json"))
+
+    runs = []
+    original_run = processor._run
+    monkeypatch.setattr(processor, "_run", lambda *args: runs.append(args) or original_run(*args))
+    processor.process(**arguments)
+    assert len(runs) == 0
+    processor.process(**arguments, force=True)
+    assert len(runs) == 1
+    processor.process(**{**arguments, "partner_ids_to_skip": [1]})
+    assert len(runs) == 2
+
+def test_process_writes_metrics(tmp_mapping_file, tmp_path):
+    """Test that stage metrics record rows in and out and rejections per reason, in single-shot and chunked runs."""
+    csv_path = tmp_path / "input.csv"
+    pd.DataFrame({
+        "PartnerID": [1, 2, 3, 4, 5],
+        "accountGuid": ["a1b2c3d4e5f6g7h8i9j0k1l2m3n4o5p6"] * 5,
+        "domains": ["a.com", "a.com", "b.com", "c.com", "d.com"],
+        "plan": ["plan1"] * 5,
+        "PartNumber": ["A", None, "A", "B", "Z"],
+        "itemCount": [10, 5, 0, 3, 7]
+    }).to_csv(csv_path, index=False)
+    for chunksize in [None, 2]:
+        output_dir = tmp_path / f"out_{chunksize}"
+        output_dir.mkdir()
+        prometheus_path = tmp_path / f"translator_{chunksize}.prom"
+        metrics = RunMetrics(prometheus_filepath=str(prometheus_path))
+        FileProcessor(str(output_dir), tmp_mapping_file, metrics=metrics).process(
+            usage_report_filepath=str(csv_path),
+            partner_ids_to_skip=[4],
+            itemcount_to_usage_reduction_rules={},
+            headers=["PartnerID", "accountGuid", "domains", "plan", "PartNumber", "itemCount"],
+            chunksize=chunksize
+        )
+        with open(output_dir / "metrics.json") as f:
+            report = json.load(f)
+        assert report["status"] == "ok"
+        stages = report["stages"]
+        assert stages["load_usage_report"]["rows_out"] == 5
+        assert stages["filter_chargeable_df"]["rows_in"] == 5
+        assert stages["filter_chargeable_df"]["rows_out"] == 2
+        assert stages["filter_chargeable_df"]["rejected"] == {
+            "no_partnumber": 1, "itemcount_nonpositive": 1, "partner_id_skipped": 1
+        }
+        assert stages["apply_product_mapping"]["rejected"] == {"unmapped_partnumber": 1}
+        assert stages["write_chargeable"]["rows_out"] == 1
+        assert stages["write_domains"]["rows_out"] == 4
+        assert all(stage["wall_seconds"] >= 0 and stage["process_peak_rss_bytes"] for stage in stages.values())
+        assert 'translator_stage_rows_rejected{stage="filter_chargeable_df",reason="no_partnumber"} 1' in \
+            prometheus_path.read_text()
+
+def test_process_without_metrics_writes_no_report(processor, tmp_path):
+    """Test that no metrics file is written when metrics are disabled (the default)."""
+    csv_path = tmp_path / "input.csv"
+    csv_path.write_text(
+        "PartnerID,accountGuid,domains,plan,PartNumber,itemCount\n"
+        "1,a1b2c3d4e5f6g7h8i9j0k1l2m3n4o5p6,a.com,plan1,A,10\n"
+    )
+    processor.process(
+        usage_report_filepath=str(csv_path),
+        partner_ids_to_skip=[],
+        itemcount_to_usage_reduction_rules={},
+        headers=["PartnerID", "accountGuid", "domains", "plan", "PartNumber", "itemCount"]
+    )
+    assert not os.path.exists(os.path.join(processor.output_files_path, "metrics.json"))
+
+def test_process_traces_memory_only_while_running(tmp_mapping_file, tmp_path):
+    """Test that memory tracing starts with process, not with the processor, and stops when the run fails."""
+    metrics = RunMetrics(trace_memory=True)
+    processor = FileProcessor(str(tmp_path), tmp_mapping_file, metrics=metrics)
+    assert not tracemalloc.is_tracing()
+    with pytest.raises(Exception):
+        processor.process(
+            usage_report_filepath=str(tmp_path / "missing.csv"),
+            partner_ids_to_skip=[],
+            itemcount_to_usage_reduction_rules={},
+            headers=["PartnerID", "accountGuid", "domains", "plan", "PartNumber", "itemCount"]
+        )
+    assert not tracemalloc.is_tracing()
+    with open(tmp_path / "metrics.json") as f:
+        assert json.load(f)["status"] == "failed"
+
+def test_process_in_chunks_spilling_domains_matches_single_shot(tmp_path):
+    """Test that domains deduplicated on disk under a tiny memory budget match a single-shot run."""
+    outputs = {}
+    for chunksize, budget in [(None, 1024 * 1024), (1000, 1)]:
+        output_dir = tmp_path / f"out_{chunksize}"
+        output_dir.mkdir()
+        FileProcessor(
+            str(output_dir), "input/product_type_mapping.json",
+            domains_dedup_memory_budget_bytes=budget, domains_dedup_spill_path=str(tmp_path)
+        ).process(
+            usage_report_filepath="input/sample_usage_report.csv",
+            partner_ids_to_skip=[26392],
+            itemcount_to_usage_reduction_rules={},
+            headers=["PartnerID", "accountGuid", "domains", "plan", "PartNumber", "itemCount"],
+            chunksize=chunksize
+        )
+        outputs[chunksize] = (output_dir / "insert_into_domains.sql").read_text()
+    assert outputs[1000] == outputs[None]
+    assert sorted(os.listdir(tmp_path)) == ["out_1000", "out_None"]
+
+@pytest.mark.parametrize("chunksize", [None, 1000])
+def test_process_with_output_workers_matches_sequential(tmp_path, chunksize):
+    """Test that writing outputs on a thread pool produces the same files as writing them in order."""
+    outputs = {}
+    for output_workers in (0, 4):
+        output_dir = tmp_path / f"out_{output_workers}"
+        output_dir.mkdir()
+        FileProcessor(str(output_dir), "input/product_type_mapping.json", output_workers=output_workers).process(
+            usage_report_filepath="input/sample_usage_report.csv",
+            partner_ids_to_skip=[26392],
+            itemcount_to_usage_reduction_rules={"EA000001GB0O": 1000},
+            headers=["PartnerID", "accountGuid", "domains", "plan", "PartNumber", "itemCount"],
+            chunksize=chunksize
+        )
+        outputs[output_workers] = {
+            name: (output_dir / name).read_text() for name in sorted(os.listdir(output_dir)) if name != "run_manifest.json"
+        }
+    assert outputs[4] == outputs[0]
+
+@pytest.mark.parametrize("chunksize", [None, 2])
+def test_process_with_output_workers_raises_write_errors(tmp_mapping_file, tmp_path, chunksize):
+    """Test that a failing write is raised from process, as in a sequential run."""
+    csv_path = tmp_path / "input.csv"
+    csv_path.write_text(
+        "PartnerID,accountGuid,domains,plan,PartNumber,itemCount\n"
+        "1,a1b2c3d4e5f6g7h8i9j0k1l2m3n4o5p6,a.com,plan1,A,10\n"
+    )
+    processor = FileProcessor(str(tmp_path), tmp_mapping_file, output_workers=2)
+
+    def fail(*args, **kwargs):
+        raise OSError("disk full")
+    processor._write_error_log = fail
+    with pytest.raises(OSError, match="disk full"):
+        processor.process(
+            usage_report_filepath=str(csv_path),
+            partner_ids_to_skip=[],
+            itemcount_to_usage_reduction_rules={},
+            headers=["PartnerID", "accountGuid", "domains", "plan", "PartNumber", "itemCount"],
+            chunksize=chunksize
+        )
+
+def test_output_workers_default_to_a_writer_thread_when_compressing(tmp_mapping_file, tmp_path):
+    """Test that compressed outputs get one writer thread unless a number of workers is given."""
+    assert FileProcessor(str(tmp_path), tmp_mapping_file).output_workers == 0
+    compression = OutputCompression("gzip")
+    assert FileProcessor(str(tmp_path), tmp_mapping_file, output_compression=compression).output_workers == 1
+    processor = FileProcessor(str(tmp_path), tmp_mapping_file, output_workers=0, output_compression=compression)
+    assert processor.output_workers == 0
+
+def test_invalid_output_workers(tmp_mapping_file, tmp_path):
+    """Test error for a negative number of output workers."""
+    with pytest.raises(ValueError):
+        FileProcessor(str(tmp_path), tmp_mapping_file, output_workers=-1)
+
+@pytest.mark.parametrize("chunksize", [None, 1000])
+def test_process_compressed_matches_plain(tmp_path, chunksize):
+    """Test that compressed outputs, from a compressed report, decompress to the plain outputs."""
+    compressed_report = tmp_path / "report.csv.gz"
+    with open("input/sample_usage_report.csv", "rb") as plain, gzip.open(compressed_report, "wb") as compressed:
+        compressed.write(plain.read())
+    outputs = {}
+    for usage_report_filepath, compression in (
+        ("input/sample_usage_report.csv", OutputCompression()),
+        (str(compressed_report), OutputCompression("xz", 1)),
+    ):
+        output_dir = tmp_path / f"out_{compression.method}"
+        output_dir.mkdir()
+        FileProcessor(
+            str(output_dir), "input/product_type_mapping.json", output_workers=2, output_compression=compression
+        ).process(
+            usage_report_filepath=usage_report_filepath,
+            partner_ids_to_skip=[26392],
+            itemcount_to_usage_reduction_rules={"EA000001GB0O": 1000},
+            headers=["PartnerID", "accountGuid", "domains", "plan", "PartNumber", "itemCount"],
+            chunksize=chunksize
+        )
+        outputs[compression.method] = {
+            name.replace(".xz", ""): (lzma.open if name.endswith(".xz") else open)(output_dir / name, "rt").read()
+            for name in sorted(os.listdir(output_dir)) if name not in ("run_manifest.json", "metrics.json")
+        }
+    assert "insert_into_chargeable.sql" in outputs["xz"]
+    assert outputs["xz"] == outputs["none"]
+
+def _load_sql_files(filepaths):
+    connection = sqlite3.connect(":memory:")
+    connection.executescript(
+        'CREATE TABLE chargeable ("partnerID" INT, "product" TEXT, "partnerPurchasedPlanID" TEXT, "plan" TEXT, "usage" INT);'
+        'CREATE TABLE domains ("partnerPurchasedPlanID" TEXT, "domain" TEXT);'
+    )
+    for filepath in filepaths:
+        connection.executescript(open(filepath).read())
+    return {table: sorted(connection.execute(f"SELECT * FROM {table}").fetchall()) for table in ("chargeable", "domains")}
+
+@pytest.mark.parametrize("chunksize", [None, 1000])
+def test_process_sharded_sql_loads_same_rows(tmp_path, chunksize):
+    """Test that sharded INSERT files in transaction batches load the same rows as the default files."""
+    kwargs = dict(
+        partner_ids_to_skip=[26392],
+        itemcount_to_usage_reduction_rules={"EA000001GB0O": 1000},
+        headers=["PartnerID", "accountGuid", "domains", "plan", "PartNumber", "itemCount"],
+        chunksize=chunksize
+    )
+    plain_dir, sharded_dir = tmp_path / "plain", tmp_path / "sharded"
+    plain_dir.mkdir()
+    sharded_dir.mkdir()
+    FileProcessor(str(plain_dir), "input/product_type_mapping.json").process("input/sample_usage_report.csv", **kwargs)
+    processor = FileProcessor(
+        str(sharded_dir), "input/product_type_mapping.json", output_workers=2,
+        sql_layout=SQLLayout(statement_rows=50, transaction_statements=4, shards=3)
+    )
+    processor.process("input/sample_usage_report.csv", **kwargs)
+    manifest = json.loads((sharded_dir / "sql_shards.json").read_text())
+    expected = _load_sql_files([plain_dir / "insert_into_chargeable.sql", plain_dir / "insert_into_domains.sql"])
+    shard_files = [sharded_dir / shard["file"] for table in manifest["tables"].values() for shard in table["shards"]]
+    assert _load_sql_files(shard_files) == expected
+    assert manifest["tables"]["chargeable"]["rows"] == len(expected["chargeable"])
+    assert manifest["tables"]["domains"]["rows"] == len(expected["domains"])
+    assert set(processor._output_filenames()) <= set(os.listdir(sharded_dir))
+
+def test_sql_layout_requires_sql_output_format(tmp_mapping_file, tmp_path):
+    """Test error for an SQL layout with a COPY output format."""
+    with pytest.raises(ValueError):
+        FileProcessor(str(tmp_path), tmp_mapping_file, output_format="copy_csv", sql_layout=SQLLayout(shards=2))
+
+def test_process_delta_applies_to_previous_load(tmp_path):
+    """Test that the deltas of successive runs, applied in order, load the same rows as a full run."""
+    kwargs = dict(
+        partner_ids_to_skip=[26392],
+        itemcount_to_usage_reduction_rules={"EA000001GB0O": 1000},
+        headers=["PartnerID", "accountGuid", "domains", "plan", "PartNumber", "itemCount"]
+    )
+    lines = open("input/sample_usage_report.csv").read().splitlines(True)
+    next_report = tmp_path / "next_report.csv"
+    next_report.write_text("".join(lines[:1] + [line for i, line in enumerate(lines[1:]) if i % 40]))
+    delta_dir, full_dir = tmp_path / "delta", tmp_path / "full"
+    delta_dir.mkdir()
+    full_dir.mkdir()
+    delta_files = []
+    for index, usage_report_filepath in enumerate(["input/sample_usage_report.csv", str(next_report)]):
+        FileProcessor(
+            str(delta_dir), "input/product_type_mapping.json", delta_snapshot_path=str(tmp_path / "snapshot")
+        ).process(usage_report_filepath, chunksize=1000 if index else None, **kwargs)
+        for table in ("chargeable", "domains"):
+            delta_files.append(tmp_path / f"delta_{table}_{index}.sql")
+            os.replace(delta_dir / f"delta_{table}.sql", delta_files[-1])
+    FileProcessor(str(full_dir), "input/product_type_mapping.json").process(str(next_report), **kwargs)
+    expected = _load_sql_files([full_dir / "insert_into_chargeable.sql", full_dir / "insert_into_domains.sql"])
+    assert _load_sql_files(delta_files) == expected
+    assert os.path.getsize(delta_files[2]) < os.path.getsize(delta_files[0]) / 5
+
+def test_delta_requires_plain_sql_output(tmp_mapping_file, tmp_path):
+    """Test error for delta mode with a COPY output format or an SQL layout."""
+    with pytest.raises(ValueError):
+        FileProcessor(str(tmp_path), tmp_mapping_file, output_format="copy_text", delta_snapshot_path=str(tmp_path))
+    with pytest.raises(ValueError):
+        FileProcessor(str(tmp_path), tmp_mapping_file, sql_layout=SQLLayout(shards=2), delta_snapshot_path=str(tmp_path))
+
+@pytest.mark.parametrize("rounding_point", ["row", "sum"])
+def test_process_consolidated_chargeable(tmp_path, rounding_point):
+    """Test that consolidated runs merge repeated rows and give the same outputs chunked or not."""
+    lines = open("input/sample_usage_report.csv").read().splitlines(True)
+    report = tmp_path / "report.csv"
+    report.write_text("".join(lines + lines[1:]))
+    outputs = {}
+    for chunksize in (None, 1000):
+        output_dir = tmp_path / f"out_{chunksize}"
+        output_dir.mkdir()
+        FileProcessor(
+            str(output_dir), "input/product_type_mapping.json",
+            consolidate_chargeable=True, consolidation_rounding_point=rounding_point
+        ).process(
+            usage_report_filepath=str(report),
+            partner_ids_to_skip=[26392],
+            itemcount_to_usage_reduction_rules={"EA000001GB0O": 1000},
+            headers=["PartnerID", "accountGuid", "domains", "plan", "PartNumber", "itemCount"],
+            chunksize=chunksize
+        )
+        outputs[chunksize] = {
+            name: (output_dir / name).read_text()
+            for name in ("insert_into_chargeable.sql", "totals_by_product.csv", "totals_by_partner.csv")
+        }
+    assert outputs[None] == outputs[1000]
+    rows = outputs[None]["insert_into_chargeable.sql"].count("\n(")
+    assert 0 < rows <= len(lines) // 2
+
+def test_invalid_consolidation_rounding_point(tmp_mapping_file, tmp_path):
+    """Test error for an unknown consolidation rounding point."""
+    with pytest.raises(ValueError):
+        FileProcessor(str(tmp_path), tmp_mapping_file, consolidate_chargeable=True, consolidation_rounding_point="chunk")
+
+def test_process_validated_report(tmp_path):
+    """Test that rows violating the validation rules, including undecodable bytes, are logged the same way chunked or not."""
+    lines = open("input/sample_usage_report.csv", "rb").read().splitlines(True)
+    bad_lines = [
+        b"26393,g,1,799ef0ab-4438-4157-8afc-f6fc4dfe9253,u,bad domain.com,i,plan,0,EA000001GB0O,3\n",
+        b"26393,g,1,799ef0ab-4438-4157-8afc-f6fc4dfe9253,u,caf\xe9.com,i,plan,0,EA000001GB0O,3\n",
+        b"99999999999,g,1,799ef0ab-4438-4157-8afc-f6fc4dfe9253,u,ok.com,i,plan,0,EA000001GB0O,3\n",
+    ]
+    report = tmp_path / "report.csv"
+    report.write_bytes(b"".join(lines[:500] + bad_lines + lines[500:]))
+    outputs = {}
+    for chunksize in (None, 1000):
+        output_dir = tmp_path / f"out_{chunksize}"
+        output_dir.mkdir()
+        FileProcessor(
+            str(output_dir), "input/product_type_mapping.json", validation_rules=ValidationRules(DEFAULT_VALIDATION_RULES)
+        ).process(
+            usage_report_filepath=str(report),
+            partner_ids_to_skip=[26392],
+            itemcount_to_usage_reduction_rules={"EA000001GB0O": 1000},
+            headers=["PartnerID", "accountGuid", "domains", "plan", "PartNumber", "itemCount"],
+            chunksize=chunksize
+        )
+        outputs[chunksize] = {
+            name: (output_dir / name).read_text(encoding="utf-8")
+            for name in ("insert_into_chargeable.sql", "validation_error_df.csv", "validation_summary.csv")
+        }
+    assert outputs[None] == outputs[1000]
+    error_df = pd.read_csv(tmp_path / "out_None" / "validation_error_df.csv")
+    assert list(error_df["validation_violation"]) == [
+        "domains:allowed_characters", "domains:allowed_characters;domains:encoding", "PartnerID:max"
+    ]
+    summary_df = pd.read_csv(tmp_path / "out_None" / "validation_summary.csv")
+    assert summary_df["violations"].sum() == 4
+    assert "26393" not in outputs[None]["insert_into_chargeable.sql"]
+
+def test_validation_rejects_large_report(tmp_path):
+    """Test that a report over the validation size limit fails before anything is processed."""
+    rules = ValidationRules({"file": {"max_bytes": 1000}})
+    with pytest.raises(ValueError):
+        FileProcessor(str(tmp_path), "input/product_type_mapping.json", validation_rules=rules).process(
+            usage_report_filepath="input/sample_usage_report.csv",
+            partner_ids_to_skip=[26392],
+            itemcount_to_usage_reduction_rules={},
+            headers=["PartnerID", "accountGuid", "domains", "plan", "PartNumber", "itemCount"]
+        )
+    assert not (tmp_path / "insert_into_chargeable.sql").exists()
+
+def test_capped_error_logs(tmp_path):
+    """Test that capped error logs, their samples and counts are the same chunked or not, and account for every row."""
+    names = ("no_partnumber_error_df.csv", "no_partnumber_error_df_sample.csv", "itemcount_nonpositive_error_df.csv",
+             "error_counts.csv", "insert_into_chargeable.sql")
+    outputs = {}
+    for chunksize in (None, 1000):
+        output_dir = tmp_path / f"out_{chunksize}"
+        output_dir.mkdir()
+        FileProcessor(
+            str(output_dir), "input/product_type_mapping.json", error_log_max_rows=100, error_log_sample_rows=50
+        ).process(
+            usage_report_filepath="input/sample_usage_report.csv",
+            partner_ids_to_skip=[],
+            itemcount_to_usage_reduction_rules={"EA000001GB0O": 1000},
+            headers=["PartnerID", "accountGuid", "domains", "plan", "PartNumber", "itemCount"],
+            chunksize=chunksize
+        )
+        outputs[chunksize] = {name: (output_dir / name).read_text(encoding="utf-8") for name in names}
+    assert outputs[None] == outputs[1000]
+    output_dir = tmp_path / "out_None"
+    assert len(pd.read_csv(output_dir / "no_partnumber_error_df.csv")) == 100
+    assert len(pd.read_csv(output_dir / "no_partnumber_error_df_sample.csv")) == 50
+    counts_df = pd.read_csv(output_dir / "error_counts.csv", dtype={"PartnerID": str})
+    assert counts_df.groupby("reason")["rows"].sum()["no_partnumber"] > 100
+    itemcount_df = pd.read_csv(output_dir / "itemcount_nonpositive_error_df.csv")
+    assert counts_df.groupby("reason")["rows"].sum()["itemcount_nonpositive"] == len(itemcount_df)
@@ -0,0 +1,81 @@
+"""
+Tests for the product_mapping module.
+
+This file covers:
+- Exact keys, prefix rules and glob patterns in the typemap.
+- Priority of exact keys over patterns and of longer prefixes over shorter ones.
+- Resolving each distinct PartNumber once, for object and categorical columns.
+- Mapping a typemap with patterns through apply_product_mapping.
+- Error handling for invalid typemaps.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from app.domain.df_functions import apply_product_mapping
+from app.domain.product_mapping import ProductMapping, compile_product_mapping
+
+def test_resolve_exact_and_patterns():
+    """Test that exact keys, prefixes and glob patterns resolve to their products."""
+    mapping = ProductMapping({"EA000001GB0O": "Exact", "SSX*": "Prefix", "PMQ??005GB0R": "Glob"})
+    assert mapping.resolve("EA000001GB0O") == "Exact"
+    assert mapping.resolve("SSX006NR") == "Prefix"
+    assert mapping.resolve("SSX") == "Prefix"
+    assert mapping.resolve("PMQ00005GB0R") == "Glob"
+    assert mapping.resolve("PMQ000005GB0R") is None
+    assert mapping.resolve("XYZ") is None
+    assert mapping.resolve(None) is None
+
+def test_resolve_priority():
+    """Test that exact keys win over patterns, and the longest prefix over shorter ones and globs."""
+    mapping = ProductMapping({"SS*": "Short", "SSX*": "Long", "SSX006NR": "Exact", "S*X*": "Glob"})
+    assert mapping.resolve("SSX006NR") == "Exact"
+    assert mapping.resolve("SSX007NR") == "Long"
+    assert mapping.resolve("SSA") == "Short"
+    assert mapping.resolve("SAX") == "Glob"
+
+def test_products_resolves_each_distinct_partnumber_once(monkeypatch):
+    """Test that patterns are matched once per distinct PartNumber and broadcast to every row."""
+    mapping = ProductMapping({"A*": "ProductA", "B1": "ProductB"})
+    calls = []
+    match_pattern = mapping._match_pattern
+    monkeypatch.setattr(mapping, "_match_pattern", lambda part_number: calls.append(part_number) or match_pattern(part_number))
+    part_numbers = pd.Series(["A1", "B1", "A1", "C1", None, "A2"] * 100)
+    products = mapping.products(part_numbers)
+    assert list(products[:6].fillna("-")) == ["ProductA", "ProductB", "ProductA", "-", "-", "ProductA"]
+    assert sorted(calls) == ["A1", "A2", "C1"]
+    mapping.products(part_numbers)
+    assert sorted(calls) == ["A1", "A2", "C1"]
+
+def test_products_categorical():
+    """Test that categorical PartNumbers are resolved per category."""
+    mapping = ProductMapping({"A*": "ProductA"})
+    products = mapping.products(pd.Series(["A1", "B1", "A2"], dtype="category"))
+    assert products.iloc[0] == "ProductA"
+    assert pd.isna(products.iloc[1])
+    assert products.iloc[2] == "ProductA"
+
+def test_products_exact_only_matches_dictionary_map():
+    """Test that a typemap without patterns maps like a plain dictionary."""
+    rules = {"A": "ProductA", "B": "ProductB"}
+    part_numbers = pd.Series(["A", "C", "B", np.nan])
+    pd.testing.assert_series_equal(ProductMapping(rules).products(part_numbers), part_numbers.map(rules))
+
+def test_apply_product_mapping_with_patterns():
+    """Test that apply_product_mapping drops the PartNumbers no key or pattern matches."""
+    df = pd.DataFrame({"PartNumber": ["SSX006NR", "SSX012NR", "EA000001GB0O", "ZZZ"]})
+    result = apply_product_mapping(df, {"SSX*": "Storage", "EA000001GB0O": "Email"})
+    assert list(result["product"]) == ["Storage", "Storage", "Email"]
+
+def test_invalid_typemap():
+    """Test that a typemap that is not a dictionary or has non-string products raises ValueError."""
+    with pytest.raises(ValueError):
+        ProductMapping(["A"])
+    with pytest.raises(ValueError):
+        ProductMapping({"A*": 1})
+
+def test_compile_product_mapping_passthrough():
+    """Test that compiled typemaps are returned as-is."""
+    mapping = ProductMapping({"A": "ProductA"})
+    assert compile_product_mapping(mapping) is mapping
+    assert compile_product_mapping({"A": "ProductA"}).rules == {"A": "ProductA"}
@@ -0,0 +1,69 @@
+"""
+Tests for the schema module.
+
+This file covers:
+- Read dtypes for the declared usage report schema.
+- Casting integer columns read as int, float or text to nullable Int64, in place, and text columns to categoricals.
+- Reporting non-integer and missing required values as schema violation rows, keeping the rows in the typed frame.
+"""
+
+import numpy as np
+import pandas as pd
+from app.domain.schema import apply_usage_report_schema, usage_report_read_dtypes
+
+def test_usage_report_read_dtypes():
+    """Test that integer columns are left to the parser and categoricals are read as category."""
+    dtypes = usage_report_read_dtypes(["PartnerID", "accountGuid", "PartNumber", "itemCount"])
+    assert dtypes == {"PartNumber": "category"}
+
+def test_apply_usage_report_schema_parsed_csv(tmp_path):
+    """Test integers parsed as numbers, as floats next to a missing value, or as text next to an invalid one."""
+    filepath = tmp_path / "report.csv"
+    filepath.write_text("PartnerID,itemCount,domains\n1,10,a.com\n2,,b.com\nx,9007199254740993,c.com\n")
+    df = pd.read_csv(filepath, dtype=usage_report_read_dtypes(["PartnerID", "itemCount", "domains"]))
+    assert (df["PartnerID"].dtype, df["itemCount"].dtype) == (object, "float64")
+    typed, violations = apply_usage_report_schema(df)
+    assert typed is df
+    assert typed["PartnerID"].tolist() == [1, 2, pd.NA]
+    assert typed["itemCount"].tolist() == [10, pd.NA, pd.NA]
+    assert violations["schema_violation"].tolist() == ["itemCount", "PartnerID;itemCount"]
+    violations.to_csv(tmp_path / "violations.csv", index=False)
+    assert (tmp_path / "violations.csv").read_text().splitlines()[1] == "2,,b.com,itemCount"
+
+def test_apply_usage_report_schema_casts_columns():
+    """Test that valid values are cast to the declared dtypes."""
+    df = pd.DataFrame({
+        "PartnerID": ["1", "2"],
+        "itemCount": ["10", "3.0"],
+        "PartNumber": ["A", None],
+        "plan": ["p1", "p1"],
+        "domains": ["a.com", "b.com"]
+    })
+    typed, violations = apply_usage_report_schema(df)
+    assert violations.empty
+    assert typed["PartnerID"].dtype == "Int64"
+    assert typed["itemCount"].tolist() == [10, 3]
+    assert isinstance(typed["PartNumber"].dtype, pd.CategoricalDtype)
+    assert isinstance(typed["plan"].dtype, pd.CategoricalDtype)
+    assert typed["domains"].dtype == object
+
+def test_apply_usage_report_schema_reports_violations():
+    """Test that invalid or missing integers are reported with the offending columns and left missing in the typed frame."""
+    df = pd.DataFrame({
+        "PartnerID": ["1", "x", None, "4"],
+        "itemCount": ["10", "2.5", "3", np.nan],
+        "PartNumber": ["A", "B", "C", "D"]
+    })
+    typed, violations = apply_usage_report_schema(df)
+    assert typed["PartnerID"].tolist() == [1, pd.NA, pd.NA, 4]
+    assert typed["itemCount"].tolist() == [10, pd.NA, 3, pd.NA]
+    assert list(violations.index) == [1, 2, 3]
+    assert violations["PartnerID"].tolist() == ["x", None, "4"]
+    assert violations["schema_violation"].tolist() == ["PartnerID;itemCount", "PartnerID", "itemCount"]
+
+def test_apply_usage_report_schema_integer_input():
+    """Test that already-typed integer columns are accepted."""
+    df = pd.DataFrame({"PartnerID": [1, 2], "itemCount": [3.0, 4.0]})
+    typed, violations = apply_usage_report_schema(df)
+    assert violations.empty
+    assert typed["itemCount"].dtype == "Int64"
@@ -5,11 +5,16 @@ This file covers:
 - Generating SQL insert statements for the chargeable table.
 - Generating SQL insert statements for the domains table.
 - Verifying that the output SQL files are created and contain the expected content.
+- Streaming rows to the SQL files in batches and fixed-size blocks.
+- Bounded INSERT statements, transaction batches and shard files with their manifest.
+- Leaving no SQL file behind when writing fails.
 """
 
 import os
+import json
 import pandas as pd
-from app.services.sql_generator import SQLGenerator
+import pytest
+from app.services.sql_generator import SQLGenerator, SQLLayout, SQLStatementWriter, ShardedSQLGenerator
 
 def test_write_chargeable_sql(tmp_path):
     """Test that the chargeable SQL file is created and contains expected content."""
@@ -42,4 +47,118 @@ def test_write_domains_sql(tmp_path):
     content = output_file.read_text()
     assert "INSERT INTO domains" in content
     assert '"partnerPurchasedPlanID"' in content
-    assert "(\'idA\', \'a.com\')" in content or "(\"idA\", \"a.com\")" in content
\ No newline at end of file
+    assert "(\'idA\', \'a.com\')" in content or "(\"idA\", \"a.com\")" in content
+
+def test_sql_statement_writer_batches_match_single_write(tmp_path):
+    """Test that writing rows in several batches produces the same file as one write."""
+    df = pd.DataFrame({
+        "partnerPurchasedPlanID": ["idA", "idB", "idC"],
+        "domains": ["a.com", "b.com", "c.com"]
+    })
+    SQLGenerator.write_domains_sql(df, str(tmp_path))
+    expected = (tmp_path / "insert_into_domains.sql").read_text()
+    with SQLGenerator.domains_writer(str(tmp_path)) as writer:
+        writer.write_rows(SQLGenerator.domains_rows(df.iloc[:1]))
+        writer.write_rows([])
+        writer.write_rows(SQLGenerator.domains_rows(df.iloc[1:]))
+    assert (tmp_path / "insert_into_domains.sql").read_text() == expected
+
+def test_write_chargeable_sql_block_size_does_not_change_output(tmp_path):
+    """Test that streaming in small blocks produces byte-identical SQL."""
+    df = pd.DataFrame({
+        "PartnerID": [1, 2, 3],
+        "product": ["prodA", "prod'B", "prodC"],
+        "partnerPurchasedPlanID": ["idA", "idB", "idC"],
+        "plan": ["planA", "planB", "planC"],
+        "usage": [10.9, 20, 30]
+    })
+    SQLGenerator.write_chargeable_sql(df, str(tmp_path))
+    expected = (tmp_path / "insert_into_chargeable.sql").read_text()
+    SQLGenerator.write_chargeable_sql(df, str(tmp_path), block_size=2)
+    content = (tmp_path / "insert_into_chargeable.sql").read_text()
+    assert content == expected
+    assert content == (
+        'INSERT INTO chargeable ("partnerID", "product", "partnerPurchasedPlanID", "plan", "usage") VALUES\n'
+        "(1, 'prodA', 'idA', 'planA', 10),\n"
+        "(2, 'prod''B', 'idB', 'planB', 20),\n"
+        "(3, 'prodC', 'idC', 'planC', 30)\n"
+        ";\n"
+    )
+
+def test_write_domains_sql_empty(tmp_path):
+    """Test the statement written when there are no rows."""
+    df = pd.DataFrame({"partnerPurchasedPlanID": [], "domains": []})
+    SQLGenerator.write_domains_sql(df, str(tmp_path))
+    content = (tmp_path / "insert_into_domains.sql").read_text()
+    assert content == 'INSERT INTO domains ("partnerPurchasedPlanID", "domain") VALUES\n\n;\n'
+
+def test_sql_statement_writer_statement_rows_and_transactions(tmp_path):
+    """Test that rows are split into statements of N rows, wrapped in transaction batches."""
+    filepath = tmp_path / "insert_into_t.sql"
+    with SQLStatementWriter(str(filepath), "t", ["a"], statement_rows=2, transaction_statements=2) as writer:
+        writer.write_rows(["(1)"])
+        writer.write_rows(["(2)", "(3)", "(4)", "(5)"])
+    assert (writer.rows, writer.statements) == (5, 3)
+    assert filepath.read_text() == (
+        'BEGIN;\nINSERT INTO t ("a") VALUES\n(1),\n(2)\n;\n'
+        'INSERT INTO t ("a") VALUES\n(3),\n(4)\n;\nCOMMIT;\n'
+        'BEGIN;\nINSERT INTO t ("a") VALUES\n(5)\n;\nCOMMIT;\n'
+    )
+
+def test_sql_writers_leave_no_file_when_writing_fails(tmp_path):
+    """Test that a failure while writing leaves no partial SQL file, sharded or not, and no manifest."""
+    with pytest.raises(RuntimeError):
+        with SQLStatementWriter(str(tmp_path / "insert_into_t.sql"), "t", ["a"]) as writer:
+            writer.write_rows(["(1)", "(2)"])
+            raise RuntimeError("failed mid-run")
+    generator = ShardedSQLGenerator(SQLLayout(shards=2))
+    with pytest.raises(RuntimeError):
+        with generator.domains_writer(str(tmp_path)) as sharded_writer:
+            sharded_writer.write_rows(["('id1', 'a.com')", "('id2', 'b.com')"], pd.Series([0, 1]).to_numpy())
+            raise RuntimeError("failed mid-run")
+    assert os.listdir(tmp_path) == []
+
+def test_sharded_sql_generator_writes_shards_and_manifest(tmp_path):
+    """Test that each PartnerID lands in one shard, rows keep their order and the manifest counts them."""
+    df = pd.DataFrame({
+        "PartnerID": [1, 2, 3, 1, 2, 3, 4],
+        "product": ["p"] * 7,
+        "partnerPurchasedPlanID": [f"id{i}" for i in range(7)],
+        "plan": ["plan"] * 7,
+        "usage": list(range(7))
+    })
+    generator = ShardedSQLGenerator(SQLLayout(statement_rows=2, shards=3))
+    with generator.chargeable_writer(str(tmp_path)) as writer:
+        generator.write_chargeable_rows(writer, df.iloc[:4])
+        generator.write_chargeable_rows(writer, df.iloc[4:])
+    manifest = json.loads((tmp_path / "sql_shards.json").read_text())
+    shards = manifest["tables"]["chargeable"]["shards"]
+    assert [shard["file"] for shard in shards] == generator.shard_filenames("insert_into_chargeable.sql")
+    assert manifest["tables"]["chargeable"]["rows"] == 7
+    assert sorted(generator.output_filenames())[-1] == "sql_shards.json"
+    seen = []
+    for shard in shards:
+        content = (tmp_path / shard["file"]).read_text()
+        rows = [line.rstrip(",") for line in content.splitlines() if line.startswith("(")]
+        assert len(rows) == shard["rows"]
+        assert content.count("INSERT INTO") == shard["statements"]
+        partner_ids = {row[1:].split(",")[0] for row in rows}
+        usages = [int(row.rsplit(", ", 1)[1].rstrip(")")) for row in rows]
+        assert usages == sorted(usages)
+        seen.append(partner_ids)
+    assert sum(len(ids) for ids in seen) == len(set().union(*seen)) == 4
+
+def test_sql_layout_shards_are_stable():
+    """Test that a shard key value always maps to the same shard, whatever its dtype."""
+    layout = SQLLayout(shards=8)
+    as_int = layout.shard_of(pd.Series([1, 22, 333]))
+    as_category = layout.shard_of(pd.Series([1, 22, 333], dtype="category"))
+    assert list(as_int) == list(as_category)
+    assert list(as_int) == list(layout.shard_of(pd.Series([333, 22, 1])))[::-1]
+    assert not SQLLayout().enabled and SQLLayout(statement_rows=10).enabled
+
+@pytest.mark.parametrize("kwargs", [{"statement_rows": 0}, {"transaction_statements": -1}, {"shards": 0}, {"shard_key": "plan"}])
+def test_invalid_sql_layout(kwargs):
+    """Test that invalid layouts raise ValueError."""
+    with pytest.raises(ValueError):
+        SQLLayout(**kwargs)
@@ -3,12 +3,23 @@ Tests for the strings utility functions.
 
 This file covers:
 - Escaping values for safe SQL inclusion.
-- Normalizing alphanumeric strings.
+- Escaping whole columns with the same output as per-value escaping.
+- Escaping whole columns for the PostgreSQL COPY text and csv formats.
+- Normalizing alphanumeric strings, per value and per column.
 - Error handling for invalid normalization length.
 """
 
+import numpy as np
+import pandas as pd
 import pytest
-from app.utils.strings import escape_sql_value, normalize_alphanumeric_string
+from app.utils.strings import (
+    escape_sql_value,
+    escape_sql_column,
+    escape_copy_text_column,
+    escape_copy_csv_column,
+    normalize_alphanumeric_string,
+    normalize_alphanumeric_column,
+)
 
 def test_escape_sql_value_none():
     """Test escaping None returns SQL NULL."""
@@ -28,6 +39,35 @@ def test_escape_sql_value_empty_string():
     """Test escaping an empty string."""
     assert escape_sql_value("") == "''"
 
+@pytest.mark.parametrize("values", [
+    pd.Series(["O'Reilly", "simple", ""]),
+    pd.Series([1, 2, 3]),
+    pd.Series([1.5, np.nan]),
+    pd.Series(["a", None, np.nan, 5], dtype=object),
+    pd.Series(["x'y", "z", None, "x'y"], dtype="category"),
+])
+def test_escape_sql_column_matches_escape_sql_value(values):
+    """Test columnar escaping produces the same text as escaping each value."""
+    expected = [escape_sql_value(value) for value in values.tolist()]
+    assert escape_sql_column(values).tolist() == expected
+
+def test_escape_copy_text_column():
+    """Test COPY text escaping of NULLs, tabs, newlines and backslashes."""
+    values = pd.Series(["a\tb", "c\nd\r", "e\\f", None, ""], dtype=object)
+    assert escape_copy_text_column(values).tolist() == ["a\\tb", "c\\nd\\r", "e\\\\f", "\\N", ""]
+
+def test_escape_copy_csv_column():
+    """Test COPY csv quoting of NULLs, empty strings, separators and quotes."""
+    values = pd.Series(['plain', 'a,b', 'say "hi"', None, "", "\\."], dtype=object)
+    assert escape_copy_csv_column(values).tolist() == ["plain", '"a,b"', '"say ""hi"""', "", '""', '"\\."']
+
+def test_escape_copy_columns_numeric_and_categorical():
+    """Test COPY escaping of numeric and categorical columns."""
+    assert escape_copy_text_column(pd.Series([1.5, np.nan])).tolist() == ["1.5", "\\N"]
+    categories = pd.Series(["a\tb", None, "a\tb"], dtype="category")
+    assert escape_copy_text_column(categories).tolist() == ["a\\tb", "\\N", "a\\tb"]
+    assert escape_copy_csv_column(categories).tolist() == ["a\tb", "", "a\tb"]
+
 def test_normalize_alphanumeric_string_basic():
     """Test normalization removes non-alphanumeric characters."""
     assert normalize_alphanumeric_string("a-b_c.1") == "abc1"
@@ -48,4 +88,10 @@ def test_normalize_alphanumeric_string_empty():
 
 def test_normalize_alphanumeric_string_only_specials():
     """Test normalization of a string with only special characters returns empty string."""
-    assert normalize_alphanumeric_string("!@#$%^&*()") == ""
\ No newline at end of file
+    assert normalize_alphanumeric_string("!@#$%^&*()") == ""
+
+def test_normalize_alphanumeric_column_matches_per_value():
+    """Test columnar normalization produces the same strings as per-value normalization."""
+    values = pd.Series(["a-b_c.1", "A!@#B$%^C123", "", "ção-1", np.nan, "a-b_c.1"], dtype=object)
+    expected = [normalize_alphanumeric_string(value) for value in values.tolist()]
+    assert normalize_alphanumeric_column(values).tolist() == expected
@@ -0,0 +1,79 @@
+"""
+Tests for the TotalsAggregator class from the totals module.
+
+This file covers:
+- Totals of itemCount and usage per product, PartnerID and plan.
+- Writing totals_by_product.csv unchanged and the usage per product to its own file.
+- Chunk-by-chunk updates matching a single update, including categorical columns.
+- Merging aggregators and reading back written totals files.
+- Error when required columns are missing.
+"""
+
+import os
+import pandas as pd
+import pytest
+from app.services.totals import TotalsAggregator
+
+@pytest.fixture
+def chargeable_df():
+    """Chargeable rows with categorical product and plan, as produced by the schema."""
+    return pd.DataFrame({
+        "PartnerID": pd.array([2, 1, 2, 1, 3], dtype="Int64"),
+        "product": pd.Categorical(["B", "A", "A", "C", "B"]),
+        "plan": pd.Categorical(["p2", "p1", "p1", "p1", "p2"]),
+        "itemCount": pd.array([10, 20, 30, 40, 5000], dtype="Int64"),
+        "usage": [10, 20, 30, 40, 5],
+    })
+
+def test_totals_per_dimension(chargeable_df):
+    """Test the totals of both measures for every dimension, sorted by key."""
+    totals = TotalsAggregator().update(chargeable_df)
+    assert totals.totals("product").to_dict("index") == {
+        "A": {"itemCount": 50, "usage": 50},
+        "B": {"itemCount": 5010, "usage": 15},
+        "C": {"itemCount": 40, "usage": 40},
+    }
+    assert totals.totals("partner").to_dict("index")[3] == {"itemCount": 5000, "usage": 5}
+    assert list(totals.totals("partner").index) == [1, 2, 3]
+    assert totals.totals("plan")["usage"].to_dict() == {"p1": 90, "p2": 15}
+
+def test_totals_in_chunks_match_single_update(chargeable_df):
+    """Test that updating chunk by chunk gives the same totals as one update."""
+    single = TotalsAggregator().update(chargeable_df)
+    chunked = TotalsAggregator()
+    for start in range(0, len(chargeable_df), 2):
+        chunk = chargeable_df.iloc[start:start + 2].copy()
+        chunk["product"] = chunk["product"].cat.remove_unused_categories()
+        chunked.update(chunk)
+    chunked.update(chargeable_df.iloc[0:0])
+    for name in ["product", "partner", "plan"]:
+        pd.testing.assert_frame_equal(chunked.totals(name), single.totals(name), check_dtype=False, check_index_type=False)
+
+def test_merge_and_read(chargeable_df, tmp_path):
+    """Test merging totals written by separate runs."""
+    first_dir, second_dir = tmp_path / "first", tmp_path / "second"
+    first_dir.mkdir()
+    second_dir.mkdir()
+    TotalsAggregator().update(chargeable_df.iloc[:3]).write(str(first_dir))
+    TotalsAggregator().update(chargeable_df.iloc[3:]).write(str(second_dir))
+    merged = TotalsAggregator.read(str(first_dir)).merge(TotalsAggregator.read(str(second_dir)))
+    single = TotalsAggregator().update(chargeable_df)
+    for name in ["product", "partner", "plan"]:
+        pd.testing.assert_frame_equal(merged.totals(name), single.totals(name), check_dtype=False, check_index_type=False)
+
+def test_write_product_usage_to_its_own_file(chargeable_df, tmp_path):
+    """Test that totals_by_product.csv keeps its product,itemCount columns and the usage per product has its own file."""
+    totals = TotalsAggregator().update(chargeable_df)
+    totals.write(str(tmp_path))
+    assert pd.read_csv(tmp_path / "totals_by_product.csv").to_dict("list") == {
+        "product": ["A", "B", "C"], "itemCount": [50, 5010, 40]
+    }
+    assert pd.read_csv(tmp_path / "totals_by_product_usage.csv").to_dict("list") == {
+        "product": ["A", "B", "C"], "usage": [50, 15, 40]
+    }
+    assert sorted(totals.output_filenames()) == sorted(os.listdir(tmp_path))
+
+def test_update_missing_columns():
+    """Test error when the chargeable rows lack a dimension or measure."""
+    with pytest.raises(ValueError):
+        TotalsAggregator().update(pd.DataFrame({"product": ["A"], "itemCount": [1]}))
@@ -0,0 +1,87 @@
+"""
+Tests for the usage_reduction module.
+
+This file covers:
+- Compiling reduction rules into a divisor lookup.
+- Rounding policies applied to reduced usage.
+- Loading rules from a versioned JSON file.
+- Error handling for invalid rules, divisors and rounding policies.
+"""
+
+import json
+import pandas as pd
+import pytest
+from app.domain.usage_reduction import UsageReductionRules, compile_usage_reduction_rules
+
+def test_divisors_lookup():
+    """Test that each PartNumber gets its divisor and unknown PartNumbers get 1."""
+    rules = UsageReductionRules({"A": 100, "B": 1000})
+    divisors = rules.divisors(pd.Series(["B", "X", "A", None]))
+    assert list(divisors) == [1000, 1, 100, 1]
+
+def test_reduce_keeps_unmatched_item_counts():
+    """Test that reduction divides matched rows only."""
+    rules = UsageReductionRules({"A": 4})
+    usage = rules.reduce(pd.Series([10, 7]), pd.Series(["A", "B"]))
+    assert list(usage) == [2.5, 7]
+
+@pytest.mark.parametrize("rounding,expected", [
+    ("truncate", [2, 2, 7]),
+    ("floor", [2, 2, 7]),
+    ("ceil", [3, 3, 7]),
+    ("round_half_up", [2, 3, 7]),
+])
+def test_rounding_policies(rounding, expected):
+    """Test each rounding policy on reduced usage."""
+    rules = UsageReductionRules({"A": 4}, rounding=rounding)
+    usage = rules.round(rules.reduce(pd.Series([9, 10, 7]), pd.Series(["A", "A", "B"])))
+    assert list(usage) == expected
+    assert usage.dtype == "int64"
+
+def test_invalid_rounding_policy():
+    """Test error for an unknown rounding policy."""
+    with pytest.raises(ValueError):
+        UsageReductionRules({"A": 4}, rounding="bankers")
+
+@pytest.mark.parametrize("divisor", [0, -5, "1000", True])
+def test_invalid_divisor(divisor):
+    """Test error for non-positive or non-numeric divisors."""
+    with pytest.raises(ValueError):
+        UsageReductionRules({"A": divisor})
+
+def test_invalid_rules_type():
+    """Test error when rules are not a dictionary."""
+    with pytest.raises(ValueError):
+        compile_usage_reduction_rules([])
+
+def test_compile_usage_reduction_rules_passthrough():
+    """Test that compiled rules are returned as-is."""
+    rules = UsageReductionRules({"A": 4})
+    assert compile_usage_reduction_rules(rules) is rules
+
+def test_from_file(tmp_path):
+    """Test loading a versioned rules file."""
+    file = tmp_path / "rules.json"
+    file.write_text(json.dumps({"version": "2", "rounding": "ceil", "rules": {"A": 4}}))
+    rules = UsageReductionRules.from_file(str(file))
+    assert rules.version == "2"
+    assert rules.rounding == "ceil"
+    assert rules.rules == {"A": 4}
+
+def test_from_file_default_rounding(tmp_path):
+    """Test that the default rounding is used when the file does not set one."""
+    file = tmp_path / "rules.json"
+    file.write_text(json.dumps({"version": "1", "rules": {"A": 4}}))
+    assert UsageReductionRules.from_file(str(file), default_rounding="floor").rounding == "floor"
+
+def test_from_file_missing_version(tmp_path):
+    """Test error when the rules file has no version."""
+    file = tmp_path / "rules.json"
+    file.write_text(json.dumps({"rules": {"A": 4}}))
+    with pytest.raises(ValueError):
+        UsageReductionRules.from_file(str(file))
+
+def test_from_file_not_found(tmp_path):
+    """Test error when the rules file does not exist."""
+    with pytest.raises(RuntimeError):
+        UsageReductionRules.from_file(str(tmp_path / "missing.json"))
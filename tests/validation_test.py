@@ -0,0 +1,159 @@
+"""
+Tests for the validation module.
+
+This file covers:
+- Null checks, numeric bounds, maximum lengths and allowed characters per column.
+- Flagging text holding undecodable bytes.
+- Checking ASCII text columns and number columns on all rows at once, as exactly as per distinct value.
+- Routing violating rows to the error frame and counting violations per rule and column.
+- Rejecting files of a disallowed type, with mismatched content or over the size limit.
+- Merging the summaries of consecutive chunks.
+- Error handling for invalid rules.
+"""
+
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from app.domain.validation import (
+    DEFAULT_VALIDATION_RULES,
+    ValidationRules,
+    apply_validation_rules,
+    check_usage_report_file,
+    merge_validation_summaries,
+)
+
+@pytest.fixture
+def rules():
+    return ValidationRules({
+        "file": {"encoding": "utf-8"},
+        "columns": {
+            "PartnerID": {"not_null": True, "min": 1, "max": 100},
+            "domains": {"max_length": 8, "allowed_characters": "a-z.-"},
+            "plan": {"not_null": True},
+        },
+    })
+
+@pytest.fixture
+def usage_df():
+    return pd.DataFrame({
+        "PartnerID": ["5", None, "500", "0", "7", "5"],
+        "domains": ["a.com", "b.com", "longer.com", "C.com", "d�.com", np.nan],
+        "plan": pd.Series(["p", "p", " ", "p", "p", "p"], dtype="category"),
+    })
+
+def _violations(summary_df):
+    return {(rule, column): count for rule, column, count in summary_df.itertuples(index=False) if count}
+
+def test_apply_validation_rules(rules, usage_df):
+    """Test that each rule flags its rows and violating rows are split off with the rules they break."""
+    valid_df, error_df, summary_df = apply_validation_rules(usage_df, rules)
+    assert list(valid_df.index) == [0, 5]
+    assert list(error_df["validation_violation"]) == [
+        "PartnerID:not_null",
+        "PartnerID:max;domains:max_length;plan:not_null",
+        "PartnerID:min;domains:allowed_characters",
+        "domains:allowed_characters;domains:encoding",
+    ]
+    assert _violations(summary_df) == {
+        ("not_null", "PartnerID"): 1, ("min", "PartnerID"): 1, ("max", "PartnerID"): 1,
+        ("max_length", "domains"): 1, ("allowed_characters", "domains"): 2, ("encoding", "domains"): 1,
+        ("not_null", "plan"): 1,
+    }
+    assert list(summary_df.columns) == ["rule", "column", "violations"]
+
+def test_apply_validation_rules_without_violations(rules, usage_df):
+    """Test that valid rows pass untouched and the summary still lists every rule with no violations."""
+    valid_df, error_df, summary_df = apply_validation_rules(usage_df.iloc[[0, 5]], rules)
+    pd.testing.assert_frame_equal(valid_df, usage_df.iloc[[0, 5]])
+    assert error_df.empty
+    assert summary_df["violations"].sum() == 0
+    assert ("encoding", "plan") in set(zip(summary_df["rule"], summary_df["column"]))
+
+def test_allowed_characters_outside_ascii():
+    """Test allowed characters beyond ASCII, and newlines inside values."""
+    rules = ValidationRules({"columns": {"plan": {"allowed_characters": "a-zé"}}})
+    _, error_df, _ = apply_validation_rules(pd.DataFrame({"plan": ["café", "cafè", "a\nb"]}), rules)
+    assert list(error_df.index) == [1, 2]
+    rules = ValidationRules({"columns": {"plan": {"allowed_characters": "a-z"}}})
+    _, error_df, _ = apply_validation_rules(pd.DataFrame({"plan": ["ab", "a\nb", "c"]}), rules)
+    assert list(error_df.index) == [1]
+
+def test_text_rules_on_integers_read_as_float():
+    """Test that whole numbers read as float, next to a missing value, are checked as their integer text."""
+    rules = ValidationRules({"columns": {"itemCount": {"max_length": 2, "allowed_characters": "0-9"}}})
+    _, error_df, _ = apply_validation_rules(pd.DataFrame({"itemCount": [10.0, np.nan, 100.0]}), rules)
+    assert list(error_df.index) == [2]
+    assert error_df["validation_violation"].tolist() == ["itemCount:max_length"]
+
+@pytest.mark.parametrize("values, violations", [
+    (["ab.com", "cd.com", "ef.com"], []),
+    (["ab.com", "", "ef.com"], [1]),
+    (["ab.com", " cd.com", "ef.com"], [1]),
+    (["ab.com", "cd.com", "ef.com.long"], [2]),
+    (["ab.com", "cd_com", "ef.com"], [1]),
+    (["ab.com", 7, "ef.com"], [1]),
+    (["ab.com", None, "ef.com"], [1]),
+])
+def test_text_rules_on_all_rows(values, violations):
+    """Test that the text rules checked on all rows of a column flag the same rows as per distinct value."""
+    rules = ValidationRules({"columns": {"domains": {"not_null": True, "max_length": 8, "allowed_characters": "a-z.-"}}})
+    _, error_df, _ = apply_validation_rules(pd.DataFrame({"domains": values}), rules)
+    assert list(error_df.index) == violations
+
+def test_number_rules_on_all_rows():
+    """Test the number rules on integer columns, and on float columns with missing values."""
+    rules = ValidationRules({"columns": {"PartnerID": {"not_null": True, "min": 1, "max": 100}}})
+    _, error_df, _ = apply_validation_rules(pd.DataFrame({"PartnerID": [5, 0, 101, 7]}), rules)
+    assert list(error_df.index) == [1, 2]
+    _, error_df, _ = apply_validation_rules(pd.DataFrame({"PartnerID": [5.0, np.nan, 101.0]}), rules)
+    assert list(error_df["validation_violation"]) == ["PartnerID:not_null", "PartnerID:max"]
+
+def test_default_rules_pass_sample_report():
+    """Test that the sample usage report has no violations of the built-in rules."""
+    df = pd.read_csv("input/sample_usage_report.csv")
+    _, error_df, _ = apply_validation_rules(df, ValidationRules(DEFAULT_VALIDATION_RULES))
+    assert error_df.empty
+
+def test_check_usage_report_file(tmp_path):
+    """Test that disallowed types, content not matching the extension and large files are rejected."""
+    report = tmp_path / "report.csv"
+    report.write_text("PartnerID\n1\n")
+    check_usage_report_file(str(report), ValidationRules({"file": {"types": ["csv"], "max_bytes": 100}}))
+    with pytest.raises(ValueError):
+        check_usage_report_file(str(report), ValidationRules({"file": {"max_bytes": 5}}))
+    with pytest.raises(ValueError):
+        check_usage_report_file(str(report), ValidationRules({"file": {"types": ["parquet"]}}))
+    disguised = tmp_path / "report.parquet"
+    disguised.write_text("PartnerID\n1\n")
+    with pytest.raises(ValueError):
+        check_usage_report_file(str(disguised), ValidationRules({}))
+
+def test_merge_validation_summaries(rules, usage_df):
+    """Test that chunk summaries add up to the summary of the whole frame."""
+    summaries = [apply_validation_rules(usage_df.iloc[start:start + 3], rules)[2] for start in (0, 3)]
+    merged = merge_validation_summaries(*summaries)
+    pd.testing.assert_frame_equal(merged, apply_validation_rules(usage_df, rules)[2])
+
+def test_from_file(tmp_path):
+    """Test loading rules from a JSON file, and errors for missing files."""
+    rules_file = tmp_path / "rules.json"
+    rules_file.write_text(json.dumps({"columns": {"plan": {"max_length": 3}}}))
+    assert ValidationRules.from_file(str(rules_file)).columns == {"plan": {"max_length": 3}}
+    with pytest.raises(RuntimeError):
+        ValidationRules.from_file(str(tmp_path / "missing.json"))
+
+@pytest.mark.parametrize("rules", [
+    ["not a dictionary"],
+    {"columns": {"plan": {"unknown": 1}}},
+    {"columns": {"plan": {"min": "1"}}},
+    {"columns": {"plan": {"max_length": 0}}},
+    {"columns": {"plan": {"allowed_characters": "z-a"}}},
+    {"file": {"types": ["xlsx"]}},
+    {"file": {"max_bytes": -1}},
+    {"file": {"encoding": "not-an-encoding"}},
+])
+def test_invalid_rules(rules):
+    """Test that invalid rules raise ValueError."""
+    with pytest.raises(ValueError):
+        ValidationRules(rules)
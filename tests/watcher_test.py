@@ -0,0 +1,198 @@
+"""
+Tests for the FolderWatcher class from the watcher module.
+
+This file covers:
+- Translating reports that arrive in the watched folder and moving them to done/ or failed/.
+- Leaving files that are still being written until they stop changing.
+- Reloading the product map only when its mtime changes.
+- Loading the validation rules once in watch mode.
+- Bounding the number of reports translated at a time.
+- Error handling for invalid settings.
+"""
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import pytest
+from app.config.config import load_config
+from app.domain.product_mapping import ProductMapping
+from app.domain.validation import ValidationRules
+from app.main import watch_main
+from app.services.processor import FileProcessor
+from app.services.watcher import FolderWatcher
+
+HEADERS = ["PartnerID", "accountGuid", "domains", "plan", "PartNumber", "itemCount"]
+
+def _write_report(path, part_number="A"):
+    pd.DataFrame({
+        "PartnerID": [1],
+        "accountGuid": ["a1b2c3d4e5f6g7h8i9j0k1l2m3n4o5p6"],
+        "domains": ["a.com"],
+        "plan": ["plan1"],
+        "PartNumber": [part_number],
+        "itemCount": [10]
+    }).to_csv(path, index=False)
+
+@pytest.fixture
+def folders(tmp_path):
+    """Watched folder, output folder and product map."""
+    watch = tmp_path / "watch"
+    watch.mkdir()
+    mapping = tmp_path / "mapping.json"
+    mapping.write_text(json.dumps({"A": "ProductA"}))
+    return watch, tmp_path / "out", mapping
+
+def _watcher(folders, **kwargs):
+    watch, output, mapping = folders
+    kwargs.setdefault("poll_interval", 0.01)
+    return FolderWatcher(str(watch), str(output), str(mapping), [], {}, HEADERS, **kwargs)
+
+def _run_until(watcher, condition, timeout=10.0):
+    """Run the watcher on a thread until `condition()` holds, then stop it."""
+    stop_event = threading.Event()
+    thread = threading.Thread(target=watcher.run, args=(stop_event,))
+    thread.start()
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    stop_event.set()
+    thread.join()
+    assert condition()
+
+def test_watcher_translates_and_moves_reports(folders):
+    """Test that arriving reports are translated and moved to done/, and broken ones to failed/."""
+    watch, output, _ = folders
+    _write_report(watch / "day1.csv")
+    _write_report(watch / "day2.csv.gz")
+    (watch / "broken.csv").write_text("foo,bar\n1,2\n")
+    (watch / "notes.txt").write_text("not a report")
+    watcher = _watcher(folders)
+    _run_until(watcher, lambda: watcher.processed + watcher.failed == 3)
+    assert sorted(os.listdir(watch / "done")) == ["day1.csv", "day2.csv.gz"]
+    assert os.listdir(watch / "failed") == ["broken.csv"]
+    assert sorted(name for name in os.listdir(watch) if os.path.isfile(watch / name)) == ["notes.txt"]
+    assert "ProductA" in (output / "day1" / "insert_into_chargeable.sql").read_text()
+    assert (output / "day2" / "insert_into_chargeable.sql").exists()
+
+def test_watcher_keeps_reports_with_the_same_name(folders):
+    """Test that a report arriving again under the same name does not overwrite the first one in done/."""
+    watch, _, _ = folders
+    watcher = _watcher(folders)
+    for expected in (1, 2):
+        _write_report(watch / "day1.csv")
+        _run_until(watcher, lambda: watcher.processed == expected)
+    assert sorted(os.listdir(watch / "done")) == ["1_day1.csv", "day1.csv"]
+
+def test_ready_reports_waits_for_writes_to_finish(folders):
+    """Test that a report is only picked up once it is unchanged between two polls."""
+    watch, _, _ = folders
+    watcher = _watcher(folders)
+    report = watch / "day1.csv"
+    report.write_text("PartnerID\n")
+    assert watcher._ready_reports() == []
+    with open(report, "a") as f:
+        f.write("1\n")
+    assert watcher._ready_reports() == []
+    assert watcher._ready_reports() == [str(report)]
+
+def test_mapping_reloaded_only_when_mtime_changes(folders, monkeypatch):
+    """Test that the product map is read once, and again only after its file changes, without building a processor."""
+    watch, output, mapping = folders
+    loads = []
+    from_file = ProductMapping.from_file.__func__
+    monkeypatch.setattr(ProductMapping, "from_file", classmethod(lambda cls, path: loads.append(path) or from_file(cls, path)))
+    processors = []
+
+    def create_file_processor(output_files_path, partnumber_to_product_map):
+        assert partnumber_to_product_map is not None
+        processors.append(output_files_path)
+        return FileProcessor(output_files_path, str(mapping), partnumber_to_product_map)
+
+    watcher = _watcher(folders, create_file_processor=create_file_processor)
+    _write_report(watch / "day1.csv", part_number="B")
+    _run_until(watcher, lambda: watcher.processed == 1)
+    assert len(loads) == 1
+    assert "ProductB" not in (output / "day1" / "insert_into_chargeable.sql").read_text()
+
+    mapping.write_text(json.dumps({"A": "ProductA", "B": "ProductB"}))
+    stat = os.stat(mapping)
+    os.utime(mapping, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    _write_report(watch / "day2.csv", part_number="B")
+    _run_until(watcher, lambda: watcher.processed == 2)
+    assert len(loads) == 2
+    assert "ProductB" in (output / "day2" / "insert_into_chargeable.sql").read_text()
+    assert len(processors) == 2
+
+def test_unreadable_mapping_keeps_previous(folders):
+    """Test that a map that cannot be parsed is ignored and the previous one kept."""
+    _, _, mapping = folders
+    watcher = _watcher(folders)
+    mapping.write_text("{not json")
+    stat = os.stat(mapping)
+    os.utime(mapping, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    watcher._reload_mapping_if_changed()
+    assert watcher.partnumber_to_product_map.rules == {"A": "ProductA"}
+
+def test_watch_main_loads_validation_rules_once(folders, tmp_path, monkeypatch):
+    """Test that watch mode parses the validation rules file once for every report it translates."""
+    watch, output, mapping = folders
+    rules = tmp_path / "validation_rules.json"
+    rules.write_text(json.dumps({"columns": {"PartnerID": {"not_null": True}}}))
+    loads = []
+    from_file = ValidationRules.from_file.__func__
+    monkeypatch.setattr(ValidationRules, "from_file", classmethod(lambda cls, path: loads.append(path) or from_file(cls, path)))
+    config = load_config({
+        "WATCH_PATH": str(watch),
+        "OUTPUT_FILES_PATH": str(output),
+        "PARTNUMBER_TO_PRODUCT_MAP_FILEPATH": str(mapping),
+        "VALIDATION_RULES_FILEPATH": str(rules),
+        "WATCH_POLL_SECONDS": "0.01",
+    }, use_dotenv=False)
+    for name in ("day1.csv", "day2.csv"):
+        _write_report(watch / name)
+    stop_event = threading.Event()
+    thread = threading.Thread(target=watch_main, args=(config, stop_event))
+    thread.start()
+    deadline = time.monotonic() + 10
+    while len(list((watch / "done").glob("*.csv"))) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    stop_event.set()
+    thread.join()
+    assert sorted(os.listdir(watch / "done")) == ["day1.csv", "day2.csv"]
+    assert loads == [str(rules)]
+
+def test_watcher_bounds_reports_in_flight(folders):
+    """Test that no more than `max_workers` reports are translated at a time."""
+    watch, _, mapping = folders
+    release = threading.Event()
+
+    def create_file_processor(output_files_path, partnumber_to_product_map):
+        if partnumber_to_product_map is not None:
+            release.wait(10)
+        return FileProcessor(output_files_path, str(mapping), partnumber_to_product_map)
+
+    for name in ("day1.csv", "day2.csv", "day3.csv"):
+        _write_report(watch / name)
+    watcher = _watcher(folders, max_workers=2, create_file_processor=create_file_processor)
+    os.makedirs(watch / "done")
+    watcher._executor = ThreadPoolExecutor(max_workers=2)
+    try:
+        watcher.poll()
+        watcher.poll()
+        assert len(watcher._in_flight) == 2
+    finally:
+        release.set()
+        watcher._executor.shutdown(wait=True)
+
+def test_invalid_watcher_settings(folders):
+    """Test errors for invalid settings and a missing product map."""
+    with pytest.raises(ValueError):
+        _watcher(folders, max_workers=0)
+    with pytest.raises(ValueError):
+        _watcher(folders, poll_interval=0)
+    watch, output, mapping = folders
+    with pytest.raises(RuntimeError):
+        FolderWatcher(str(watch), str(output), str(mapping) + ".missing", [], {}, HEADERS)